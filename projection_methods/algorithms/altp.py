@@ -7,9 +7,9 @@ class AltP(Optimizer):
     # TODO(akshayka): Add relaxation support.
     def __init__(self,
             max_iters=100, atol=10e-5, do_all_iters=False, initial_iterate=None,
-            momentum=None, verbose=False):
+            momentum=None, verbose=False, history=None):
         super(AltP, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
         self.momentum = momentum
 
 
@@ -19,11 +19,12 @@ class AltP(Optimizer):
 
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
-        iterates = [left_set.project(iterate)]
-        residuals = []
+        iterates = self._new_history(problem)
+        iterates.append(left_set.project(iterate))
 
         status = Optimizer.Status.INACCURATE
-        self.all_iterates = [iterate]
+        self.all_iterates = self._new_history(problem, suffix='_all')
+        self.all_iterates.append(iterate)
         for i in xrange(self.max_iters):
             if self.verbose:
                 print 'iteration %d' % i
@@ -31,10 +32,10 @@ class AltP(Optimizer):
             y_k = right_set.project(x_k)
 
             # note that x_k = left_set.project(x_k)
-            residuals.append(self._compute_residual(x_k, x_k, y_k))
+            iterates.push_residual(self._compute_residual(x_k, x_k, y_k))
             if self.verbose:
-                print '\tresidual: %e' % sum(residuals[-1])
-            if self._is_optimal(residuals[-1]):
+                print '\tresidual: %e' % sum(iterates.residuals[-1])
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
@@ -47,4 +48,4 @@ class AltP(Optimizer):
                     alpha=self.momentum[0],
                     beta=self.momentum[1])
             iterates.append(x_k_plus)
-        return iterates, residuals, status
+        return iterates, iterates.residuals, status
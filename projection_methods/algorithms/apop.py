@@ -14,6 +14,14 @@ from projection_methods.oracles.dynamic_polyhedron import PolyOuter
 class APOP(Optimizer):
     """Alternating Projections (accelerated by) Outer Approximations
 
+    Residuals are recorded once per iteration, at a point whose projections
+    onto both sets the iteration computes anyway: the iterate x_k when
+    averaging, and y_k, the projection of x_k onto the right set, when
+    alternating. The initial iterate has no entry of its own (when
+    averaging, it is the point of the first entry), so that a run of
+    max_iters iterations returns max_iters residuals, and residuals[k]
+    belongs to the k-th iterate.
+
     TODO(akshayka):
         line/plane search
         more fine-grained residuals (primal/dual)
@@ -28,9 +36,9 @@ class APOP(Optimizer):
             data_hyperplanes=0, affine_policy='random',
             info=[],
             momentum=None, average=True, theta=1.0,
-            verbose=False):
+            verbose=False, history=None):
         super(APOP, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
         if outer_policy not in PolyOuter.POLICIES:
             raise ValueError(
                 'Policy must be chosen from ' +
@@ -54,7 +62,7 @@ class APOP(Optimizer):
     def _verbose_residual(self, x_k, r, fejer_r, left_set, right_set):
         """Print verbose info about the residual r if verbosity is set"""
         if self.verbose:
-            print '\tproblem residual: %s (sum %e)' % (str(r), sum(e))
+            print '\tproblem residual: %s (sum %e)' % (str(r), sum(r))
             print '\tresidual w.r.t. opt: %e' % fejer_r
             print '\t\tleft (%s): %e' % (type(left_set).__name__, r[0])
             left_res = '\n'.join([
@@ -76,9 +84,11 @@ class APOP(Optimizer):
         Generate new information to add to our outer approximation,
         and consequentially produce an intermediate iterate x_k_prime, the
         point that will be projected upon the outer approximation to obtain the
-        subsequent bonafide iterate, x_k_plus. Produce, too, points y_k =
-        left_set.project(x_k), z_k = right_set.project(x_k) for residual
-        computation.
+        subsequent bonafide iterate, x_k_plus. Produce, too, a point whose
+        projections onto both sets have been computed along the way, so that
+        its residual is free: x_k itself when averaging, and
+        y_k = right_set.project(x_k) when alternating (y_k is its own
+        projection onto the right set).
 
         Args:
             x_k (numpy.ndarray): the current iterate
@@ -87,6 +97,8 @@ class APOP(Optimizer):
         Returns:
            numpy.ndarray: the intermediate iterate x_k_prime
            list of Halfspace/Hyperplane: the new information generated
+           numpy.ndarray: the point whose residual is to be computed
+           tuple: its projections onto the left and the right set
         """
         if self.average:
             if self.verbose:
@@ -98,6 +110,7 @@ class APOP(Optimizer):
             z_k, z_h_k = self._left_set_query(x_k)
             # TODO(akshayka): consider taking x_k_prime to simply be x_k
             x_k_prime = 0.5 * (y_k + z_k)
+            residual_point, projections = x_k, (z_k, y_k)
         else:
             if self.verbose:
                 print 'performing _alternating_ round'
@@ -107,7 +120,8 @@ class APOP(Optimizer):
                 print '\tprojecting onto left set ...'
             z_k, z_h_k = self._left_set_query(y_k)
             x_k_prime = z_k
-        return x_k_prime, y_h_k + z_h_k
+            residual_point, projections = y_k, (z_k, y_k)
+        return x_k_prime, y_h_k + z_h_k, residual_point, projections
 
 
     def _query_func(self, oracle):
@@ -119,13 +133,15 @@ class APOP(Optimizer):
             return lambda x: oracle.query(x)
 
 
-    def _push_residuals(self, problem, x_k_prime, residuals, fejer_residuals,
-            left_set, right_set):
-        r = problem.residual(x_k_prime)
-        residuals.append(r)
+    def _push_residuals(self, problem, x_k, projections, x_k_prime, iterates,
+            fejer_residuals, left_set, right_set):
+        """Records the residual of x_k, given its projections onto the sets,
+        and the distance from x_k_prime to problem.x_opt"""
+        r = problem.residual(x_k, projections=projections)
+        iterates.push_residual(r)
         fejer_r = np.linalg.norm(x_k_prime - problem.x_opt, 2)
         fejer_residuals.append(fejer_r)
-        self._verbose_residual(x_k_prime, r, fejer_r, left_set, right_set)
+        self._verbose_residual(x_k, r, fejer_r, left_set, right_set)
 
 
     def solve(self, problem):
@@ -147,36 +163,35 @@ class APOP(Optimizer):
         
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
-        iterates = [iterate]
-        residuals = []
+        iterates = self._new_history(problem)
+        iterates.append(iterate)
         fejer_residuals = []
-        self._push_residuals(problem, iterate, residuals, fejer_residuals,
-            left_set, right_set)
 
         status = Optimizer.Status.INACCURATE
         for i in xrange(self.max_iters):
             if self.verbose:
                 print 'iteration %d' % i
             # Execute the intermediate step.
-            x_k_prime, info = self._generate_information(iterates[-1],
-                left_set, right_set)
-
-            # Compute residuals for x_k_prime
-            self._push_residuals(problem, x_k_prime, residuals,
-                fejer_residuals, left_set, right_set)
-            if self._is_optimal(residuals[-1]):
+            x_k = iterates[-1]
+            x_k_prime, info, residual_point, projections = (
+                self._generate_information(x_k, left_set, right_set))
+
+            # Compute residuals from the projections at hand
+            self._push_residuals(problem, residual_point, projections,
+                x_k_prime, iterates, fejer_residuals, left_set, right_set)
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
 
             self.outer_manager.add(info)
-            outer = self.outer_manager.outer()
             if self.verbose:
+                outer = self.outer_manager.outer()
                 print '\tobtained %d pieces of information' % len(info)
                 print '\tprojecting onto outer approximation with ...'
                 print '\t\t%d hyperplanes' % len(outer.hyperplanes())
                 print '\t\t%d halfspaces' % len(outer.halfspaces())
-            x_k_plus = outer.project(x_k_prime)
+            x_k_plus = self.outer_manager.project(x_k_prime)
 
             # Debugging: Check whether the sequence produced by APOP violates
             # fejer monotonicity (w.r.t. a single optimal point problem.x_opt)
@@ -200,4 +215,4 @@ class APOP(Optimizer):
                     alpha=self.momentum[0],
                     beta=self.momentum[1])
             iterates.append(x_k_plus)
-        return iterates, residuals, status
+        return iterates, iterates.residuals, status
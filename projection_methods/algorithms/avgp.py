@@ -7,9 +7,10 @@ class AvgP(Optimizer):
     # TODO(akshayka): Add relaxation support.
     def __init__(self,
             max_iters=100, atol=10e-5, do_all_iters=False,
-            initial_iterate=None, momentum=None, verbose=False):
+            initial_iterate=None, momentum=None, verbose=False,
+            history=None):
         super(AvgP, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
         self.momentum = momentum
 
 
@@ -19,8 +20,8 @@ class AvgP(Optimizer):
 
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
-        iterates = [iterate]
-        residuals = []
+        iterates = self._new_history(problem)
+        iterates.append(iterate)
 
         status = Optimizer.Status.INACCURATE
         for i in xrange(self.max_iters):
@@ -30,10 +31,10 @@ class AvgP(Optimizer):
             y_k = left_set.project(x_k)
             z_k = right_set.project(x_k)
 
-            residuals.append(self._compute_residual(x_k, y_k, z_k))
+            iterates.push_residual(self._compute_residual(x_k, y_k, z_k))
             if self.verbose:
-                print '\tresidual: %e' % sum(residuals[-1])
-            if self._is_optimal(residuals[-1]):
+                print '\tresidual: %e' % sum(iterates.residuals[-1])
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
@@ -46,4 +47,4 @@ class AvgP(Optimizer):
                     beta=self.momentum['beta'])
             iterates.append(x_k_plus)
 
-        return iterates, residuals, status
+        return iterates, iterates.residuals, status
@@ -3,18 +3,32 @@ import numpy as np
 from projection_methods.algorithms.optimizer import Optimizer
 
 class Dykstra(Optimizer):
+    """Dykstra's alternating projection algorithm
+
+    The auxiliary sequences (p_n), (q_n) and the main sequences (a_n), (b_n)
+    (see Bauschke's 98 paper, Dykstra's Alternating Projection Algorithm for
+    Two Sets) only depend on their previous terms, so that they are kept in
+    four buffers that are updated in place; the iterates b_n are recorded
+    per the history policy. Memory is thus O(n), plus whatever the history
+    policy retains.
+    """
     def __init__(self,
             max_iters=100, atol=10e-5, do_all_iters=False,
-            initial_iterate=None, verbose=False):
+            initial_iterate=None, verbose=False, history=None):
         super(Dykstra, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
+
 
+    def _compute_residual(self, x_k, left, right, in_right=False):
+        """Returns tuple (dist from left set squared,
+        dist from right set squared)
 
-    def _compute_residual(self, x_k, left, right):
-        """Returns tuple (dist from left set, dist from right set)"""
-        y_k = left.project(x_k)
-        z_k = right.project(x_k)
-        return super(Dykstra, self)._compute_residual(x_k, y_k, z_k)
+        If in_right, x_k is known to lie in the right set (as b_n does, for
+        n >= 1), so that it is only projected onto the left set.
+        """
+        left_dist = left.project_dist(x_k)[1]
+        right_dist = 0. if in_right else right.project_dist(x_k)[1]
+        return (left_dist ** 2, right_dist ** 2)
 
     def solve(self, problem):
         left_set = problem.sets[0]
@@ -23,37 +37,38 @@ class Dykstra(Optimizer):
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
 
-        # (p_n), (q_n) are the auxiliary sequences, (a_n), (b_n) the main
-        # sequences, defined in Bauschke's 98 paper
-        # (Dykstra's Alternating Projection Algorithm for Two Sets).
-        self.p = [None] * (self.max_iters + 1)
-        self.q = [None] * (self.max_iters + 1)
-        self.a = [None] * (self.max_iters + 1)
-        self.b = [None] * (self.max_iters + 1)
-        zero_vector = np.zeros(problem.dimension)
-        self.p[0] = self.q[0] = zero_vector
-        self.b[0] = self.a[0] = iterate
-        residuals = []
+        # p_n, q_n, a_n, b_n, after the n-th iteration
+        self.p = np.zeros(problem.dimension)
+        self.q = np.zeros(problem.dimension)
+        self.a = np.array(iterate, dtype=float)
+        self.b = np.array(iterate, dtype=float)
+        # b_{n-1} + p_{n-1}, and then a_n + q_{n-1}
+        w = np.zeros(problem.dimension)
+        iterates = self._new_history(problem)
+        iterates.append(self.b, copy=True)
 
         status = Optimizer.Status.INACCURATE
         for n in xrange(1, self.max_iters + 1):
             if self.verbose:
                 print 'iteration %d' % n
             # TODO(akshayka): Robust stopping criterion
-            residuals.append(self._compute_residual(
-                self.b[n-1], left_set, right_set))
+            iterates.push_residual(self._compute_residual(
+                self.b, left_set, right_set, in_right=n > 1))
             if self.verbose:
-                print '\tresidual: %e' % sum(residuals[-1])
-            if self._is_optimal(residuals[-1]):
+                print '\tresidual: %e' % sum(iterates.residuals[-1])
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
 
-            self.a[n] = left_set.project(self.b[n-1] + self.p[n-1])
-            self.b[n] = right_set.project(self.a[n] + self.q[n-1])
-            self.p[n] = self.b[n-1] + self.p[n-1] - self.a[n]
-            self.q[n] = self.a[n] + self.q[n-1] - self.b[n]
+            np.add(self.b, self.p, out=w)
+            self.a[:] = left_set.project(w)
+            np.subtract(w, self.a, out=self.p)
+            np.add(self.a, self.q, out=w)
+            self.b[:] = right_set.project(w)
+            np.subtract(w, self.b, out=self.q)
+            iterates.append(self.b, copy=True)
 
         # TODO(akshayka): does it matter if I return self.b vs self.a?
         # the first implementation returned self.a ...
-        return self.b, residuals, status
+        return iterates, iterates.residuals, status
@@ -0,0 +1,253 @@
+import os
+
+import numpy as np
+
+
+class History(object):
+    """A record of the iterates and the residuals of an optimizer
+
+    A History is a sequence of iterates: len(h) is the number of iterates
+    recorded so far, and h[i] is the i-th iterate, provided that it was
+    retained. Which iterates are retained depends on the policy:
+
+        ALL: every iterate is kept in memory
+        LAST: only the last keep_last iterates are kept
+        STRIDED: every stride-th iterate (the first one included) is kept,
+            as well as the last keep_last iterates
+        MEMMAP: every iterate is written to a memory-mapped .npy file at
+            path, and the last keep_last iterates are kept in memory
+
+    Under every policy, h[-1], ..., h[-keep_last] are available, which is
+    all that heavy-ball momentum needs (keep_last >= 2).
+
+    Residuals are stored in a preallocated array whose rows are the
+    residuals of successive iterations; the array doubles in size whenever
+    it runs out of rows.
+
+    Attributes:
+        policy (str): one of ALL, LAST, STRIDED, MEMMAP
+        dim (int): the dimension of the iterates
+        keep_last (int): the number of most recent iterates kept in memory
+        stride (int): the stride of the STRIDED policy
+        path (str): the file to which the MEMMAP policy writes
+    """
+    ALL, LAST, STRIDED, MEMMAP = 'all', 'last', 'strided', 'memmap'
+    POLICIES = frozenset([ALL, LAST, STRIDED, MEMMAP])
+
+    def __init__(self, dim, policy=ALL, keep_last=2, stride=1, path=None,
+            capacity=128):
+        """
+        Args:
+            dim (int): as per attribute
+            policy (str): as per attribute
+            keep_last (int): as per attribute
+            stride (int): as per attribute
+            path (str): as per attribute; required by MEMMAP
+            capacity (int): the expected number of iterates (and residuals),
+                used to size the preallocated arrays
+        Raises:
+            ValueError if the policy or its parameters are invalid
+        """
+        if policy not in History.POLICIES:
+            raise ValueError('Unknown history policy %s' % policy)
+        if keep_last < 1 or stride < 1:
+            raise ValueError('keep_last and stride must be positive')
+        if policy == History.MEMMAP and path is None:
+            raise ValueError('The memmap policy requires a path')
+        self.policy = policy
+        self.dim = dim
+        self.keep_last = keep_last
+        self.stride = stride
+        self.path = path
+        self._count = 0
+        self._capacity = max(capacity, 1)
+        # the last keep_last iterates, in a ring buffer
+        self._last = np.zeros((keep_last, dim))
+        # ALL and STRIDED: the retained iterates and their indices
+        self._kept = []
+        self._kept_indices = []
+        self._memmap = None
+        if policy == History.MEMMAP:
+            self._memmap = self._open_memmap(path, self._capacity)
+        self._residuals = None
+        self._num_residuals = 0
+
+
+    def _open_memmap(self, path, rows):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=float,
+            shape=(rows, self.dim))
+
+
+    def _grow_memmap(self):
+        """Doubles the number of rows of the memory-mapped file"""
+        tmp = self.path + '.tmp'
+        grown = self._open_memmap(tmp, 2 * self._memmap.shape[0])
+        grown[:self._count] = self._memmap[:self._count]
+        grown.flush()
+        del self._memmap
+        os.rename(tmp, self.path)
+        self._memmap = np.load(self.path, mmap_mode='r+')
+
+
+    def append(self, x, copy=False):
+        """Records the next iterate
+
+        Args:
+            x (numpy.ndarray): the iterate
+            copy (bool): whether to copy x if it is kept in memory; callers
+                that update x in place must set it
+        """
+        i = self._count
+        if self.policy == History.ALL or (self.policy == History.STRIDED and
+                i % self.stride == 0):
+            self._kept.append(x.copy() if copy else x)
+            self._kept_indices.append(i)
+        elif self.policy == History.MEMMAP:
+            if i == self._memmap.shape[0]:
+                self._grow_memmap()
+            self._memmap[i] = x
+        if self.policy != History.ALL:
+            self._last[i % self.keep_last] = x
+        self._count += 1
+
+
+    def extend(self, iterates):
+        for x in iterates:
+            self.append(x)
+
+
+    def __len__(self):
+        return self._count
+
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if i < 0 or i >= self._count:
+            raise IndexError('iterate index out of range')
+        if self.policy == History.ALL:
+            return self._kept[i]
+        if i >= self._count - self.keep_last:
+            return self._last[i % self.keep_last].copy()
+        if self.policy == History.MEMMAP:
+            return np.array(self._memmap[i])
+        if self.policy == History.STRIDED and i % self.stride == 0:
+            return self._kept[i // self.stride]
+        raise IndexError('iterate %d was not retained (history policy %s)' %
+            (i, self.policy))
+
+
+    def __iter__(self):
+        """Iterates over the retained iterates, in order"""
+        for i in self.indices():
+            yield self[i]
+
+
+    def indices(self):
+        """Returns the indices of the retained iterates, in order"""
+        if self.policy in (History.ALL, History.MEMMAP):
+            return range(self._count)
+        last = range(max(self._count - self.keep_last, 0), self._count)
+        return sorted(set(self._kept_indices).union(last))
+
+
+    def snapshots(self):
+        """Returns the retained iterates, as the rows of a 2-D array"""
+        if self.policy == History.MEMMAP:
+            return self._memmap[:self._count]
+        indices = self.indices()
+        if len(indices) == 0:
+            return np.zeros((0, self.dim))
+        return np.array([self[i] for i in indices])
+
+
+    def push_residual(self, r):
+        """Records the residual of an iteration (a tuple of floats)"""
+        r = np.atleast_1d(np.asarray(r, dtype=float))
+        if self._residuals is None:
+            self._residuals = np.zeros((self._capacity, r.shape[0]))
+        elif self._num_residuals == self._residuals.shape[0]:
+            self._residuals = np.vstack((self._residuals,
+                np.zeros(self._residuals.shape)))
+        self._residuals[self._num_residuals] = r
+        self._num_residuals += 1
+
+
+    def extend_residuals(self, residuals):
+        for r in residuals:
+            self.push_residual(r)
+
+
+    @property
+    def residuals(self):
+        """The residuals recorded so far, as the rows of a 2-D array"""
+        if self._residuals is None:
+            return np.zeros((0, 0))
+        return self._residuals[:self._num_residuals]
+
+
+    def flush(self):
+        """Writes the iterates of the MEMMAP policy to disk"""
+        if self._memmap is not None:
+            self._memmap.flush()
+
+
+    def __getstate__(self):
+        # the memory-mapped iterates stay on disk, at self.path
+        self.flush()
+        state = self.__dict__.copy()
+        state['_memmap'] = None
+        if self._residuals is not None:
+            state['_residuals'] = self.residuals.copy()
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.policy == History.MEMMAP and os.path.isfile(self.path):
+            self._memmap = np.load(self.path, mmap_mode='r')
+
+
+class HistoryPolicy(object):
+    """The policy by which an optimizer records its history (see History)
+
+    Attributes:
+        policy (str): one of History.POLICIES
+        keep_last (int): the number of most recent iterates kept in memory
+        stride (int): the stride of the STRIDED policy
+        path (str): the .npy file to which the MEMMAP policy writes
+    """
+    def __init__(self, policy=History.ALL, keep_last=2, stride=1, path=None):
+        if policy not in History.POLICIES:
+            raise ValueError('Unknown history policy %s' % policy)
+        if policy == History.MEMMAP and path is None:
+            raise ValueError('The memmap policy requires a path')
+        self.policy = policy
+        self.keep_last = keep_last
+        self.stride = stride
+        self.path = path
+
+
+    def with_suffix(self, suffix):
+        """Returns this policy, with suffix appended to the stem of path
+
+        Used to record more than one sequence of iterates under one policy.
+        """
+        path = self.path
+        if path is not None and suffix:
+            stem, ext = os.path.splitext(path)
+            path = stem + suffix + ext
+        return HistoryPolicy(self.policy, self.keep_last, self.stride, path)
+
+
+    def history(self, dim, capacity=128, suffix=''):
+        """Returns an empty History that follows this policy
+
+        Args:
+            dim (int): the dimension of the iterates
+            capacity (int): the expected number of iterates
+            suffix (str): see with_suffix
+        """
+        policy = self.with_suffix(suffix)
+        return History(dim, policy=policy.policy, keep_last=policy.keep_last,
+            stride=policy.stride, path=policy.path, capacity=capacity)
@@ -1,16 +1,44 @@
+from multiprocessing import Process, Queue
+from Queue import Empty
 import random
+import traceback
 
 import numpy as np
+import scipy.sparse
 
+from projection_methods.algorithms.history import History, HistoryPolicy
 from projection_methods.algorithms.optimizer import Optimizer
 from projection_methods.algorithms.utils import heavy_ball_update, relax
+from projection_methods.algorithms.utils import SharedCutPool
+import projection_methods.algorithms.utils as utils
 from projection_methods.oracles.convex_set import ConvexOuter
 from projection_methods.oracles.dynamic_polyhedron import DynamicPolyhedron
 from projection_methods.oracles.dynamic_polyhedron import PolyOuter
+from projection_methods.projectables.halfspace import Halfspace
+from projection_methods.projectables.hyperplane import Hyperplane
+import projection_methods.projectables.utils as projectable_utils
 
 class MetaAPOP(Optimizer):
     """Alternating Projections (accelerated by) Outer Approximations
 
+    Runs a number of approaches (random starting points, plus the initial
+    iterate) in lockstep, sharing the cuts that each approach discovers
+    among all of them.
+
+    With num_workers > 1, the approaches are split among as many forked
+    worker processes. Each worker queries the sets for its own approaches
+    and projects them onto its own outer approximation; once per iteration,
+    the workers exchange the halfspaces and hyperplanes they found through a
+    SharedCutPool, so that every outer approximation receives every cut.
+    Cuts with more than one normal (such as the presolve hyperplanes of
+    Zeros) are kept by the worker that found them. The pool holds
+    cut_pool_capacity cuts per iteration; a worker that finds more raises
+    a RuntimeError.
+
+    The iterates of the initial approach, which are returned, are recorded
+    according to the history policy; the random approaches only keep what
+    momentum needs (their last two iterates).
+
     TODO(akshayka):
         line/plane search
         more fine-grained residuals (primal/dual)
@@ -21,9 +49,11 @@ class MetaAPOP(Optimizer):
             max_iters=100, atol=10e-5, do_all_iters=False, initial_iterate=None,
             outer_policy=PolyOuter.EXACT,
             max_hyperplanes=None, max_halfspaces=None,
-            momentum=None, average=True, theta=1.0, verbose=False):
+            momentum=None, average=True, theta=1.0, num_workers=1,
+            num_approaches=100, cut_pool_capacity=4096, verbose=False,
+            history=None):
         super(MetaAPOP, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
         if outer_policy not in PolyOuter.POLICIES:
             raise ValueError(
                 'Policy must be chosen from ' +
@@ -39,6 +69,66 @@ class MetaAPOP(Optimizer):
                 'received %f' % theta)
         self.theta = theta
         self.average = average
+        self.num_workers = num_workers
+        self.num_approaches = num_approaches
+        self.cut_pool_capacity = cut_pool_capacity
+
+
+    def _make_outer_manager(self, left_set):
+        outer = left_set.outer(kind=ConvexOuter.POLYHEDRAL)
+        assert len(outer.hyperplanes()) == 0
+        assert len(outer.halfspaces()) == 0
+        return DynamicPolyhedron(polyhedron=outer,
+            max_hyperplanes=self.max_hyperplanes,
+            max_halfspaces=self.max_halfspaces, policy=self.outer_policy)
+
+
+    def _query(self, left_set, right_set, X_k):
+        """Queries the sets at the approaches' current iterates (rows of X_k)
+
+        Returns:
+            numpy.ndarray: the points to project onto the outer approximation
+            list of tuple: the residual of each approach
+            list: the information obtained from the sets
+        """
+        if self.average:
+            if self.verbose:
+                print 'performing _averaged_ round'
+                print '\tprojecting onto left set ...'
+            Y_k, y_h_k = left_set.query_many(X_k)
+            if self.verbose:
+                print '\tprojecting onto right set ...'
+            Z_k, z_h_k = right_set.query_many(X_k)
+            X_k_prime = 0.5 * (Y_k + Z_k)
+        else:
+            if self.verbose:
+                print 'performing _alternating_ round'
+                print '\tprojecting onto left set ...'
+            Y_k, y_h_k = left_set.query_many(X_k)
+            if self.verbose:
+                print '\tprojecting (twice) onto right set ...'
+            # needed to compute residual
+            Z_k = right_set.project_many(X_k)
+            X_k_prime, z_h_k = right_set.query_many(Y_k)
+        curr_res = [self._compute_residual(x_k, y_k, z_k) for
+            x_k, y_k, z_k in zip(X_k, Y_k, Z_k)]
+        return X_k_prime, curr_res, y_h_k + z_h_k
+
+
+    def _advance(self, outer_manager, X_k, X_k_prime, approaches):
+        """Projects X_k_prime onto the outer approximation and steps"""
+        if self.verbose:
+            print '\tprojecting onto outer approximation ...'
+        X_k_plus = outer_manager.project_many(X_k_prime)
+        if self.theta != 1.0:
+            X_k_plus = relax(X_k_prime, X_k_plus, self.theta)
+        for x_k, x_k_plus, iterates in zip(X_k, X_k_plus, approaches):
+            if self.momentum is not None:
+                x_k_plus = heavy_ball_update(
+                    iterates=iterates, velocity=x_k_plus-x_k,
+                    alpha=self.momentum[0],
+                    beta=self.momentum[1])
+            iterates.append(x_k_plus)
 
 
     def solve(self, problem):
@@ -48,72 +138,171 @@ class MetaAPOP(Optimizer):
         left_set = problem.sets[0]
         right_set = problem.sets[1]
 
-        outer = left_set.outer(kind=ConvexOuter.POLYHEDRAL)
-        assert len(outer.hyperplanes()) == 0
-        assert len(outer.halfspaces()) == 0
-        self.outer_manager = DynamicPolyhedron(polyhedron=outer, 
-            max_hyperplanes=self.max_hyperplanes,
-            max_halfspaces=self.max_halfspaces, policy=self.outer_policy)
-        
         # TODO(akshayka): more intelligent selection of the initial iterate;
         # in particular, if solving a self-dual homogeneous embedding, we
         # must avoid convergence to zero.
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
-        residuals = []
-        approaches = [[np.random.randn(problem.dimension)] for _ in range(100)] + [[iterate]]
+        last_two = HistoryPolicy(History.LAST, keep_last=2)
+        approaches = [last_two.history(iterate.shape[0]) for _ in
+            range(self.num_approaches)] + [self._new_history(problem)]
+        for iterates in approaches[:-1]:
+            iterates.append(np.random.randn(iterate.shape[0]))
+        approaches[-1].append(iterate)
+        if self.num_workers > 1:
+            return self._solve_parallel(problem, approaches)
 
+        self.outer_manager = self._make_outer_manager(left_set)
+        residuals = np.zeros((self.max_iters, 2))
+        num_residuals = 0
         status = Optimizer.Status.INACCURATE
         for i in xrange(self.max_iters):
-            curr_res = []
-            curr_primes = []
-            for j, iterates in enumerate(approaches):
-                if self.verbose:
-                    print 'iteration %d [approach %d]' % (i, j)
-                x_k = iterates[-1]
-                if self.average:
-                    if self.verbose:
-                        print 'performing _averaged_ round'
-                        print '\tprojecting onto left set ...'
-                    y_k, y_h_k = left_set.query(x_k)
-                    if self.verbose:
-                        print '\tprojecting onto right set ...'
-                    z_k, z_h_k = right_set.query(x_k)
-                    x_k_prime = 0.5 * (y_k + z_k)
-                else:
-                    if self.verbose:
-                        print 'performing _alternating_ round'
-                        print '\tprojecting onto left set ...'
-                    y_k, y_h_k = left_set.query(x_k)
-                    if self.verbose:
-                        print '\tprojecting (twice) onto right set ...'
-                    z_k = right_set.project(x_k) # needed to compute residual
-                    x_k_prime, z_h_k = right_set.query(y_k)
-
-                curr_primes.append(x_k_prime)
-                curr_res.append(self._compute_residual(x_k, y_k, z_k))
-                self.outer_manager.add(y_h_k + z_h_k)
+            if self.verbose:
+                print 'iteration %d [%d approaches]' % (i, len(approaches))
+            # the approaches are projected all at once, as the rows of X_k
+            X_k = np.array([iterates[-1] for iterates in approaches])
+            X_k_prime, curr_res, info = self._query(left_set, right_set, X_k)
+            self.outer_manager.add(info)
 
             # Compute the minimum residual
-            residuals.append(min(curr_res, key=lambda r: sum(r)))
+            residuals[i] = min(curr_res, key=lambda r: sum(r))
+            num_residuals = i + 1
             if self.verbose:
-                print '\tminimum residual: %e' % sum(residuals[-1])
-            if self._is_optimal(residuals[-1]):
+                print '\tminimum residual: %e' % sum(residuals[i])
+            if self._is_optimal(residuals[i]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
 
             # Do the projection and _share_ the info across each approach
-            for x_k_prime, iterates in zip(curr_primes, approaches):
+            self._advance(self.outer_manager, X_k, X_k_prime, approaches)
+        return approaches[-1], residuals[:num_residuals], status
+
+
+    def _solve_parallel(self, problem, approaches):
+        dim = approaches[0][-1].shape[0]
+        cut_pool = SharedCutPool(dim, self.cut_pool_capacity)
+        chunks = np.array_split(np.arange(len(approaches)),
+            min(self.num_workers, len(approaches)))
+        results = Queue()
+        workers = []
+        for index, chunk in enumerate(chunks):
+            commands = Queue()
+            process = Process(target=self._serve_approaches,
+                args=(problem, [approaches[j] for j in chunk], cut_pool,
+                    commands, results, index, np.random.randint(2**31)))
+            process.daemon = True
+            process.start()
+            workers.append((process, commands))
+
+        def receive():
+            while True:
+                try:
+                    index, result = results.get(timeout=0.1)
+                except Empty:
+                    # a worker that exits cleanly has put its last result,
+                    # which may still be in transit
+                    for process, _ in workers:
+                        if not process.is_alive() and process.exitcode != 0:
+                            raise RuntimeError('MetaAPOP worker died with '
+                                'exit code %d' % process.exitcode)
+                    continue
+                if isinstance(result, str):
+                    raise RuntimeError('MetaAPOP worker %d failed:\n%s' % (
+                        index, result))
+                return index, result
+
+        # Workers are sent the number of cuts put in the current round, upon
+        # which they read these cuts and advance their approaches;
+        # ('stop', num_cuts) additionally tells them to return their
+        # iterates after doing so (if num_cuts is not None). Every worker
+        # has read the cuts of the previous round once it reports its
+        # residual, so that its half of the pool can then be reused.
+        residuals = np.zeros((self.max_iters, 2))
+        num_residuals = 0
+        status = Optimizer.Status.INACCURATE
+        last_cuts = None
+        try:
+            for i in xrange(self.max_iters):
+                # every worker reports its minimum residual once it has
+                # put its cuts in the pool
+                curr_res = [receive()[1] for _ in workers]
+                residuals[i] = min(curr_res, key=lambda r: sum(r))
+                num_residuals = i + 1
                 if self.verbose:
-                    print '\tprojecting onto outer approximation ...'
-                x_k_plus = self.outer_manager.outer().project(x_k_prime)
-                if self.theta != 1.0:
-                    x_k_plus = relax(x_k_prime, x_k_plus, self.theta)
-                if self.momentum is not None:
-                    x_k_plus = heavy_ball_update(
-                        iterates=iterates, velocity=x_k_plus-x_k,
-                        alpha=self.momentum[0],
-                        beta=self.momentum[1])
-                iterates.append(x_k_plus)
-        return iterates, residuals, status
+                    print 'iteration %d: minimum residual: %e' % (i,
+                        sum(residuals[i]))
+                if self._is_optimal(residuals[i]):
+                    status = Optimizer.Status.OPTIMAL
+                    if not self.do_all_iters:
+                        break
+                num_cuts = cut_pool.count(i)
+                if i == self.max_iters - 1:
+                    last_cuts = num_cuts
+                    break
+                cut_pool.clear(i + 1)
+                for _, commands in workers:
+                    commands.put(num_cuts)
+
+            for _, commands in workers:
+                commands.put(('stop', last_cuts))
+            # the last approach belongs to the last worker
+            iterates = dict(receive() for _ in workers)[len(workers) - 1]
+        finally:
+            for process, _ in workers:
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+        return iterates, residuals[:num_residuals], status
+
+
+    def _serve_approaches(self, problem, approaches, cut_pool, commands,
+            results, index, seed):
+        """Main loop of a MetaAPOP worker"""
+        try:
+            np.random.seed(seed)
+            random.seed(seed)
+            # the projection pool of the parent belongs to the parent
+            utils.reset_default_pool()
+            left_set, right_set = problem.sets
+            x = left_set._x
+            x_slice = projectable_utils.var_slice(x)
+            outer_manager = self._make_outer_manager(left_set)
+            k = 0
+            while True:
+                X_k = np.array([iterates[-1] for iterates in approaches])
+                X_k_prime, curr_res, info = self._query(left_set, right_set,
+                    X_k)
+                local = []
+                for h in info:
+                    if h._A.shape[0] > 1:
+                        local.append(h)
+                        continue
+                    a = projectable_utils.embedded_normals(h, x_slice, dim=
+                        cut_pool.dim)
+                    a = (a.toarray() if scipy.sparse.issparse(a) else
+                        np.asarray(a))[0]
+                    kind = (SharedCutPool.HYPERPLANE if type(h) == Hyperplane
+                        else SharedCutPool.HALFSPACE)
+                    cut_pool.put(k, a, h._offsets[0], kind, h.pin)
+                outer_manager.add(local)
+                results.put((index, min(curr_res, key=lambda r: sum(r))))
+
+                command = commands.get()
+                stop = isinstance(command, tuple)
+                num_cuts = command[1] if stop else command
+                if num_cuts is None:
+                    break
+                shared = []
+                for a, b, kind, pin in cut_pool.get(k, num_cuts):
+                    cls = Hyperplane if kind == SharedCutPool.HYPERPLANE else (
+                        Halfspace)
+                    shared.append(cls(x, a, b, pin=pin))
+                k += 1
+                outer_manager.add(shared)
+                self._advance(outer_manager, X_k, X_k_prime, approaches)
+                if stop:
+                    break
+            results.put((index, approaches[-1]))
+        except Exception:
+            results.put((index, traceback.format_exc()))
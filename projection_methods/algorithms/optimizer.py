@@ -2,18 +2,26 @@ import abc
 
 import numpy as np
 
+from projection_methods.algorithms.history import HistoryPolicy
+
 class Optimizer(object):
     class Status(object):
         OPTIMAL, INACCURATE, INFEASIBLE = range(3)
 
 
     def __init__(self, max_iters=100, atol=10e-8, do_all_iters=False,
-        initial_iterate=None, verbose=False):
+        initial_iterate=None, verbose=False, history=None):
+        """
+        Args:
+            history (HistoryPolicy): the policy by which solve records
+                iterates; defaults to recording every iterate in memory
+        """
         self._max_iters = max_iters
         self._atol = atol
         self.do_all_iters = do_all_iters
         self._initial_iterate = initial_iterate
         self.verbose = verbose
+        self.history = history if history is not None else HistoryPolicy()
 
 
     @abc.abstractmethod
@@ -41,6 +49,11 @@ class Optimizer(object):
             raise ValueError('atol must be >= 0')
         self._atol = atol
 
+    def _new_history(self, problem, suffix=''):
+        """Returns an empty History for the iterates of problem"""
+        return self.history.history(int(np.prod(problem.dimension)),
+            capacity=self.max_iters + 1, suffix=suffix)
+
     def _compute_residual(self, x_k, y_k, z_k):
         """Returns tuple (dist from left set squared,
         dist from right set squared)"""
@@ -7,9 +7,9 @@ class Polyak(Optimizer):
     # TODO(akshayka): Add relaxation support?
     def __init__(self,
             max_iters=100, atol=10e-5, do_all_iters=False, initial_iterate=None,
-            momentum=None, verbose=False):
+            momentum=None, verbose=False, history=None):
         super(Polyak, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate, verbose)
+            initial_iterate, verbose, history)
         self.momentum = momentum
 
 
@@ -19,8 +19,8 @@ class Polyak(Optimizer):
 
         iterate = (self._initial_iterate if
             self._initial_iterate is not None else np.ones(problem.dimension))
-        iterates = [iterate]
-        residuals = []
+        iterates = self._new_history(problem)
+        iterates.append(iterate)
 
         status = Optimizer.Status.INACCURATE
         for i in xrange(self.max_iters):
@@ -30,10 +30,10 @@ class Polyak(Optimizer):
             x_k_1 = left_set.project(x_k)
             tmp = right_set.project(x_k)
 
-            residuals.append(self._compute_residual(x_k, x_k_1, tmp))
+            iterates.push_residual(self._compute_residual(x_k, x_k_1, tmp))
             if self.verbose:
-                print '\tresidual: %e' % sum(residuals[-1])
-            if self._is_optimal(residuals[-1]):
+                print '\tresidual: %e' % sum(iterates.residuals[-1])
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
@@ -52,4 +52,4 @@ class Polyak(Optimizer):
                     beta=self.momentum['beta'])
             iterates.append(x_k_4)
 
-        return iterates, residuals, status
+        return iterates, iterates.residuals, status
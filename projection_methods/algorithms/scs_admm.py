@@ -1,77 +1,207 @@
 import numpy as np
+import scipy.sparse
 
 from projection_methods.algorithms.apop import APOP
 from projection_methods.algorithms.optimizer import Optimizer
+from projection_methods.oracles.factorization_cache import SparseLU
+import projection_methods.oracles.factorization_cache as factorization_cache
 from projection_methods.problems.problems import SCSProblem
 
+
+class SCSLinearSystem(object):
+    """Solves the linear systems of SCS, with one factorization
+
+    Recall that the affine set of an SCSProblem is {(u, v) | Qu = v}, where
+
+        Q = [[0,    A.T,  c],        [[M,    h],
+             [-A,   0,    b],   =     [-h.T, 0]],
+             [-c.T, -b.T, 0]]
+
+    with h = (c, b). Since Q is skew-symmetric, the projection of (w, w)
+    onto the affine set is (u, w - u), where (I + Q) u = w; SCS's iteration
+    needs only this solve, which involves half as many variables as a
+    projection onto the affine set in (u, v).
+
+    Systems in I + Q are reduced to systems in I + M by block elimination
+    of the rank-one border (h, -h.T), and systems in I + M are solved with
+    the quasidefinite matrix [[I, A.T], [A, -I]], which is factored once
+    (and shared through the factorization cache). The same factorization
+    solves systems in (I + Q).T, which yields the exact projection of any
+    (u, v) onto the affine set.
+
+    Attributes:
+        n (int): the number of columns of A
+        m (int): the number of rows of A
+    """
+    def __init__(self, A, b, c):
+        """
+        Args:
+            A (np.matrix or scipy.sparse matrix): the data matrix
+            b (array-like): the data vector b
+            c (array-like): the data vector c
+        """
+        A = scipy.sparse.csc_matrix(A, dtype=float)
+        self.m, self.n = A.shape
+        self._A = A
+        self._h = np.hstack((np.asarray(c, dtype=float).flatten(),
+            np.asarray(b, dtype=float).flatten()))
+        self._solver = None
+        self._g = None
+        self._g_transpose = None
+        self._denominator = None
+
+
+    def _factor(self):
+        def factor():
+            A = self._A
+            kkt_matrix = scipy.sparse.bmat([
+                [scipy.sparse.eye(self.n), A.T],
+                [A, -scipy.sparse.eye(self.m)]], format='csc')
+            # the matrix is quasidefinite, so that it can be factored with
+            # any symmetric ordering and without pivoting off the diagonal
+            return SparseLU.factor(kkt_matrix, permc_spec='MMD_AT_PLUS_A',
+                diag_pivot_thresh=0, options=dict(SymmetricMode=True))
+        self._solver = factorization_cache.default_cache().get(
+            factorization_cache.fingerprint(self._A, 'scs'), factor)
+        self._g = self._solve_m(self._h)
+        self._g_transpose = self._solve_m(self._h, transpose=True)
+        self._denominator = 1 + self._h.dot(self._g)
+
+
+    def _solve_m(self, r, transpose=False):
+        """Returns z such that (I + M) z = r, or (I + M).T z = r
+
+        (I + M) (x, y) = (r_x, r_y) if and only if
+        [[I, A.T], [A, -I]] (x, y) = (r_x, -r_y), and
+        (I + M).T (x, y) = (r_x, r_y) if and only if
+        [[I, A.T], [A, -I]] (x, -y) = (r_x, r_y).
+        """
+        n = self.n
+        rhs = r.copy()
+        if not transpose:
+            rhs[n:] *= -1
+        z = self._solver(rhs)
+        if transpose:
+            z[n:] *= -1
+        return z
+
+
+    def solve(self, w):
+        """Returns the solution u of (I + Q) u = w"""
+        if self._solver is None:
+            self._factor()
+        k = self.n + self.m
+        z = self._solve_m(w[:k])
+        tau = (w[k] + self._h.dot(z)) / self._denominator
+        z -= tau * self._g
+        return np.append(z, tau)
+
+
+    def solve_transpose(self, w):
+        """Returns the solution u of (I + Q).T u = w"""
+        if self._solver is None:
+            self._factor()
+        k = self.n + self.m
+        z = self._solve_m(w[:k], transpose=True)
+        tau = (w[k] - self._h.dot(z)) / self._denominator
+        z += tau * self._g_transpose
+        return np.append(z, tau)
+
+
+    def apply_q(self, u):
+        """Returns Q u"""
+        n, k = self.n, self.n + self.m
+        p, y, tau = u[:n], u[n:k], u[k]
+        return np.hstack((self._A.T.dot(y) + tau * self._h[:n],
+            -self._A.dot(p) + tau * self._h[n:], -self._h.dot(u[:k])))
+
+
+    def project(self, u, v):
+        """Returns the projection of (u, v) onto {(u, v) | Qu = v}
+
+        The projection is (u', Q u'), where (I + Q.T Q) u' = u + Q.T v; as
+        Q is skew-symmetric, I + Q.T Q = (I + Q).T (I + Q).
+        """
+        u_star = self.solve(self.solve_transpose(u - self.apply_q(v)))
+        return np.hstack((u_star, self.apply_q(u_star)))
+
+
 class SCSADMM(Optimizer):
     def __init__(self,
             max_iters=100, atol=10e-8, do_all_iters=False, polish=False,
-            verbose=False):
+            verbose=False, history=None):
         super(SCSADMM, self).__init__(max_iters, atol, do_all_iters,
-            initial_iterate=None, verbose=verbose)
+            initial_iterate=None, verbose=verbose, history=history)
         self.polish = polish
 
-    def _u(self, problem, uv):
-        return np.hstack((problem.p(uv), problem.y(uv), problem.tau(uv)))
-
-    def _v(self, problem, uv):
-        return np.hstack((problem.r(uv), problem.s(uv), problem.kappa(uv)))
-
     def solve(self, problem):
         if not isinstance(problem, SCSProblem):
             raise ValueError('SCSADMM can only solve SCSProblem instances, '
                 'but received an instance of %s' % type(problem))
         product_set = problem.sets[0]
         affine_set = problem.sets[1]
-            
+        system = SCSLinearSystem(problem.A, problem.b, problem.c)
+        k = problem.n + problem.m + 1
+
         iterate = np.ones(problem.dimension)
-        iterates = [iterate]
-        residuals = []
+        iterates = self._new_history(problem)
+        iterates.append(iterate)
         info = []
+        # (u_k_prime, v_k_prime), the point projected onto the product set
+        uv_k_prime = np.empty(problem.dimension)
 
         status = Optimizer.Status.INACCURATE
         for i in xrange(self.max_iters):
             if self.verbose:
                 print 'iteration %d' % i
             uv_k = iterates[-1]
-            residuals.append(self._compute_residual(
-                uv_k, product_set.project(uv_k), affine_set.project(uv_k)))
+            u_k, v_k = problem.u(uv_k), problem.v(uv_k)
+            # every iterate but the first is a projection onto the product
+            # set, and thus its own projection
+            uv_k_star = uv_k if i > 0 else product_set.project(uv_k)
+            uv_k_affine = (uv_k if affine_set.contains(uv_k) else
+                system.project(u_k, v_k))
+            iterates.push_residual(self._compute_residual(
+                uv_k, uv_k_star, uv_k_affine))
             if self.verbose:
-                r = residuals[-1]
+                r = iterates.residuals[-1]
                 print '\tresidual: %e' % sum(r)
                 print '\t\tproduct: %e' % r[0]
                 print '\t\taffine: %e' % r[1]
-            if self._is_optimal(residuals[-1]):
+            if self._is_optimal(iterates.residuals[-1]):
                 status = Optimizer.Status.OPTIMAL
                 if not self.do_all_iters:
                     break
 
-            # Parse uv into its components
-            u_k = self._u(problem, uv_k)
-            v_k = self._v(problem, uv_k)
+            # Project (u_k + v_k, u_k + v_k) onto the affine set, obtaining
+            # (u_k_tilde, v_k_tilde) = (u_k_tilde, u_k + v_k - u_k_tilde)
             u_k_plus_v_k = u_k + v_k
-            # Project onto the affine set and parse
-            uv_k_tilde, h_a = affine_set.query(np.hstack(
-                (u_k_plus_v_k, u_k_plus_v_k)))
-            u_k_tilde = self._u(problem, uv_k_tilde)    
-            v_k_tilde = self._v(problem, uv_k_tilde)
-            # Note that we could have used the Moreau decomposition here to
-            # save on computation, but computing both cone projections
-            # explicitly is easier with my code
-            u_k_prime = u_k_tilde - v_k
-            v_k_prime = v_k_tilde - u_k
-            uv_k_plus, h_p = product_set.query(np.hstack(
-                (u_k_prime, v_k_prime)))
-            iterates.append(uv_k_plus)
-            info.extend(h_a + h_p)
+            u_k_tilde = system.solve(u_k_plus_v_k)
+            # u_k_prime = u_k_tilde - v_k, and
+            # v_k_prime = v_k_tilde - u_k = v_k - u_k_tilde. Note that we
+            # could have used the Moreau decomposition here to save on
+            # computation, but computing both cone projections explicitly is
+            # easier with my code
+            np.subtract(u_k_tilde, v_k, out=uv_k_prime[:k])
+            np.negative(uv_k_prime[:k], out=uv_k_prime[k:])
+            if self.polish:
+                # the information is only needed to polish the result
+                h_a = affine_set._information(np.hstack((u_k_plus_v_k,
+                    u_k_plus_v_k)), np.hstack((u_k_tilde,
+                    u_k_plus_v_k - u_k_tilde)))
+                uv_k_plus, h_p = product_set.query(uv_k_prime)
+                info.extend(h_a + h_p)
+            else:
+                uv_k_plus = product_set.project(uv_k_prime)
+            iterates.append(uv_k_plus, copy=uv_k_plus is uv_k_prime)
         # TODO(akshayka): Consider polishing the result at this step, or even
         # running apop using the final iterate
         if self.polish:
             polisher = APOP(max_iters=100, atol=self.atol, do_all_iters=True,
                 initial_iterate=iterates[-1],
-                average=False, info=info, verbose=True)
+                average=False, info=info, verbose=True,
+                history=self.history.with_suffix('_polish'))
             it, res, status = polisher.solve(problem)
             iterates.extend(it)
-            residuals.extend(res)
-        return iterates, residuals, status
+            iterates.extend_residuals(res)
+        return iterates, iterates.residuals, status
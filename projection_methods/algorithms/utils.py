@@ -1,12 +1,334 @@
+import atexit
+import collections
+import itertools
 import logging
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Queue, Value
+from multiprocessing.sharedctypes import RawArray
 from Queue import Empty
+import time
 
 import cvxpy
 import numpy as np
 
 
-def project(x_0, cvxpy_set, cvxpy_var):
+class ProjectionPool(object):
+    """A pool of long-lived processes that project onto cvxpy-defined sets
+
+    Projections onto sets defined by cvxpy constraints are computed in worker
+    processes, so that a solver crash (MOSEK sometimes segfaults) cannot take
+    down the client. Workers are started once and kept alive across
+    projections. The constraints defining a set are shipped to a worker only
+    the first time the worker sees the set's registration key, at which point
+    the worker compiles a ProjectionProblem for the set; thereafter, only the
+    point to project is sent, and the compiled problem is re-solved. Each
+    worker holds at most max_sets sets, evicting the least recently used.
+
+    Should a solver fail, time out, or crash its worker, the projection is
+    retried with the next solver in the list of solvers; a dead or hung worker
+    is restarted.
+
+    Attributes:
+        num_workers (int): number of worker processes
+        timeout (float): seconds to wait for a single projection, or None to
+            wait for as long as the worker is alive
+        solvers (list of str): cvxpy solvers to try, in order
+        max_sets (int): maximum number of sets cached per worker
+    """
+    def __init__(self, num_workers=1, timeout=None,
+            solvers=[cvxpy.MOSEK, cvxpy.ECOS, cvxpy.MOSEK], max_sets=128):
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.solvers = solvers
+        self.max_sets = max_sets
+        self._keys = itertools.count()
+        self._workers = [_ProjectionWorker(max_sets)
+            for _ in xrange(num_workers)]
+        self._next_worker = 0
+
+
+    def new_key(self):
+        """Returns a fresh registration key"""
+        return next(self._keys)
+
+
+    def project(self, x_0, cvxpy_set, cvxpy_var, key=None):
+        """Project onto a convex set
+
+        Args:
+            x_0 (array-like): the point to project
+            cvxpy_set (list): list of cvxpy constraints defining a convex set
+            cvxpy_var (cvxpy.Variable): cvxpy variable used in specifying
+                cvxpy_set
+            key (int): a registration key obtained from new_key(), under which
+                workers cache cvxpy_set and cvxpy_var; if None, the set is
+                shipped to the worker and discarded after the projection
+        Returns:
+            array-like: the projection of x_0 onto cvxpy_set
+            float: the distance between x_0 and its projection
+        Raises:
+            RuntimeError if every solver fails
+        """
+        if cvxpy_set == []:
+            return x_0, 0
+        worker = self._workers[self._next_worker]
+        self._next_worker = (self._next_worker + 1) % self.num_workers
+        for solver in self.solvers:
+            result = worker.project(x_0, cvxpy_set, cvxpy_var, key, solver,
+                self.timeout)
+            if result is not None:
+                return result
+        raise RuntimeError('Every solver failed to project onto the set')
+
+
+    def unregister(self, key):
+        """Evicts the set registered under key from every worker"""
+        for worker in self._workers:
+            worker.unregister(key)
+
+
+    def close(self):
+        """Shuts down every worker"""
+        for worker in self._workers:
+            worker.stop()
+
+
+class _ProjectionWorker(object):
+    """A worker process of a ProjectionPool, started on first use"""
+    # seconds between checks on the health of the worker
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, max_sets):
+        self.max_sets = max_sets
+        self._process = None
+
+
+    def _start(self):
+        self._requests = Queue()
+        self._responses = Queue()
+        self._keys = collections.OrderedDict()
+        self._process = Process(target=_serve_projections,
+            args=(self._requests, self._responses))
+        self._process.daemon = True
+        self._process.start()
+
+
+    def stop(self):
+        if self._process is not None and self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(1)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+
+
+    def _restart(self):
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        self._start()
+
+
+    def unregister(self, key):
+        if self._process is not None and key in self._keys:
+            del self._keys[key]
+            self._requests.put(('unregister', key))
+
+
+    def project(self, x_0, cvxpy_set, cvxpy_var, key, solver, timeout):
+        """Returns (x_star, distance), or None if the solver failed
+
+        A key whose projection failed is unregistered, so that a failed
+        registration is retried with the next projection.
+        """
+        result = self._project(x_0, cvxpy_set, cvxpy_var, key, solver,
+            timeout)
+        if result is None:
+            self.unregister(key)
+        return result
+
+
+    def _project(self, x_0, cvxpy_set, cvxpy_var, key, solver, timeout):
+        if self._process is None:
+            self._start()
+        if key is None:
+            self._requests.put(('project', x_0, solver, cvxpy_set, cvxpy_var))
+        else:
+            if key in self._keys:
+                # mark key as most recently used
+                del self._keys[key]
+            else:
+                self._requests.put(('register', key, cvxpy_set, cvxpy_var))
+                if len(self._keys) >= self.max_sets:
+                    stale, _ = self._keys.popitem(last=False)
+                    self._requests.put(('unregister', stale))
+            self._keys[key] = True
+            self._requests.put(('project', x_0, solver, key))
+
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            try:
+                result = self._responses.get(timeout=self.POLL_INTERVAL)
+                break
+            except Empty:
+                if not self._process.is_alive():
+                    logging.warning('Solver %s failed with exit code %d',
+                        solver, self._process.exitcode)
+                    self._restart()
+                    return None
+                if deadline is not None and time.time() > deadline:
+                    logging.warning('Solver %s timed out after %.1f seconds',
+                        solver, timeout)
+                    self._restart()
+                    return None
+        if isinstance(result, str):
+            logging.warning('Solver %s failed (%s)', solver, result)
+            return None
+        return result
+
+
+def _serve_projections(requests, responses):
+    """Main loop of a projection worker"""
+    problems = {}
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        command = request[0]
+        if command == 'register':
+            _, key, cvxpy_set, cvxpy_var = request
+            try:
+                problems[key] = ProjectionProblem(cvxpy_set, cvxpy_var)
+            except Exception as e:
+                # reported by the projection that follows
+                problems[key] = e
+        elif command == 'unregister':
+            problems.pop(request[1], None)
+        elif command == 'project':
+            x_0, solver = request[1:3]
+            try:
+                if len(request) == 4:
+                    problem = problems[request[3]]
+                    if isinstance(problem, Exception):
+                        raise problem
+                    responses.put(problem.solve(x_0, solver))
+                else:
+                    responses.put(project_aux(x_0, request[3], request[4],
+                        solver))
+            except Exception as e:
+                responses.put('%s: %s' % (type(e).__name__, str(e)))
+
+
+_default_pool = None
+
+
+def default_pool():
+    """Returns the ProjectionPool shared by every Projectable"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = ProjectionPool()
+        atexit.register(_default_pool.close)
+    return _default_pool
+
+
+def reset_default_pool():
+    """Forgets the default ProjectionPool, without closing it
+
+    To be called in processes forked from the one that owns the default
+    pool, whose workers they must neither use nor stop; the next call to
+    default_pool() starts a pool of their own.
+    """
+    global _default_pool
+    _default_pool = None
+
+
+class SharedCutPool(object):
+    """A double buffer of cuts in shared memory
+
+    Processes forked after the pool is created exchange halfspaces and
+    hyperplanes by writing their data, rather than pickled cvxpy objects, to
+    shared memory. Each row of the buffer holds a cut a.T x (<=, ==) b,
+    with its normal embedded in the coordinates of a variable of length dim,
+    together with its kind.
+
+    Cuts are exchanged in rounds, and the cuts of a round are written to the
+    half of the buffer that belongs to its parity, so that the cuts of one
+    round can be written while those of the previous round are still being
+    read. A half must be cleared before it is reused, once every reader is
+    done with the round that last used it.
+
+    Attributes:
+        dim (int): the length of the normals
+        capacity (int): the number of cuts that a round can hold
+    """
+    HALFSPACE, HYPERPLANE = range(2)
+
+    def __init__(self, dim, capacity=4096):
+        self.dim = dim
+        self.capacity = capacity
+        # columns: normal, offset, kind, pin
+        self._data = RawArray('d', 2 * capacity * (dim + 3))
+        self._counts = [Value('l', 0), Value('l', 0)]
+        self._rows = None
+
+
+    def rows(self, k):
+        """Returns the half of the buffer of round k, of shape
+        capacity x (dim + 3)"""
+        if self._rows is None:
+            self._rows = np.frombuffer(self._data).reshape(2, self.capacity,
+                self.dim + 3)
+        return self._rows[k % 2]
+
+
+    def count(self, k):
+        """Returns the number of cuts put in round k"""
+        return self._counts[k % 2].value
+
+
+    def clear(self, k):
+        """Empties the half of the buffer of round k, for reuse"""
+        self._counts[k % 2].value = 0
+
+
+    def put(self, k, a, b, kind, pin=False):
+        """Writes a cut of round k to the pool
+
+        Args:
+            k (int): the round to which the cut belongs
+            a (numpy.ndarray): normal, of length dim
+            b (float): offset
+            kind (int): SharedCutPool.HALFSPACE or SharedCutPool.HYPERPLANE
+            pin (bool): whether the cut is pinned
+        Raises:
+            RuntimeError if round k already holds capacity cuts
+        """
+        count = self._counts[k % 2]
+        with count.get_lock():
+            i = count.value
+            if i >= self.capacity:
+                raise RuntimeError('Cut pool overflowed: more than %d cuts '
+                    'in one round; increase its capacity' % self.capacity)
+            count.value += 1
+        row = self.rows(k)[i]
+        row[:self.dim] = a
+        row[self.dim:] = (b, kind, pin)
+
+
+    def get(self, k, stop):
+        """Returns the first stop cuts put in round k
+
+        Args:
+            k (int): the round whose cuts to return
+            stop (int): the number of cuts to return; at most count(k)
+        Returns:
+            list of tuple: (a, b, kind, pin) for every cut, oldest first
+        """
+        return [(row[:self.dim].copy(), row[self.dim],
+            int(row[self.dim + 1]), bool(row[self.dim + 2])) for row in
+            self.rows(k)[:stop]]
+
+
+def project(x_0, cvxpy_set, cvxpy_var, key=None):
     """ 
     Project onto a convex set.
 
@@ -18,82 +340,104 @@ def project(x_0, cvxpy_set, cvxpy_var):
         List of cvxpy constraints defining a convex set.
     cvxpy_var : cvxpy.Variable
         cvxpy variable used in specifying cvxpy_set
+    key : int
+        Optional registration key under which the default pool's workers
+        cache cvxpy_set (see ProjectionPool.project)
 
     Returns
     -------
     The projection of x_0 onto cvxpy_set : list-like (float)
     """
-    solvers = [cvxpy.MOSEK, cvxpy.ECOS, cvxpy.MOSEK]
-    for solver in solvers:
-        q = Queue()
-        p = Process(target=project_aux, args=(q, x_0, cvxpy_set, cvxpy_var,
-            solver))
-        p.start()
-        p.join()
-        try:
-            x_star = q.get(block=False)
-            break
-        except Empty:
-            logging.warning('Solver %s failed with exit code %d',
-                solver, p.exitcode)
-    return x_star
+    return default_pool().project(x_0, cvxpy_set, cvxpy_var, key)[0]
+
+
+class ProjectionProblem(object):
+    """A projection problem that is compiled once and solved many times
+
+    The problem of projecting onto a set defined by cvxpy constraints is
+    built once, with the point to project as a cvxpy.Parameter, so that cvxpy
+    canonicalizes it only once; subsequent solves merely update the parameter
+    and warm-start the solver.
+
+    Attributes:
+        cvxpy_set (list): list of cvxpy constraints defining a convex set
+        cvxpy_var (cvxpy.Variable): cvxpy variable used in specifying
+            cvxpy_set
+    """
+    def __init__(self, cvxpy_set, cvxpy_var):
+        self.cvxpy_set = cvxpy_set
+        self.cvxpy_var = cvxpy_var
+        self._x_0 = cvxpy.Parameter(*cvxpy_var.size)
+        self._obj = cvxpy.Minimize(cvxpy.pnorm(cvxpy_var - self._x_0, 2))
+        self._prob = cvxpy.Problem(self._obj, cvxpy_set)
+
 
+    def solve(self, x_0, solver=cvxpy.MOSEK, use_indirect=True, abstol=1e-8,
+            reltol=1e-3, feastol=1e-4):
+        """Return the projection and the distance"""
+        # If the projection is unconstrained, the projection is trivially
+        # idempotent
+        if self.cvxpy_set == []:
+            return x_0, 0
 
-def project_aux(q, x_0, cvxpy_set, cvxpy_var, solver=cvxpy.MOSEK,
-    use_indirect=True, abstol=1e-8, reltol=1e-3, feastol=1e-4):
+        self._x_0.value = x_0
+        obj = self._obj
+        prob = self._prob
+
+        # MOSEK sometimes segfaults
+        #
+        # ECOS sometimes fails at high tolerances
+        #
+        # SCS (indirect == True) sometimes returns values that are
+        #  1. an order of magnitude different from the explicitly computed
+        #     distance,
+        #  2. and practically every value is somewhat different from the
+        #     latter
+        # SCS (indirect == False) has problem 2. of (SCS indirect == True)
+        if solver == cvxpy.MOSEK:
+            solver_dist = prob.solve(solver=cvxpy.MOSEK, warm_start=True)
+        elif solver == cvxpy.SCS:
+            solver_dist = prob.solve(solver=cvxpy.SCS,
+                use_indirect=use_indirect, warm_start=True)
+        else:
+            solved = False
+            while abstol <= 1:
+                try:
+                    solver_dist = prob.solve(solver=cvxpy.ECOS,
+                        abstol=abstol, reltol=reltol, feastol=feastol)
+                    solved = True
+                    break
+                except cvxpy.error.SolverError as e:
+                    abstol *= 10
+                    reltol *= 10
+                    feastol *= 10
+                    logging.warning(
+                        'ECOS failed (%s) with tol %.1e; retrying with tol '
+                        '%.1e', str(e), abstol / 10, abstol)
+            if not solved:
+                logging.warning('ECOS failed.')
+
+        x_star = np.array(self.cvxpy_var.value).flatten()
+        np_dist = np.linalg.norm(x_star - x_0, 2)
+
+        if not np.isclose(obj.value, np_dist):
+            logging.warning('obj.value (%f) != np_dist (%f)', obj.value,
+                np_dist)
+        if not np.isclose(np_dist, solver_dist, atol=1e-5):
+            logging.warning('solver_dist (%f) != np_dist (%f)',
+                solver_dist, np_dist)
+
+        if (prob.status != cvxpy.OPTIMAL and
+                prob.status != cvxpy.OPTIMAL_INACCURATE):
+            logging.warning('problem status %s', prob.status)
+
+        return x_star, np_dist
+
+
+def project_aux(x_0, cvxpy_set, cvxpy_var, solver=cvxpy.MOSEK, **kwargs):
     """Return the projection and the distance"""
-    # If the projection is unconstrained, the projection is trivially
-    # idempotent
-    if cvxpy_set == []:
-        return x_0, 0
-
-    obj = cvxpy.Minimize(cvxpy.pnorm(cvxpy_var - x_0, 2))
-    prob = cvxpy.Problem(obj, cvxpy_set)
-
-    # MOSEK sometimes segfaults
-    #
-    # ECOS sometimes fails at high tolerances
-    #
-    # SCS (indirect == True) sometimes returns values that are
-    #  1. an order of magnitude different from the explicitly computed distance,
-    #  2. and practically every value is somewhat different from the latter
-    # SCS (indirect == False) has problem 2. of (SCS indirect == True)
-    if solver == cvxpy.MOSEK:
-        solver_dist = prob.solve(solver=cvxpy.MOSEK)
-    elif solver == cvxpy.SCS:
-        solver_dist = prob.solve(solver=cvxpy.SCS, use_indirect=use_indirect)
-    else:
-        solved = False
-        while abstol <= 1:
-            try:
-                solver_dist = prob.solve(solver=cvxpy.ECOS,
-                    abstol=abstol, reltol=reltol, feastol=feastol)
-                solved = True
-                break
-            except cvxpy.error.SolverError as e:
-                abstol *= 10
-                reltol *= 10
-                feastol *= 10
-                logging.warning(
-                    'ECOS failed (%s) with tol %.1e; retrying with tol %.1e',
-                    str(e), abstol / 10, abstol)
-        if not solved:
-            logging.warning('ECOS failed.')
-
-    x_star = np.array(cvxpy_var.value).flatten()
-    np_dist = np.linalg.norm(x_star - x_0, 2)
-
-    if not np.isclose(obj.value, np_dist):
-        logging.warning('obj.value (%f) != np_dist (%f)', obj.value, np_dist)
-    if not np.isclose(np_dist, solver_dist, atol=1e-5):
-        logging.warning('solver_dist (%f) != np_dist (%f)',
-            solver_dist, np_dist)
-
-    if prob.status != cvxpy.OPTIMAL and prob.status != cvxpy.OPTIMAL_INACCURATE:
-        logging.warning('problem status %s', prob.status)
-
-    q.put(x_star)
-    q.put(np_dist)
+    return ProjectionProblem(cvxpy_set, cvxpy_var).solve(x_0, solver,
+        **kwargs)
 
 
 def plane_search(iterates, num_iterates, cvxpy_set, cvxpy_var):
@@ -10,11 +10,17 @@ from projection_methods.algorithms.avgp import AvgP
 from projection_methods.algorithms.apop import APOP
 from projection_methods.algorithms.meta_apop import MetaAPOP
 from projection_methods.algorithms.dykstra import Dykstra
+from projection_methods.algorithms.history import History, HistoryPolicy
 from projection_methods.algorithms.polyak import Polyak
 from projection_methods.algorithms.scs_admm import SCSADMM
 from projection_methods.oracles.affine_set import AffineSet
 from projection_methods.oracles.dynamic_polyhedron import PolyOuter
+import projection_methods.oracles.factorization_cache as factorization_cache
+from projection_methods.problems.presolve import presolve
+from projection_methods.problems.presolve import PresolvedSCSProblem
 from projection_methods.problems.problems import SCSProblem
+from projection_methods.problems.scaling import equilibrate
+from projection_methods.problems.scaling import ScaledSCSProblem
 
 
 k_alt_p = 'altp'
@@ -32,12 +38,16 @@ k_elra = 'elra'
 k_erandom = 'erandom'
 k_ereset = 'ereset'
 k_subsample = 'subsample'
+k_einactive = 'einactive'
+k_eleastviolated = 'eleastviolated'
 k_outers = {
     k_exact: PolyOuter.EXACT,
     k_elra: PolyOuter.ELRA,
     k_erandom: PolyOuter.ERANDOM,
     k_ereset: PolyOuter.ERESET,
     k_subsample: PolyOuter.SUBSAMPLE,
+    k_einactive: PolyOuter.EINACTIVE,
+    k_eleastviolated: PolyOuter.ELEASTVIOLATED,
 }
 
 
@@ -98,6 +108,21 @@ def main():
         '-dg', '--duality_gap', action='store_true',
         help=('if solving an SCS problem, include and pin the duality gap '
         'constraint.'))
+    parser.add_argument(
+        '-ps', '--presolve', action='store_true',
+        help=('if solving an SCS problem, presolve it into a smaller '
+        'feasibility problem; iterates are mapped back to the SCS problem '
+        'before post-processing'))
+    parser.add_argument(
+        '-eq', '--equilibrate', action='store_true',
+        help=('if solving an SCS problem, equilibrate its data by Ruiz '
+        'scaling (before presolving it, if presolve is set); iterates are '
+        'mapped back to the SCS problem before post-processing'))
+    # --- options for k_meta_apop --- #
+    parser.add_argument(
+        '-w', '--num_workers', type=int, default=1,
+        help=('number of processes over which to spread the approaches of '
+        'k_meta_apop'))
     # --- options for k_scs --- #
     parser.add_argument(
         '-p', '--polish', action='store_true',
@@ -119,6 +144,29 @@ def main():
     parser.add_argument(
         '-r', '--random_iterate', action='store_true',
         help='initialize solvers with a random iterate')
+    parser.add_argument(
+        '-am', '--affine_method', type=str, default='auto',
+        help=('method for projecting onto affine sets; one of ' +
+        str(sorted(AffineSet.METHODS))))
+    parser.add_argument(
+        '-re', '--residual_every', type=int, default=1,
+        help=('if solving an SCS problem, evaluate its residuals every '
+        'residual_every iterations only'))
+    parser.add_argument(
+        '-hi', '--history', type=str, default=History.ALL,
+        help=('which iterates to keep; one of ' +
+        str(sorted(History.POLICIES)) + '; the memmap policy writes every '
+        'iterate to a .npy file next to the output'))
+    parser.add_argument(
+        '-hk', '--history_keep', type=int, default=2,
+        help='number of most recent iterates to keep in memory')
+    parser.add_argument(
+        '-hs', '--history_stride', type=int, default=10,
+        help='keep every history_stride-th iterate (strided history only)')
+    parser.add_argument(
+        '-fs', '--factor_store', action='store_true',
+        help=('save factorizations of the problem data next to the problem '
+        'file, and reuse them across runs'))
 
     args = vars(parser.parse_args())
     logging.basicConfig(
@@ -132,11 +180,40 @@ def main():
         'loading cached problem %s ...', args['problem'])
     with open(args['problem'], 'rb') as pkl_file:
         problem = cPickle.load(pkl_file)
+    if args['factor_store']:
+        factorization_cache.default_cache().directory = (
+            os.path.splitext(args['problem'])[0] + '_factors')
+    if isinstance(problem, SCSProblem):
+        problem.residual_evaluator(every=args['residual_every'])
+    if args['equilibrate']:
+        if not isinstance(problem, SCSProblem):
+            raise ValueError('Only SCS problems can be equilibrated')
+        problem = equilibrate(problem)
+        logging.info('equilibrated problem with sigma %e, rho %e',
+            problem.sigma, problem.rho)
+    if args['presolve']:
+        if not isinstance(problem, SCSProblem):
+            raise ValueError('Only SCS problems can be presolved')
+        if args['solver'] == k_scs:
+            raise ValueError('The %s solver requires an unpresolved problem' %
+                k_scs)
+        problem = presolve(problem)
+        logging.info('presolved problem to dimension %d', problem.dimension)
+    for s in problem.sets:
+        if isinstance(s, AffineSet):
+            s.set_method(args['affine_method'])
+            logging.info('projecting onto affine sets via %s', s.method)
     
     fn = '_'.join([args['output'], time.strftime("%Y%m%d-%H%M%S")]) + '.pkl'
     if not os.access(os.path.dirname(fn), os.W_OK):
         raise ValueError('Invalid output path %s' % fn)
 
+    if args['history'] not in History.POLICIES:
+        raise ValueError('Invalid history policy %s' % args['history'])
+    history = HistoryPolicy(args['history'], keep_last=args['history_keep'],
+        stride=args['history_stride'],
+        path=os.path.splitext(fn)[0] + '_iterates.npy')
+
     initial_iterate = (np.random.randn(problem.dimension) if
         args['random_iterate'] else None)
     if args['solver'] == k_alt_p:
@@ -144,22 +221,22 @@ def main():
             do_all_iters=args['do_all_iters'],
             initial_iterate=initial_iterate,
             momentum=args['momentum'],
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_avg_p:
         solver = AvgP(max_iters=args['max_iters'], atol=args['atol'],
             do_all_iters=args['do_all_iters'],
             initial_iterate=initial_iterate,
             momentum=args['momentum'],
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_polyak:
         solver = Polyak(max_iters=args['max_iters'], atol=args['atol'],
             do_all_iters=args['do_all_iters'],
             initial_iterate=initial_iterate,
             momentum=args['momentum'],
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_apop:
         if args['duality_gap']:
-            assert isinstance(problem, SCSProblem)
+            assert isinstance(problem, (SCSProblem, PresolvedSCSProblem))
             info = [problem.duality_gap_constraint()]
         else:
             info = []
@@ -175,7 +252,7 @@ def main():
             momentum=args['momentum'],
             average=not args['alt'],
             theta=args['theta'],
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_meta_apop:
         solver = MetaAPOP(max_iters=args['max_iters'], atol=args['atol'],
             do_all_iters=args['do_all_iters'],
@@ -186,16 +263,17 @@ def main():
             momentum=args['momentum'],
             average=not args['alt'],
             theta=args['theta'],
-            verbose=args['verbose'])
+            num_workers=args['num_workers'],
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_dykstra:
         solver = Dykstra(max_iters=args['max_iters'], atol=args['atol'],
             do_all_iters=args['do_all_iters'],
             initial_iterate=initial_iterate,
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     elif args['solver'] == k_scs:
         solver = SCSADMM(max_iters=args['max_iters'], atol=args['atol'],
             do_all_iters=args['do_all_iters'], polish=args['polish'],
-            verbose=args['verbose'])
+            verbose=args['verbose'], history=history)
     else:
         raise ValueError('Invalid solver choice %s' % args['solver'])
 
@@ -204,16 +282,22 @@ def main():
     data = {'it': it, 'res': res, 'status': status,
             'problem': args['problem'], 'name': name, 'solver': args['solver']}
 
+    last = it[-1]
+    while isinstance(problem, (PresolvedSCSProblem, ScaledSCSProblem)):
+        last = problem.restore(last)
+        problem = problem.problem
     if isinstance(problem, SCSProblem):
-        data['kappa'] = problem.kappa(it[-1])
-        data['tau'] = problem.tau(it[-1])
+        # the residuals of the last iterate, unscaled and unpresolved
+        data['scs_res'] = problem.residual_evaluator(every=1)(last)
+        data['kappa'] = problem.kappa(last)
+        data['tau'] = problem.tau(last)
         if data['tau'] > -1e-6 and np.isclose(data['kappa'], 0, atol=1e-4):
             data['case'] = 'primal_dual_optimal'
         elif np.isclose(data['tau'], 0, atol=1e-4) and data['kappa'] > 1e-6:
             data['case'] = 'infeasible'
         else:
             data['case'] = 'indeterminate'
-        data['obj_val'] = (problem.objective_value(problem.p(it[-1])) /
+        data['obj_val'] = (problem.objective_value(problem.p(last)) /
             data['tau']) if data['tau'] != 0 else float('inf')
         data['opt_val'] = problem.optimal_value()
         data['primal_res'] = data['obj_val'] - data['opt_val']
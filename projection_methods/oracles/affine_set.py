@@ -1,10 +1,63 @@
+import logging
+
 import numpy as np
 import scipy.sparse
 import scipy.sparse.linalg
 
 from projection_methods.oracles.convex_set import ConvexSet
+from projection_methods.oracles.factorization_cache import SparseLU
+import projection_methods.oracles.factorization_cache as factorization_cache
 from projection_methods.projectables.hyperplane import Hyperplane
 
+
+# matrices with at least this many nonzeros are not factored
+_ITERATIVE_NNZ = 2 ** 22
+
+
+def _nnz(A):
+    return A.nnz if scipy.sparse.issparse(A) else np.count_nonzero(A)
+
+
+def _is_operator(A):
+    return isinstance(A, scipy.sparse.linalg.LinearOperator)
+
+
+def _squared_row_norms(A):
+    """Returns the squared norms of the rows of A, or ones if they are unknown
+    (as for operators that do not supply them)"""
+    if _is_operator(A):
+        if hasattr(A, 'squared_row_norms'):
+            return A.squared_row_norms()
+        return np.ones(A.shape[0])
+    return np.asarray(A.multiply(A).sum(axis=1)).flatten()
+
+
+def _choose_method(A):
+    """Returns the cheaper of the 'kkt' and 'normal' methods for A
+
+    Matrices with more than _ITERATIVE_NNZ nonzeros are deemed too large to
+    factor, and are handled by 'cg' instead, as are operators.
+
+    The normal equations are only considered when A is wide (m <= n / 4),
+    since squaring the condition number of a tall or square A is rarely
+    worth it, and when A A.T is not expected to be much denser than the KKT
+    matrix; the number of nonzeros of A A.T is estimated by the sum of the
+    squared column counts of A.
+    """
+    m, n = A.shape
+    if _is_operator(A) or _nnz(A) >= _ITERATIVE_NNZ:
+        return 'cg'
+    if 4 * m > n:
+        return 'kkt'
+    if scipy.sparse.issparse(A):
+        col_counts = np.diff(scipy.sparse.csc_matrix(A).indptr)
+    else:
+        col_counts = np.count_nonzero(A, axis=0)
+    normal_nnz = min(m * m, np.sum(col_counts.astype(float) ** 2))
+    kkt_nnz = n + 2 * np.sum(col_counts)
+    return 'normal' if normal_nnz <= kkt_nnz else 'kkt'
+
+
 class AffineSet(ConvexSet):
     """An oracle for affine sets
     
@@ -12,55 +65,216 @@ class AffineSet(ConvexSet):
         \{ x | Ax = b \},
     parametrized by A, b
 
+    Projections are computed with one of two methods: 'kkt' solves the
+    (n + m)-dimensional KKT system [[I, A.T], [A, 0]], while 'normal' solves
+    the m-dimensional normal equations A A.T nu = A x_0 - b, which is far
+    cheaper when A is wide (both require A to have full row rank; a set
+    whose factorization turns out to be singular falls back to 'lsqr').
+    Factorizations are shared, through the
+    factorization cache (see factorization_cache), by all affine sets with
+    the same matrix A.
+
+    For matrices too large to factor, two matrix-free methods are available:
+    'cg' solves the normal equations with Jacobi-preconditioned conjugate
+    gradients, and 'lsqr' computes the least-norm correction d satisfying
+    A d = b - A x_0 with LSQR. Both are warm-started from the previous
+    projection, and stop once the residual of the linear system is at most
+    rtol times the residual A x_0 - b of the point being projected, so that
+    solves become more accurate as the outer algorithm converges.
+
+    A may also be a scipy.sparse.linalg.LinearOperator, which applies A and
+    A.T without storing A (see, e.g., SCSOperator); such sets project with
+    the matrix-free methods only. Operators may supply squared_row_norms()
+    to precondition 'cg', getrow(i) for data hyperplanes, and tocsr() for
+    the cvxpy constraints of the set.
+
     Attributes:
         x (cvxpy.Variable): a symbolic representation of
             members of the set
-        A (numpy.ndarray or scipy.sparse matrix): a matrix
+        A (numpy.ndarray, scipy.sparse matrix, or LinearOperator): a matrix
         b (numpy.ndarray): a target vector
+        method (str): the method used to compute projections, one of
+            'kkt', 'normal', 'cg', or 'lsqr'
+        rtol (float): relative tolerance for the iterative methods
     """
-    def __init__(self, x, A, b):
+    METHODS = frozenset(['auto', 'kkt', 'normal', 'cg', 'lsqr'])
+
+    def __init__(self, x, A, b, method='auto', rtol=1e-6):
         """
         Args:
             x: see 
-            A (numpy.ndarray): a matrix
+            A (numpy.ndarray, scipy.sparse matrix, or LinearOperator): a
+                matrix
             b (numpy.ndarray): a target vector
+            method (str): one of 'kkt', 'normal', 'cg', 'lsqr', or 'auto';
+                'auto' chooses a method from the shape and sparsity of A
+            rtol (float): relative tolerance for 'cg' and 'lsqr'
         """
         assert A.shape[1] == x.size[0]
-        constr = [A * x == b]
         self.A = A
         self.b = b
-        super(AffineSet, self).__init__(x, constr)
-        self._kkt_solver = None
+        super(AffineSet, self).__init__(x, None)
+        self.rtol = rtol
+        self.set_method(method)
         self.chosen_rows = set([])
 
 
+    def set_method(self, method):
+        """Sets the method used to compute projections
+
+        Args:
+            method (str): one of 'kkt', 'normal', 'cg', 'lsqr', or 'auto'
+        Raises:
+            ValueError if method is not one of the above, or if method
+                factors A and A is an operator
+        """
+        if method not in AffineSet.METHODS:
+            raise ValueError('Unknown method %s' % method)
+        if _is_operator(self.A) and method in ('kkt', 'normal'):
+            raise ValueError('The %s method requires an explicit matrix' %
+                method)
+        self.method = _choose_method(self.A) if method == 'auto' else method
+        self._solver = None
+        # warm start for the iterative methods: the multipliers (cg) or the
+        # correction (lsqr) of the previous projection, and the diagonal of
+        # A A.T (cg)
+        self._warm_start = None
+        self._diag = None
+
+
+    def _make_constr(self):
+        A = self.A
+        if _is_operator(A):
+            if not hasattr(A, 'tocsr'):
+                raise ValueError('Operators without tocsr() do not define '
+                    'cvxpy constraints')
+            A = A.tocsr()
+        return [A * self._x == self.b]
+
+
     def contains(self, x_0, atol=1e-4):
         """Return True if x_0 in affine set, False otherwise"""
         return np.allclose(self.A.dot(x_0), self.b, atol=atol)
 
 
     def _make_kkt_solver(self):
-        sparse_eye = scipy.sparse.eye(self.A.shape[1], format='csc')
-        kkt_matrix = scipy.sparse.bmat(
-            [[sparse_eye, self.A.T], [self.A, None]], format='csc')
-        kkt_solver = scipy.sparse.linalg.factorized(kkt_matrix)
-        return kkt_solver
+        def factor():
+            sparse_eye = scipy.sparse.eye(self.A.shape[1], format='csc')
+            kkt_matrix = scipy.sparse.bmat(
+                [[sparse_eye, self.A.T], [self.A, None]], format='csc')
+            return SparseLU.factor(kkt_matrix)
+        return factorization_cache.default_cache().get(
+            factorization_cache.fingerprint(self.A, 'kkt'), factor)
+
+
+    def _make_normal_solver(self):
+        def factor():
+            A = scipy.sparse.csr_matrix(self.A)
+            # A A.T is symmetric positive definite, so that there is no need
+            # to pivot off the diagonal
+            return SparseLU.factor(A.dot(A.T), permc_spec='MMD_AT_PLUS_A',
+                diag_pivot_thresh=0, options=dict(SymmetricMode=True))
+        return factorization_cache.default_cache().get(
+            factorization_cache.fingerprint(self.A, 'normal'), factor)
+
+
+    def _project_cg(self, x_0, r):
+        A = self._solver
+        # (LinearOperator.T is unreliable across scipy versions, but the
+        # adjoint equals the transpose for real operators)
+        AT = A.H if _is_operator(A) else A.T
+        m = A.shape[0]
+        if self._diag is None:
+            self._diag = _squared_row_norms(A)
+            self._diag[self._diag == 0] = 1
+        diag = self._diag
+        normal = scipy.sparse.linalg.LinearOperator((m, m),
+            matvec=lambda v: A.dot(AT.dot(v)))
+        preconditioner = scipy.sparse.linalg.LinearOperator((m, m),
+            matvec=lambda v: v / diag)
+        nu, info = scipy.sparse.linalg.cg(normal, r, x0=self._warm_start,
+            tol=self.rtol, atol=0, M=preconditioner)
+        if info > 0:
+            logging.warning('CG did not converge in %d iterations', info)
+        self._warm_start = nu
+        return x_0 - AT.dot(nu)
+
+
+    def _project_lsqr(self, x_0, r):
+        # the correction of the previous projection lies in the range of A.T,
+        # so that LSQR still converges to the least-norm correction
+        d = scipy.sparse.linalg.lsqr(self._solver, -r, atol=self.rtol,
+            btol=self.rtol, x0=self._warm_start)[0]
+        self._warm_start = d
+        return x_0 + d
+
+
+    def _make_solver(self):
+        # the factorization is deferred to the first projection, so that
+        # pickled problems do not carry it around
+        if self.method in ('cg', 'lsqr'):
+            if _is_operator(self.A):
+                return self.A
+            return scipy.sparse.csr_matrix(self.A)
+        try:
+            solver = (self._make_normal_solver() if self.method == 'normal'
+                else self._make_kkt_solver())
+        except RuntimeError:
+            # SuperLU raises if the matrix is exactly singular
+            solver = None
+        if solver is None or solver.is_singular():
+            logging.warning('A does not have full row rank; projecting via '
+                'lsqr instead of %s', self.method)
+            self.method = 'lsqr'
+            return scipy.sparse.csr_matrix(self.A)
+        return solver
 
 
     def project(self, x_0):
         if self.contains(x_0):
             return x_0
 
-        if self._kkt_solver is None:
-            # TODO(akshayka): it would be fine to do this in init,
-            # except for whatever reason the return value of factorized()
-            # cannot be pickled
-            # ("expected string or Unicode object, NoneType found")
-            self._kkt_solver = self._make_kkt_solver()
+        if self._solver is None:
+            self._solver = self._make_solver()
+        if self.method in ('cg', 'lsqr'):
+            r = self._solver.dot(x_0) - self.b
+            if self.method == 'cg':
+                return self._project_cg(x_0, r)
+            return self._project_lsqr(x_0, r)
+        elif self.method == 'normal':
+            return x_0 - self.A.T.dot(self._solver(self.A.dot(x_0) - self.b))
         target = np.hstack((x_0, self.b))
-        sol = self._kkt_solver(target)
+        sol = self._solver(target)
         return sol[:self._shape[0]]
-        
+
+
+    def project_many(self, X, atol=1e-4):
+        """As project, but projects each row of X
+
+        The factorization-based methods solve for all the rows at once, with
+        a multiple right-hand side solve.
+        """
+        AX = np.asarray(self.A.dot(X.T))
+        outside = ~np.all(np.isclose(AX, self.b[:, None], atol=atol), axis=0)
+        R = AX - self.b[:, None]
+        X_star = X.copy()
+        if not outside.any():
+            return X_star
+
+        if self._solver is None:
+            self._solver = self._make_solver()
+        if self.method in ('cg', 'lsqr'):
+            for i in np.flatnonzero(outside):
+                X_star[i] = self.project(X[i])
+        elif self.method == 'normal':
+            X_star[outside] -= np.asarray(
+                self.A.T.dot(self._solver(R[:, outside]))).T
+        else:
+            target = np.vstack((X[outside].T,
+                np.repeat(self.b[:, None], np.sum(outside), axis=1)))
+            X_star[outside] = self._solver(target)[:self._shape[0]].T
+        return X_star
+
 
     def query(self, x_0, data_hyperplanes=0, policy='random'):
         """As ConvexSet.query, but returns a Hyperplane
@@ -77,8 +291,23 @@ class AffineSet(ConvexSet):
                 in which every point x in the affine set must lie
         """
         x_star = self.project(x_0)
+        return x_star, self._information(x_0, x_star, data_hyperplanes,
+            policy)
+
+
+    def query_many(self, X, data_hyperplanes=0, policy='random'):
+        """As query, but queries each row of X (see ConvexSet.query_many)"""
+        X_star = self.project_many(X)
+        info = []
+        for x_0, x_star in zip(X, X_star):
+            info.extend(self._information(x_0, x_star, data_hyperplanes,
+                policy))
+        return X_star, info
+
+
+    def _information(self, x_0, x_star, data_hyperplanes=0, policy='random'):
         if np.array_equal(x_star, x_0):
-            return x_0, []
+            return []
 
         hyperplanes = []
         # a.dot(y - x_star) == 0, for all y in affine set
@@ -110,7 +339,7 @@ class AffineSet(ConvexSet):
                     hyperplanes.append(Hyperplane(x=self._x,
                         a=self.A.getrow(idx).T, b=np.array(self.b[idx])))
         self._info.extend(hyperplanes)
-        return x_star, hyperplanes
+        return hyperplanes
 
     def __repr__(self):
         string = type(self).__name__ + '\n'
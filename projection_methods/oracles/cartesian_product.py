@@ -2,9 +2,83 @@ import copy
 import numpy as np
 
 from projection_methods.oracles.cone import Cone
+from projection_methods.oracles.cone_spec import ConeSpec
 import projection_methods.oracles.utils as utils
 
 
+class _Segments(object):
+    """The coordinates of a group of contiguous blocks, concatenated
+
+    Attributes:
+        idx (numpy.ndarray): the coordinates of the blocks, concatenated
+        ids (numpy.ndarray): ids[j] is the block to which idx[j] belongs
+        count (int): the number of blocks
+    """
+    def __init__(self, offsets, lengths):
+        """
+        Args:
+            offsets (numpy.ndarray): the first coordinate of every block
+            lengths (numpy.ndarray): the length of every block
+        """
+        lengths = np.asarray(lengths, dtype=int)
+        self.count = lengths.shape[0]
+        self.ids = np.repeat(np.arange(self.count), lengths)
+        starts = np.cumsum(lengths) - lengths
+        self.idx = np.arange(self.ids.shape[0]) + np.repeat(
+            np.asarray(offsets, dtype=int) - starts, lengths)
+        self._nonempty = lengths > 0
+        self._starts = starts[self._nonempty]
+
+
+    def sum(self, V):
+        """Sums the columns of V (a 2-D array over idx) within each block"""
+        out = np.zeros((V.shape[0], self.count))
+        if self._starts.shape[0] > 0:
+            out[:, self._nonempty] = np.add.reduceat(V, self._starts, axis=1)
+        return out
+
+
+class _BlockIndex(object):
+    """An index of the leaf cones of a CartesianProduct, grouped by type
+
+    Attributes:
+        offsets, dims (numpy.ndarray): the first coordinate and the
+            dimension of every leaf cone
+        leaves (_Segments): the coordinates of every leaf cone
+        leaf_of (numpy.ndarray): leaf_of[i] is the leaf to which coordinate i
+            belongs
+        nonneg, zeros, reals (_Segments): the NonNeg, Zeros, and Reals
+            blocks
+        soc_z, soc_t (_Segments, numpy.ndarray): the z coordinates and the
+            t coordinate of every SOC block
+        others (numpy.ndarray): the leaves of any other class
+    """
+    def __init__(self, types, offsets, dims, dim):
+        """
+        Args:
+            types (numpy.ndarray): the ConeSpec type of every leaf, or -1
+                for leaves of any other class
+            offsets (numpy.ndarray): the first coordinate of every leaf
+            dims (numpy.ndarray): the dimension of every leaf
+            dim (int): the dimension of the product
+        """
+        self.offsets = offsets
+        self.dims = dims
+        self.leaves = _Segments(offsets, dims)
+        self.leaf_of = np.zeros(dim, dtype=int)
+        self.leaf_of[self.leaves.idx] = self.leaves.ids
+        def group(code):
+            mask = types == code
+            return _Segments(offsets[mask], dims[mask])
+        self.nonneg = group(ConeSpec.NONNEG)
+        self.zeros = group(ConeSpec.ZEROS)
+        self.reals = group(ConeSpec.REALS)
+        soc = types == ConeSpec.SOC
+        self.soc_z = _Segments(offsets[soc], dims[soc] - 1)
+        self.soc_t = offsets[soc] + dims[soc] - 1
+        self.others = np.flatnonzero(types < 0)
+
+
 class CartesianProduct(Cone):
     """An oracle for cartesion products of cones
 
@@ -22,6 +96,17 @@ class CartesianProduct(Cone):
             then
                 slices[0] == slice(0, 10) and
                 slices[1] == slice(10, 30).
+
+    Projections are vectorized: the leaf cones (the cones of nested
+    Cartesian products included) are indexed by class, so that all NonNeg,
+    Zeros, and Reals coordinates are projected in one masked pass each, and
+    all SOC blocks in one pass, with segmented norms. Each block is left
+    untouched if it lies in its cone, exactly as the cone's own project
+    would.
+
+    A product built with from_spec is backed by a ConeSpec instead: its
+    cones (and their cvxpy constraints) are only built when they are needed,
+    e.g., when a cone yields a cut, or when sets is accessed.
     """
     def __init__(self, x, sets, slices):
         """
@@ -32,28 +117,175 @@ class CartesianProduct(Cone):
         for s in sets:
             assert isinstance(s, Cone)
 
-        self.sets = sets
-        self.slices = slices
-        constr = [c for s in sets for c in s._constr]
-        super(CartesianProduct, self).__init__(x, constr)
+        self._sets = sets
+        self._slices = slices
+        self._spec = None
+        super(CartesianProduct, self).__init__(x, None)
         self._shape = reduce(
             lambda x, y: tuple(one + two for one, two in zip(x, y)),
             [s._shape for s in sets])
         assert self._shape == np.prod(x.size)
 
 
+    @classmethod
+    def from_spec(cls, x, spec):
+        """Returns the product of the cones described by spec
+
+        Args:
+            x (cvxpy.Variable): a symbolic representation of members of the
+                set; must be of dimension spec.dim
+            spec (ConeSpec): the cones of the product
+        Returns:
+            CartesianProduct: the product, with no cone oracle built
+        """
+        product = cls.__new__(cls)
+        product._sets = None
+        product._slices = None
+        product._spec = spec
+        product._cones = {}
+        super(CartesianProduct, product).__init__(x, None)
+        assert product._shape == (spec.dim,)
+        return product
+
+
+    def __setstate__(self, state):
+        # products pickled before they could be backed by a ConeSpec
+        if 'sets' in state:
+            state['_sets'] = state.pop('sets')
+            state['_slices'] = state.pop('slices')
+            state['_spec'] = None
+            state.pop('_index', None)
+        super(CartesianProduct, self).__setstate__(state)
+
+
+    @property
+    def sets(self):
+        if self._sets is None:
+            self._sets = [self._cone(i) for i in xrange(len(self._spec))]
+        return self._sets
+
+
+    @property
+    def slices(self):
+        if self._slices is None:
+            self._slices = self._spec.slices()
+        return self._slices
+
+
+    def _cone(self, i):
+        """Returns (building it if need be) the i-th cone of a spec"""
+        if i not in self._cones:
+            o, d = self._spec.offsets[i], self._spec.dims[i]
+            self._cones[i] = self._spec.cone(i)(self._x[o:o + d])
+        return self._cones[i]
+
+
+    def _make_constr(self):
+        return [c for s in self.sets for c in s._constr]
+
+
+    def _flatten(self):
+        """Returns the type, first coordinate, and dimension of every leaf"""
+        if self._spec is not None:
+            return self._spec.types, self._spec.offsets, self._spec.dims
+        codes = dict((c, i) for i, c in enumerate(ConeSpec.CLASSES))
+        types, offsets, dims, counts = [], [], [], []
+        for s, slx in zip(self.sets, self.slices):
+            start, stop, step = slx.indices(self._shape[0])
+            assert step == 1, 'slices must be contiguous'
+            if isinstance(s, CartesianProduct):
+                t, o, d = s._flatten()
+                types.append(t)
+                offsets.append(o + start)
+                dims.append(d)
+                counts.append(t.shape[0])
+            else:
+                types.append([codes.get(type(s), -1)])
+                offsets.append([start])
+                dims.append([stop - start])
+                counts.append(1)
+        # the first leaf of every set, used by _leaf
+        self._leaf_starts = np.cumsum(counts) - counts
+        return tuple(np.concatenate(a).astype(int) for a in (types,
+            offsets, dims))
+
+
+    def _leaf(self, i):
+        """Returns the i-th leaf cone"""
+        if self._spec is not None:
+            return self._cone(i)
+        k = np.searchsorted(self._leaf_starts, i, side='right') - 1
+        s = self.sets[k]
+        if isinstance(s, CartesianProduct):
+            return s._leaf(i - self._leaf_starts[k])
+        return s
+
+
+    def _block_index(self):
+        if getattr(self, '_index', None) is None:
+            types, offsets, dims = self._flatten()
+            self._index = _BlockIndex(types, offsets, dims, self._shape[0])
+        return self._index
+
+
     def project(self, x_0):
         assert self._shape == x_0.shape, \
             'cone shape (%s) != x_0 shape (%s)' % (
             str(self._shape), str(x_0.shape))
-        x_star = np.zeros(x_0.shape)
-        for s, slx in zip(self.sets, self.slices):
-            x_star[slx] = s.project(x_0[slx])
-        return x_star
+        return self.project_many(x_0.reshape(1, -1))[0]
+
+
+    def project_many(self, X):
+        index = self._block_index()
+        X_star = np.zeros(X.shape)
+        X_star[:, index.reals.idx] = X[:, index.reals.idx]
+
+        # NonNeg blocks with an entry below -atol are clipped
+        V = X[:, index.nonneg.idx]
+        outside = index.nonneg.sum(V < -1e-6) > 0
+        X_star[:, index.nonneg.idx] = np.where(outside[:, index.nonneg.ids],
+            np.maximum(V, 0), V)
+
+        # Zeros blocks with an entry above atol (in magnitude) are zeroed
+        V = X[:, index.zeros.idx]
+        outside = index.zeros.sum(np.absolute(V) > 1e-6) > 0
+        X_star[:, index.zeros.idx] = np.where(outside[:, index.zeros.ids],
+            0., V)
+
+        # SOC blocks, as in SOC.project
+        Z = X[:, index.soc_z.idx]
+        t = X[:, index.soc_t]
+        norm_z = np.sqrt(index.soc_z.sum(Z ** 2))
+        contained = (norm_z <= t) | np.isclose(norm_z, t, atol=1e-4)
+        outside = ~contained & (norm_z > -t)
+        scale = np.zeros(t.shape)
+        scale[outside] = 0.5 * (1 + t[outside] / norm_z[outside])
+        X_star[:, index.soc_z.idx] = np.where(contained[:, index.soc_z.ids],
+            Z, scale[:, index.soc_z.ids] * Z)
+        X_star[:, index.soc_t] = np.where(contained, t, scale * norm_z)
+
+        for leaf in index.others:
+            idx = np.arange(index.offsets[leaf],
+                index.offsets[leaf] + index.dims[leaf])
+            X_star[:, idx] = self._leaf(leaf).project_many(X[:, idx])
+        return X_star
+
+
+    def _granular_information(self, x_0, x_star):
+        """Returns the information of every leaf cone that moved x_0"""
+        index = self._block_index()
+        info = []
+        for leaf in np.unique(index.leaf_of[x_0 != x_star]):
+            idx = np.arange(index.offsets[leaf],
+                index.offsets[leaf] + index.dims[leaf])
+            info.extend(self._leaf(leaf)._information(x_0[idx], x_star[idx]))
+        return info
 
 
     def dual(self, x):
         # TODO(akshayka): assert that x is of the correct size
+        if self._spec is not None:
+            return CartesianProduct.from_spec(x, self._spec.dual())
         cones = []
         for s, slx in zip(self.sets, self.slices):
             cones.append(s.dual(x[slx]))
@@ -81,12 +313,8 @@ class CartesianProduct(Cone):
         """
         info = []
         if granular:
-            x_star = np.zeros(x_0.shape)
-            for s, slx in zip(self.sets, self.slices):
-                x_s, h_s = s.query(x_0[slx])
-                assert x_s.shape == x_0[slx].shape
-                x_star[slx] = x_s
-                info.extend(h_s)
+            x_star = self.project(x_0)
+            info = self._granular_information(x_0, x_star)
         else:
             x_star = self.project(x_0)
             if not np.array_equal(x_star, x_0):
@@ -99,6 +327,18 @@ class CartesianProduct(Cone):
         return x_star, info
 
 
+    def query_many(self, X, granular=True):
+        """As query, but queries each row of X (see ConvexSet.query_many)"""
+        if not granular:
+            return super(CartesianProduct, self).query_many(X)
+        X_star = self.project_many(X)
+        info = []
+        for x_0, x_star in zip(X, X_star):
+            info.extend(self._granular_information(x_0, x_star))
+        self._info.extend(info)
+        return X_star, info
+
+
     def residual(self, x_0):
         """Compute distance from x_0 to the cartesian product.
 
@@ -107,11 +347,28 @@ class CartesianProduct(Cone):
         Returns:
             list : list of residuals, possibly nested
         """
+        if self._spec is not None:
+            # the residual of every cone, as the cones would compute it
+            leaves = self._block_index().leaves
+            d = (x_0 - self.project(x_0))[leaves.idx]
+            return list(np.sqrt(leaves.sum(d.reshape(1, -1) ** 2)[0]))
         return [s.residual(x_0[slx]) for s, slx in zip(self.sets, self.slices)]
 
 
+    def _cone_repr(self, i):
+        """Returns the repr of the i-th cone, without building it"""
+        if self._spec is None:
+            return self.sets[i].__repr__()
+        return '%s [dimension %s]\n' % (self._spec.cone(i).__name__,
+            str((int(self._spec.dims[i]),)))
+
+
     def residual_str(self, x_0):
         string = '------- Cone Residuals -------\n'
+        if self._spec is not None:
+            for i, r in enumerate(self.residual(x_0)):
+                string += '%d. %s\t res: %e\n' % (i+1, self._cone_repr(i), r)
+            return string
         for i, tup in enumerate(zip(self.sets, self.slices)):
             s, slx = tup
             string += '%d. %s\n' % (i+1, s.residual_str(x_0[slx]))
@@ -119,10 +376,12 @@ class CartesianProduct(Cone):
 
 
     def __repr__(self):
+        num_cones = len(self._spec) if self._spec is not None else len(
+            self.sets)
         string = type(self).__name__ + "\n"
-        string += 'Number of cones: %s\n' % str(len(self.sets))
+        string += 'Number of cones: %s\n' % str(num_cones)
         string += 'Dimension: %s\n' % str(self._shape)
         string += '------- Cones -------\n'
-        for i, c in enumerate(self.sets):
-            string += '%d. %s' % (i+1, c.__repr__())
+        for i in xrange(num_cones):
+            string += '%d. %s' % (i+1, self._cone_repr(i))
         return string
@@ -0,0 +1,92 @@
+import numpy as np
+
+from projection_methods.oracles.nonneg import NonNeg
+import projection_methods.oracles.soc as soc
+from projection_methods.oracles.zeros import Reals, Zeros
+
+
+class ConeSpec(object):
+    """A compact specification of a Cartesian product of cones
+
+    Describes a product C_1 \times C_2 \times \ldots \times C_n of Zeros,
+    Reals, NonNeg, and SOC cones, laid out contiguously and in order, with
+    three integer arrays. A ConeSpec is cheap to build, pickle, and dualize
+    no matter how many cones it describes; see CartesianProduct.from_spec
+    for an oracle that is backed by one.
+
+    Attributes:
+        types (numpy.ndarray): types[i] is the type of C_i, one of
+            ConeSpec.ZEROS, ConeSpec.REALS, ConeSpec.NONNEG, ConeSpec.SOC
+        dims (numpy.ndarray): dims[i] is the dimension of C_i
+        offsets (numpy.ndarray): offsets[i] is the first coordinate of C_i
+    """
+    ZEROS, REALS, NONNEG, SOC = range(4)
+    CLASSES = (Zeros, Reals, NonNeg, soc.SOC)
+    _DUALS = np.array([REALS, ZEROS, NONNEG, SOC])
+
+    def __init__(self, types, dims):
+        """
+        Args:
+            types (array-like of int): as per attribute
+            dims (array-like of int): as per attribute
+        Raises:
+            ValueError if a type is unknown or a dimension is invalid
+        """
+        self.types = np.asarray(types, dtype=int).reshape(-1)
+        self.dims = np.asarray(dims, dtype=int).reshape(-1)
+        if self.types.shape != self.dims.shape:
+            raise ValueError('Received %d types but %d dimensions' % (
+                self.types.shape[0], self.dims.shape[0]))
+        if np.any((self.types < 0) | (self.types >= len(ConeSpec.CLASSES))):
+            raise ValueError('Unknown cone type')
+        if np.any(self.dims < 0) or np.any(
+                self.dims[self.types == ConeSpec.SOC] < 1):
+            raise ValueError('Invalid cone dimension')
+        self.offsets = np.cumsum(self.dims) - self.dims
+
+
+    @classmethod
+    def from_cones(cls, cones, dims):
+        """Returns the specification of a product of cones
+
+        Args:
+            cones (list of Cone classes): cones[i] is the class of C_i, one
+                of Zeros, Reals, NonNeg, SOC
+            dims (list of int): dims[i] is the dimension of C_i
+        Returns:
+            ConeSpec: the specification of C_1 \times \ldots \times C_n
+        Raises:
+            ValueError if a cone class is not supported
+        """
+        codes = dict((c, i) for i, c in enumerate(cls.CLASSES))
+        try:
+            types = [codes[c] for c in cones]
+        except KeyError as e:
+            raise ValueError('Unsupported cone %s' % e)
+        return cls(types, dims)
+
+
+    @property
+    def dim(self):
+        """The dimension of the product"""
+        return int(np.sum(self.dims))
+
+
+    def __len__(self):
+        return self.types.shape[0]
+
+
+    def cone(self, i):
+        """Returns the class of C_i"""
+        return ConeSpec.CLASSES[self.types[i]]
+
+
+    def slices(self):
+        """Returns a list whose i-th element is the slice of C_i"""
+        return [slice(o, o + d) for o, d in
+            zip(self.offsets.tolist(), self.dims.tolist())]
+
+
+    def dual(self):
+        """Returns the specification of the dual cone"""
+        return ConeSpec(ConeSpec._DUALS[self.types], self.dims)
@@ -39,14 +39,45 @@ class ConvexSet(Projectable, Oracle):
                 of x_0 onto the set
         """
         x_star = self.project(x_0)
+        return x_star, self._information(x_0, x_star)
+
+
+    def query_many(self, X):
+        """Queries each row of X
+
+        Args:
+            X (numpy.ndarray): a 2-D array whose rows are query points
+        Returns:
+            numpy.ndarray: a 2-D array whose i-th row is the projection of
+                the i-th row of X onto the set
+            list: the information (as in query) for every row of X,
+                concatenated
+        """
+        X_star = self.project_many(X)
+        info = []
+        for x_0, x_star in zip(X, X_star):
+            info.extend(self._information(x_0, x_star))
+        return X_star, info
+
+
+    def _information(self, x_0, x_star):
+        """Returns (and records) the information obtained from a projection
+
+        Args:
+            x_0 (array-like): query point
+            x_star (array-like): the projection of x_0 onto the set
+        Returns:
+            list of Halfspace: a halfspace containing the set, defined
+                by the supporting hyperplane at x_star, if x_star != x_0
+        """
         if np.array_equal(x_star, x_0):
-            return x_0, []
+            return []
         info = []
         h = utils.containing_halfspace(x_0, x_star, self._x)
         if h is not None:
             self._info.append(h)
             info.append(h)
-        return x_star, info
+        return info
 
 
     def outer(self, kind=ConvexOuter.POLYHEDRAL):
@@ -67,8 +98,20 @@ class ConvexSet(Projectable, Oracle):
         else:
             raise(ValueError, "Unknown kind " + str(kind))
 
+    def project_dist(self, x_0):
+        """Projects x_0 onto the set, returning the distance as well
+
+        Args:
+            x_0 (array-like): point to project
+        Returns:
+            array-like: the projection x_star of x_0 onto the set
+            float: the distance ||x_0 - x_star||_2 from x_0 to the set
+        """
+        x_star = self.project(x_0)
+        return x_star, np.linalg.norm(x_0 - x_star, 2)
+
     def residual(self, x_0):
-        return np.linalg.norm(x_0 - self.project(x_0), 2)
+        return self.project_dist(x_0)[1]
 
     def residual_str(self, x_0):
         string = self.__repr__()
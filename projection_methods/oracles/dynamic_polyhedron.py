@@ -1,10 +1,12 @@
 import numpy as np
 
 from projection_methods.oracles.oracle import Oracle
+from projection_methods.projectables.gram_cholesky import GramCholesky
 from projection_methods.projectables.hyperplane import Hyperplane
 from projection_methods.projectables.halfspace import Halfspace
 from projection_methods.projectables.polyhedron import Polyhedron
 from projection_methods.projectables.projectable import Projectable
+import projection_methods.projectables.utils as utils
 
 
 class PolyOuter(object):
@@ -14,16 +16,27 @@ class PolyOuter(object):
         polyhedron
     ELRA: Evict least recently added
     ERANDOM: Evict random candidate
-    SUBSAMPLE: Expose a random subsample of the hyperplanes/halfspaces
-        such that, in expectation, max_hyperplanes / max_halfspace
-        hyperplanes/halfspaces are exposed in each call to outer
+    SUBSAMPLE: Expose a random subsample of max_hyperplanes hyperplanes
+        and max_halfspaces halfspaces, drawn anew whenever information is
+        added
+    EINACTIVE: Evict the candidate that has been inactive in the most
+        consecutive projections onto the outer approximation (ties are
+        broken by evicting the least recently added)
+    ELEASTVIOLATED: Evict the candidate least violated by the point most
+        recently projected onto the outer approximation
+
+    The activity-based policies (EINACTIVE, ELEASTVIOLATED) rely on the
+    statistics that DynamicPolyhedron.project and project_many record.
 
     TODO(akshayka):
         add EMRA: evict most recently added (weird idea)
     """
-    EXACT, ELRA, ERANDOM, ERESET, SUBSAMPLE = range(5)
-    POLICIES = frozenset([EXACT, ELRA, ERANDOM, ERESET, SUBSAMPLE])
-    EVICTIONS = frozenset([ELRA, ERANDOM, ERESET])
+    EXACT, ELRA, ERANDOM, ERESET, SUBSAMPLE, EINACTIVE, ELEASTVIOLATED = (
+        range(7))
+    POLICIES = frozenset([EXACT, ELRA, ERANDOM, ERESET, SUBSAMPLE, EINACTIVE,
+        ELEASTVIOLATED])
+    EVICTIONS = frozenset([ELRA, ERANDOM, ERESET, EINACTIVE, ELEASTVIOLATED])
+    ACTIVITY = frozenset([EINACTIVE, ELEASTVIOLATED])
 
 
 class DynamicPolyhedron(Oracle):
@@ -39,10 +52,30 @@ class DynamicPolyhedron(Oracle):
     interface; `query` interrogates the outer approximation of the managed
     polyhedron instead of the complete description of the set.
 
+    The outer approximation is tracked as records of the cut store of the
+    managed polyhedron (see CutStore), and outer polyhedra gather their
+    normals from that store, so information is only embedded once.
+
+    Under the eviction policies, the DynamicPolyhedron maintains a
+    factorization of the Gram matrix of the exposed (and pinned) hyperplanes,
+    which is updated as hyperplanes are added and downdated as they are
+    evicted; outer approximations consisting solely of hyperplanes are
+    projected onto with this factorization.
+
+    Under the activity-based policies, the DynamicPolyhedron records, for
+    every cut of the managed polyhedron that takes part in a projection onto
+    the outer approximation (see project), the number of consecutive
+    projections in which the cut was inactive, and its violation by the
+    latest point projected. A halfspace is active if it is tight at the
+    projection (it has a zero multiplier otherwise); a hyperplane, which is
+    always tight, is active if it is violated by the point projected.
+
     Attributes:
         max_hyperplanes: maximum number of hyperplanes (default infinite)
         max_halfspaces: maximum number of halfspaces (default infinite)
         policy: policy by which to construct outer approximations
+        version (int): a counter that changes whenever information is added
+            to or evicted from the outer approximation
     """
     def __init__(self, polyhedron, max_hyperplanes=float("inf"),
             max_halfspaces=float("inf"), policy=PolyOuter.EXACT):
@@ -57,6 +90,8 @@ class DynamicPolyhedron(Oracle):
         policy: a member of PolyOuter
         """
         self._polyhedron = polyhedron
+        # the cuts of the outer approximation, as records of the cut store
+        # of the managed polyhedron
         self._outer_hyperplanes = []
         self._outer_halfspaces = []
         self._pinned = []
@@ -69,6 +104,31 @@ class DynamicPolyhedron(Oracle):
             assert self.max_halfspaces == float("inf")
         self.policy = policy
 
+        if self.policy in PolyOuter.EVICTIONS:
+            self._factor = GramCholesky(polyhedron._shape[0])
+        else:
+            self._factor = None
+        # the presolve of the factorization (see Polyhedron): the pinned
+        # hyperplanes that fix coordinates, a mask of the free coordinates,
+        # and the values of the fixed ones
+        self._fixing = set()
+        self._free = None
+        self._fixed_values = None
+        # the outer approximation, cached until information is next added or
+        # evicted; the version counts additions and evictions
+        self.version = 0
+        self._outer = None
+        self._outer_version = -1
+        # cuts added since the cached outer approximation was built, and
+        # whether any cut was evicted since then
+        self._added = []
+        self._evicted = False
+        # activity statistics, indexed by the age of a cut in the store of
+        # the managed polyhedron
+        capacity = max(16, len(polyhedron._store))
+        self._inactive = np.zeros(capacity, dtype=int)
+        self._violation = np.full(capacity, np.inf)
+
 
     def add(self, information):
         """Adds hyperplanes and halfspaces to outer set, polyhedron
@@ -104,10 +164,80 @@ class DynamicPolyhedron(Oracle):
                 x_0 \in managed polyhedron \implies x_star == x_0, but
                 the converse is not true.
         """
-        x_star, h = self.outer().query(x_0)
+        outer = self.outer()
+        x_star, h = outer.query(x_0)
+        self._record(outer, x_0[None, :], x_star[None, :])
         return x_star, h
 
 
+    def project(self, x_0):
+        """Projects x_0 onto the outer approximation
+
+        Records the activity of the cuts of the outer approximation.
+        """
+        outer = self.outer()
+        x_star = outer.project(x_0)
+        self._record(outer, x_0[None, :], x_star[None, :])
+        return x_star
+
+
+    def project_many(self, X):
+        """Projects each row of X onto the outer approximation
+
+        Records the activity of the cuts of the outer approximation; a cut
+        is deemed active if it is active in the projection of any row.
+        """
+        outer = self.outer()
+        X_star = outer.project_many(X)
+        self._record(outer, X, X_star)
+        return X_star
+
+
+    def _record(self, outer, X, X_star):
+        """Records the activity of the cuts of outer in projecting X"""
+        if self.policy not in PolyOuter.ACTIVITY:
+            return
+        cuts = outer._store.cuts
+        if len(cuts) == 0:
+            return
+        C, d, equality = outer.matrix()
+        R_0 = np.asarray(C.dot(X.T)) - d[:, None]
+        R = np.asarray(C.dot(X_star.T)) - d[:, None]
+        tol = 1e-6 * np.maximum(1, np.abs(d))[:, None]
+        violation = np.where(equality[:, None], np.abs(R_0),
+            np.maximum(R_0, 0))
+        active = np.where(equality[:, None], violation > tol, R >= -tol)
+
+        # aggregate over rows of a cut, and over points
+        starts = np.array([cut.start for cut in cuts])
+        ages = np.array([cut.age for cut in cuts])
+        active = np.logical_or.reduceat(active.any(axis=1), starts)
+        self._inactive[ages] = np.where(active, 0, self._inactive[ages] + 1)
+        self._violation[ages] = np.maximum.reduceat(violation.max(axis=1),
+            starts)
+
+
+    def _track(self, cut):
+        """Starts the activity statistics of a newly added cut
+
+        Also records that the outer approximation changed.
+        """
+        self.version += 1
+        if self.policy != PolyOuter.EXACT:
+            self._added.append(cut)
+        if cut.age >= self._inactive.shape[0]:
+            capacity = max(cut.age + 1, 2 * self._inactive.shape[0])
+            inactive = np.zeros(capacity, dtype=int)
+            inactive[:self._inactive.shape[0]] = self._inactive
+            violation = np.full(capacity, np.inf)
+            violation[:self._violation.shape[0]] = self._violation
+            self._inactive, self._violation = inactive, violation
+        # a new cut has not yet been projected onto, so it is never the
+        # first to go
+        self._inactive[cut.age] = 0
+        self._violation[cut.age] = np.inf
+
+
     def outer(self):
         """Returns polyhedron defined by the current outer approximation
 
@@ -118,6 +248,11 @@ class DynamicPolyhedron(Oracle):
         returned polyhedron is not necessarily the same object as the
         DynamicPolyhedron's attribute `polyhedron`.
 
+        The polyhedron is cached, along with the state of its projection
+        engine, until information is next added or evicted (see version).
+        If information was only added, the cached polyhedron is extended
+        rather than rebuilt.
+
         Returns:
             Polyhedron: the outer approximation
         """
@@ -125,33 +260,73 @@ class DynamicPolyhedron(Oracle):
             len(self._polyhedron.hyperplanes()) <= self.max_hyperplanes and
             len(self._polyhedron.halfspaces()) <= self.max_halfspaces)):
             return self._polyhedron
+        if self._outer is not None and self._outer_version == self.version:
+            return self._outer
+
+        # eviction policies maintain outer as information is added
+        hyperplanes, halfspaces = (self._outer_hyperplanes,
+            self._outer_halfspaces)
+        if self.policy == PolyOuter.SUBSAMPLE:
+            hyperplanes = self._subsample(hyperplanes, self.max_hyperplanes)
+            halfspaces = self._subsample(halfspaces, self.max_halfspaces)
+        hyperplanes_only = len(halfspaces) == 0 and all(
+            cut.equality for cut in self._pinned)
+        factor = self._factor if hyperplanes_only else None
+        if (self._outer is not None and not self._evicted and
+                self.policy != PolyOuter.SUBSAMPLE):
+            # nothing was evicted, so the outer approximation only grew
+            self._outer.extend_cuts(self._polyhedron._store, self._added,
+                hyperplane_factor=factor)
         else:
-            if self.policy == PolyOuter.SUBSAMPLE:
-                if len(self._polyhedron.hyperplanes()) > self.max_hyperplanes:
-                    self._outer_hyperplanes = list(np.random.choice(
-                        self._polyhedron.hyperplanes(),
-                        size=self.max_hyperplanes, replace=False))
-                if len(self._polyhedron.halfspaces()) > self.max_halfspaces:
-                    self._outer_halfspaces = list(np.random.choice(
-                        self._polyhedron.halfspaces(),
-                        size=self.max_halfspaces, replace=False))
-            # eviction policies maintain outer as information is added
-            return Polyhedron(self._polyhedron._x,
-                self._outer_hyperplanes +
-                self._outer_halfspaces +
-                self._pinned)
+            self._outer = Polyhedron.from_cuts(self._polyhedron._x,
+                self._polyhedron._store, hyperplanes + halfspaces +
+                self._pinned, hyperplane_factor=factor)
+        self._added = []
+        self._evicted = False
+        self._outer_version = self.version
+        return self._outer
+
+
+    def _subsample(self, cuts, size):
+        """Returns a random subset of size cuts (or all of them, if fewer)"""
+        if len(cuts) <= size:
+            return cuts
+        return [cuts[i] for i in np.random.choice(len(cuts), size=int(size),
+            replace=False)]
 
 
     def _evict(self, items, max_len):
+        """Evicts items, in place, so that one more fits under max_len
+
+        Returns:
+            list: the evicted items
+        """
         if self.policy == PolyOuter.ELRA:
-            return items[len(items)-max_len+1:]
+            evicted = items[:len(items)-max_len+1]
+            del items[:len(items)-max_len+1]
         elif self.policy == PolyOuter.ERANDOM:
-            evict_index = random.randint(0, max_len - 1)
-            items[0:evict_index] + items[evict_index + 1:]
+            evicted = [items.pop(np.random.randint(0, len(items)))]
         elif self.policy == PolyOuter.ERESET:
-            return []
+            evicted = items[:]
+            del items[:]
+        elif self.policy in PolyOuter.ACTIVITY:
+            ages = np.array([cut.age for cut in items])
+            if self.policy == PolyOuter.EINACTIVE:
+                score = -self._inactive[ages]
+            else:
+                score = self._violation[ages]
+            # items are in the order in which they were added, so the stable
+            # sort evicts the least recently added among ties
+            order = np.argsort(score, kind='mergesort')
+            evict = set(order[:len(items)-max_len+1].tolist())
+            evicted = [items[i] for i in sorted(evict)]
+            items[:] = [cut for i, cut in enumerate(items) if i not in evict]
         else:
             raise RuntimeError('_evict invoked, but policy is not an eviction')
+        if len(evicted) > 0:
+            self.version += 1
+            self._evicted = True
+        return evicted
 
 
     def _add_hyperplane(self, hyperplane):
@@ -161,23 +336,59 @@ class DynamicPolyhedron(Oracle):
             # Note that pinned hyperplanes do _not_ count against the max
             # number of hyperplanes. The reasoning is that clients should
             # pin hyperplanes sparingly.
-            self._outer_hyperplanes = self._evict(self._outer_hyperplanes,
-                self.max_hyperplanes)
+            for cut in self._evict(self._outer_hyperplanes,
+                    self.max_hyperplanes):
+                if cut in self._factor:
+                    self._factor.remove(cut)
+        cut = self._polyhedron.add(hyperplane)[0]
+        self._track(cut)
         if hyperplane.pin:
-            self._pinned.append(hyperplane)
+            self._pinned.append(cut)
         else:
-            self._outer_hyperplanes.append(hyperplane)
-        self._polyhedron.add(hyperplane)
+            self._outer_hyperplanes.append(cut)
+        if self._factor is not None:
+            self._factor_add(cut)
+
+
+    def _factor_add(self, cut):
+        """Adds a hyperplane to the factorization
+
+        Pinned hyperplanes that fix coordinates are presolved as in
+        Polyhedron, so that the factorization can be shared with the outer
+        polyhedra: they are substituted into the other hyperplanes instead
+        of being factored.
+        """
+        store = self._polyhedron._store
+        A = store.normals(cut).copy()
+        b = store.offsets[cut.start:cut.stop].copy()
+        fixing = utils.fixed_coordinates(A, b) if cut.pin else None
+        if fixing is not None:
+            if self._free is None:
+                self._free = np.ones(self._factor.dim, dtype=bool)
+                self._fixed_values = np.zeros(self._factor.dim)
+            columns, values = fixing
+            self._free[columns] = False
+            self._fixed_values[columns] = values
+            self._fixing.add(cut)
+            # refactor the hyperplanes, with the new substitutions
+            self._factor = GramCholesky(self._factor.dim)
+            for c in self._outer_hyperplanes + self._pinned:
+                if c.equality and c not in self._fixing:
+                    self._factor_add(c)
+            return
+        if self._free is not None:
+            A, b = utils.eliminate(A, b, self._free, self._fixed_values)
+        self._factor.add(cut, A, b)
 
 
     def _add_halfspace(self, halfspace):
         if (len(self._outer_halfspaces) >= self.max_halfspaces and
                 self.policy in PolyOuter.EVICTIONS and
                 not halfspace.pin):
-            self._outer_halfspaces = self._evict(self._outer_halfspaces,
-                self.max_halfspaces)
+            self._evict(self._outer_halfspaces, self.max_halfspaces)
+        cut = self._polyhedron.add(halfspace)[0]
+        self._track(cut)
         if halfspace.pin:
-            self._pinned.append(halfspace)
+            self._pinned.append(cut)
         else:
-            self._outer_halfspaces.append(halfspace)
-        self._polyhedron.add(halfspace)
+            self._outer_halfspaces.append(cut)
@@ -0,0 +1,219 @@
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+
+class SparseLU(object):
+    """A sparse LU factorization that can be pickled and saved to disk
+
+    Wraps the factors of Pr M Pc = L U, as computed by SuperLU. Unlike the
+    SuperLU object (or the return value of scipy.sparse.linalg.factorized),
+    a SparseLU can be pickled and saved; a restored SparseLU solves with its
+    triangular factors, which are handed to SuperLU with the natural ordering
+    and no pivoting, so that restoring it costs O(nnz(L) + nnz(U)), without
+    any fill-in.
+
+    Attributes:
+        L (scipy.sparse.csc_matrix): unit lower triangular factor
+        U (scipy.sparse.csc_matrix): upper triangular factor
+        perm_r (numpy.ndarray): row permutation
+        perm_c (numpy.ndarray): column permutation
+    """
+    def __init__(self, L, U, perm_r, perm_c):
+        self.L = L.tocsc()
+        self.U = U.tocsc()
+        self.perm_r = np.asarray(perm_r)
+        self.perm_c = np.asarray(perm_c)
+        self._lu = None
+        self._triangular = None
+
+
+    @classmethod
+    def factor(cls, M, **kwargs):
+        """Factors a square sparse matrix M
+
+        Args:
+            M (scipy.sparse matrix): the matrix to factor
+            kwargs: keyword arguments for scipy.sparse.linalg.splu
+        Returns:
+            SparseLU: the factorization of M
+        """
+        lu = scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(M), **kwargs)
+        factorization = cls(lu.L, lu.U, lu.perm_r, lu.perm_c)
+        factorization._lu = lu
+        return factorization
+
+
+    def __call__(self, b):
+        """Returns the solution x of M x = b"""
+        if self._lu is not None:
+            return self._lu.solve(b)
+        if self._triangular is None:
+            self._triangular = [scipy.sparse.linalg.splu(T,
+                permc_spec='NATURAL', diag_pivot_thresh=0,
+                options=dict(SymmetricMode=True)) for T in (self.L, self.U)]
+        c = np.empty_like(b, dtype=float)
+        c[self.perm_r] = b
+        y = self._triangular[1].solve(self._triangular[0].solve(c))
+        return y[self.perm_c]
+
+
+    def is_singular(self, rtol=None):
+        """Returns True if M is numerically singular
+
+        M is deemed singular if a pivot (a diagonal entry of U) is at most
+        rtol times the largest pivot in magnitude.
+
+        Args:
+            rtol (float): the relative tolerance; defaults to n times the
+                machine epsilon, for M of dimension n
+        """
+        pivots = np.abs(self.U.diagonal())
+        if pivots.shape[0] == 0:
+            return False
+        if rtol is None:
+            rtol = pivots.shape[0] * np.finfo(float).eps
+        return pivots.min() <= rtol * pivots.max()
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lu'] = None
+        state['_triangular'] = None
+        return state
+
+
+    def save(self, path):
+        """Saves the factors to path (an .npz file)"""
+        np.savez(path, L_data=self.L.data, L_indices=self.L.indices,
+            L_indptr=self.L.indptr, U_data=self.U.data,
+            U_indices=self.U.indices, U_indptr=self.U.indptr,
+            perm_r=self.perm_r, perm_c=self.perm_c)
+
+
+    @classmethod
+    def load(cls, path):
+        """Restores factors saved with save"""
+        f = np.load(path)
+        n = f['perm_r'].shape[0]
+        L = scipy.sparse.csc_matrix(
+            (f['L_data'], f['L_indices'], f['L_indptr']), shape=(n, n))
+        U = scipy.sparse.csc_matrix(
+            (f['U_data'], f['U_indices'], f['U_indptr']), shape=(n, n))
+        return cls(L, U, f['perm_r'], f['perm_c'])
+
+
+def fingerprint(A, kind=''):
+    """Returns a fingerprint of a (dense or sparse) matrix
+
+    Two matrices have the same fingerprint if and only if (barring hash
+    collisions) they have the same shape and the same entries, regardless of
+    their storage format.
+
+    Args:
+        A (numpy.ndarray or scipy.sparse matrix): a matrix
+        kind (str): a tag identifying what is to be done with A (e.g., which
+            matrix derived from A is to be factored)
+    Returns:
+        str: a hex digest
+    """
+    if scipy.sparse.issparse(A):
+        A = scipy.sparse.csr_matrix(A, dtype=float, copy=True)
+    else:
+        A = scipy.sparse.csr_matrix(np.asarray(A, dtype=float))
+    A.sum_duplicates()
+    A.eliminate_zeros()
+    A.sort_indices()
+    h = hashlib.sha1(kind)
+    h.update(str(A.shape))
+    h.update(A.indptr.astype(np.int64).tobytes())
+    h.update(A.indices.astype(np.int64).tobytes())
+    h.update(A.data.tobytes())
+    return h.hexdigest()
+
+
+class FactorizationCache(object):
+    """A least-recently-used cache of factorizations
+
+    Factorizations are keyed by a fingerprint of the matrix from which they
+    were derived (see fingerprint), so that sets that share data share
+    factorizations. If a directory is supplied, factorizations are also saved
+    to and restored from it, so that they can be reused across processes.
+
+    Attributes:
+        max_entries (int): maximum number of factorizations kept in memory
+        directory (str): directory in which to store factorizations, or None
+    """
+    def __init__(self, max_entries=8, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = collections.OrderedDict()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+
+    def get(self, key, factor):
+        """Returns the factorization identified by key
+
+        Args:
+            key (str): a fingerprint
+            factor (callable): a function of no arguments that computes the
+                factorization (a SparseLU) if it is not cached
+        Returns:
+            SparseLU: the factorization
+        """
+        if key in self._entries:
+            factorization = self._entries.pop(key)
+        elif self.directory is not None and os.path.isfile(self._path(key)):
+            logging.info('restoring factorization from %s', self._path(key))
+            factorization = SparseLU.load(self._path(key))
+        else:
+            factorization = factor()
+            if self.directory is not None:
+                self._save(key, factorization)
+        self._entries[key] = factorization
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return factorization
+
+
+    def _save(self, key, factorization):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # write to a temporary file first, so that concurrent runs never read
+        # a partially written factorization
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            factorization.save(f)
+        os.rename(tmp, self._path(key))
+
+
+    def clear(self):
+        """Empties the in-memory cache"""
+        self._entries.clear()
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Returns the process-wide factorization cache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FactorizationCache()
+    return _default_cache
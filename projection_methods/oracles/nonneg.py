@@ -14,15 +14,21 @@ class NonNeg(Cone):
             x (cvxpy.Variable): a symbolic representation of
                 members of the set
         """
-        constr = [x >= 0]
-        super(NonNeg, self).__init__(x, constr)
+        super(NonNeg, self).__init__(x, None)
         self._i = 0
 
+    def _make_constr(self):
+        return [self._x >= 0]
+
     def contains(self, x_0, atol=1e-6):
         return (x_0 >= -1 * atol).all()
 
     def project(self, x_0):
         return x_0 if self.contains(x_0) else np.maximum(x_0, 0)
 
+    def project_many(self, X, atol=1e-6):
+        contained = (X >= -1 * atol).all(axis=1)
+        return np.where(contained[:, None], X, np.maximum(X, 0))
+
     def dual(self, x):
         return NonNeg(x)
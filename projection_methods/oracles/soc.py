@@ -16,8 +16,11 @@ class SOC(Cone):
             x (cvxpy.Variable): a symbolic representation of
                 members of the set
         """
-        constr = [cvxpy.norm(x[:-1], 2) <= x[-1]]
-        super(SOC, self).__init__(x, constr)
+        super(SOC, self).__init__(x, None)
+
+
+    def _make_constr(self):
+        return [cvxpy.norm(self._x[:-1], 2) <= self._x[-1]]
 
 
     def _contains(self, norm_z, t, atol=1e-4):
@@ -44,5 +47,18 @@ class SOC(Cone):
         else:
             return 0.5 * (1 + t/norm_z) * np.append(z, norm_z)
 
+    def project_many(self, X):
+        Z = X[:, :-1]
+        t = X[:, -1]
+        norm_z = np.linalg.norm(Z, 2, axis=1)
+        contained = (norm_z <= t) | np.isclose(norm_z, t, atol=1e-4)
+        zero = ~contained & (norm_z <= -t)
+        scale = np.zeros(X.shape[0])
+        outside = ~contained & ~zero
+        scale[outside] = 0.5 * (1 + t[outside] / norm_z[outside])
+        X_star = scale[:, None] * np.hstack((Z, norm_z[:, None]))
+        X_star[contained] = X[contained]
+        return X_star
+
     def dual(self, x):
         return SOC(x)
@@ -13,9 +13,11 @@ class Zeros(Cone):
             x (cvxpy.Variable): a symbolic representation of
                 members of the set
         """
-        constr = [x == np.zeros(np.prod(x.size))]
         self._unqueried = True
-        super(Zeros, self).__init__(x, constr)
+        super(Zeros, self).__init__(x, None)
+
+    def _make_constr(self):
+        return [self._x == np.zeros(np.prod(self._x.size))]
 
     def contains(self, x_0, atol=1e-6):
         return not np.any(np.absolute(x_0) > atol)
@@ -23,14 +25,17 @@ class Zeros(Cone):
     def project(self, x_0):
         return x_0 if self.contains(x_0) else np.zeros(x_0.shape)
 
+    def project_many(self, X, atol=1e-6):
+        contained = ~np.any(np.absolute(X) > atol, axis=1)
+        return np.where(contained[:, None], X, 0.)
+
     def dual(self, x):
         return Reals(x)
 
-    def query(self, x_0):
+    def _information(self, x_0, x_star):
         if self.contains(x_0):
-            return x_0, []
+            return []
 
-        x_star = self.project(x_0) 
         if self._unqueried:
             # This is an abuse of the word hyperplane; this function
             # actually returns a set of hyperplanes that exactly identifies
@@ -47,9 +52,9 @@ class Zeros(Cone):
             h = [Hyperplane(self._x, A, np.zeros(x_0.shape[0]), pin=True)]
             self._unqueried = False
             self._info.append(h)
-            return x_star, h
+            return h
         else:
-            return x_star, []
+            return []
 
 
 class Reals(Cone):
@@ -69,11 +74,14 @@ class Reals(Cone):
     def project(self, x_0):
         return x_0
 
+    def project_many(self, X):
+        return X
+
     def dual(self, x):
         return Zeros(x)
 
-    def query(self, x_0):
-        return x_0, []
+    def _information(self, x_0, x_star):
+        return []
 
     def residual(self, x_0):
         return 0
@@ -0,0 +1,260 @@
+import cvxpy
+import numpy as np
+import scipy.sparse
+
+from projection_methods.oracles.affine_set import AffineSet
+from projection_methods.oracles.cartesian_product import CartesianProduct
+from projection_methods.oracles.cone_spec import ConeSpec
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.zeros import Reals
+from projection_methods.problems.problem_factory import get_slices
+from projection_methods.problems.problems import FeasibilityProblem
+from projection_methods.projectables.hyperplane import Hyperplane
+
+
+def _duplicate_rows(A, b, rows, priority):
+    """Finds the rows of (A, b) among rows that duplicate another one
+
+    Candidate duplicates are found by hashing each row with a random linear
+    functional, and are then compared exactly.
+
+    Args:
+        A (scipy.sparse.csr_matrix): a matrix with sorted indices
+        b (numpy.ndarray): a vector
+        rows (numpy.ndarray): the rows to search
+        priority (numpy.ndarray): of the same length as rows; among
+            duplicates, the row of least priority is kept
+    Returns:
+        numpy.ndarray: the rows that duplicate a kept row
+        numpy.ndarray: the kept row that each of them duplicates
+    """
+    if rows.shape[0] < 2:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    state = np.random.RandomState(0)
+    h = A[rows].dot(state.randn(A.shape[1])) + state.randn() * b[rows]
+    order = np.lexsort((rows, priority, h))
+    dropped, kept = [], []
+    leader = order[0]
+    for i in order[1:]:
+        if h[i] != h[leader]:
+            leader = i
+            continue
+        r, l = rows[i], rows[leader]
+        if b[r] == b[l] and (A[r] != A[l]).nnz == 0:
+            dropped.append(r)
+            kept.append(l)
+    return np.array(dropped, dtype=int), np.array(kept, dtype=int)
+
+
+class PresolvedSCSProblem(FeasibilityProblem):
+    """An SCSProblem, presolved into a smaller feasibility problem
+
+    The homogeneous self-dual embedding of an SCSProblem (see SCSProblem)
+    iterates over uv = (p, y, tau, r, s, kappa), subject to Qu = v and
+    (u, v) \in C \times C^*. Some of this is fixed by the cones alone:
+
+        r is in {0}^n, so that the rows A.T y + c tau = r of Qu = v are
+            constraints on u alone;
+        for every row i of A in a Zeros cone, s_i = 0, so that
+            -A_i p + b_i tau = s_i is a constraint on u alone;
+        for every row i of A in a Reals cone, y_i = 0 and s_i is free, so
+            that the row only defines s_i and can be dropped;
+        a row i of A in a Zeros cone with A_i = 0 and b_i = 0 constrains
+            nothing, and can be dropped, setting y_i = 0;
+        a column j of A with A^j = 0 and c_j = 0 constrains nothing, and
+            can be dropped, setting p_j = 0;
+        a row i of A in a Zeros or NonNeg cone that duplicates another such
+            row (with the same offset b_i) is implied by it, and can be
+            dropped, adding y_i to the y of that row (a duplicate in a Zeros
+            cone is kept in favor of one in a NonNeg cone).
+
+    The presolved problem iterates over x = (p, y, tau, s, kappa), where p
+    keeps the columns of A that are not dropped, y the rows of A that are
+    neither free nor dropped, and s those of them that are in NonNeg or SOC
+    cones, subject to
+
+        A_y.T y + c_p tau = 0,
+        -A_y p + b_y tau - S s = 0,
+        -c_p.T p - b_y.T y - kappa = 0,
+        x \in R^{n_p} \times K_y^* \times R_+ \times K_s \times R_+,
+
+    where n_p is the length of p, A_y holds the rows of y and the columns of
+    p, and S selects the rows of s among those of y. Cones left with no
+    coordinates are removed. Dropping the empty rows and columns removes the
+    zero rows of this system (unlike [Q, -I], it has no identity block), but
+    its rows can still be linearly dependent, e.g., if rows of A in Zeros
+    cones, or columns of A, are dependent without being duplicates; the
+    factorization of its affine set is then singular, and the set projects
+    with 'lsqr' instead (see AffineSet).
+
+    Attributes:
+        problem (SCSProblem): the problem that was presolved
+        slices (list of slice): the slices of p, y, tau, s, and kappa in x
+        p_columns (numpy.ndarray): the columns of A that p keeps
+        y_rows (numpy.ndarray): the rows of A that y keeps
+        s_rows (numpy.ndarray): the rows of A that s keeps
+        free_rows (numpy.ndarray): the rows of A in Reals cones
+        empty_rows (numpy.ndarray): the empty rows that were dropped
+        dropped_rows (numpy.ndarray): the duplicate rows that were dropped
+        duplicated_rows (numpy.ndarray): the row that each dropped row
+            duplicates
+    """
+    def __init__(self, problem):
+        """
+        Args:
+            problem (SCSProblem): the problem to presolve
+        Raises:
+            ValueError if K has a cone that cannot be presolved
+        """
+        self.problem = problem
+        A = scipy.sparse.csr_matrix(problem.A, dtype=float)
+        A.sort_indices()
+        b = np.asarray(problem.b, dtype=float)
+        c = np.asarray(problem.c, dtype=float)
+        m = A.shape[0]
+
+        spec = problem.cone_spec()
+        types, dims = spec.types, spec.dims
+        leaf = np.repeat(np.arange(types.shape[0]), dims)
+        row_types = types[leaf]
+        empty = ((np.diff(A.indptr) == 0) & (b == 0) &
+            (row_types == ConeSpec.ZEROS))
+        self.empty_rows = np.flatnonzero(empty)
+        lp = np.flatnonzero(~empty & ((row_types == ConeSpec.ZEROS) |
+            (row_types == ConeSpec.NONNEG)))
+        self.dropped_rows, self.duplicated_rows = _duplicate_rows(A, b, lp,
+            (row_types[lp] != ConeSpec.ZEROS).astype(int))
+        self.free_rows = np.flatnonzero(row_types == ConeSpec.REALS)
+        kept = np.ones(m, dtype=bool)
+        kept[self.free_rows] = False
+        kept[self.dropped_rows] = False
+        kept[self.empty_rows] = False
+        self.y_rows = np.flatnonzero(kept)
+        with_s = kept & (row_types != ConeSpec.ZEROS)
+        self.s_rows = np.flatnonzero(with_s)
+
+        # the cones of y and s, without the cones they no longer touch
+        y_dims = np.bincount(leaf[self.y_rows], minlength=types.shape[0])
+        s_dims = np.bincount(leaf[self.s_rows], minlength=types.shape[0])
+        y_spec = ConeSpec(types[y_dims > 0], y_dims[y_dims > 0]).dual()
+        s_spec = ConeSpec(types[s_dims > 0], s_dims[s_dims > 0])
+
+        self.p_columns = np.flatnonzero((np.diff(A.tocsc().indptr) > 0) |
+            (c != 0))
+        n_p = self.p_columns.shape[0]
+        m_y, m_s = self.y_rows.shape[0], self.s_rows.shape[0]
+        block_dims = [n_p, m_y, 1, m_s, 1]
+        self.slices = get_slices(block_dims)
+        dim = sum(block_dims)
+        x = cvxpy.Variable(dim)
+        blocks = [(Reals, None), (CartesianProduct.from_spec, y_spec),
+            (NonNeg, None), (CartesianProduct.from_spec, s_spec),
+            (NonNeg, None)]
+        sets, slices = [], []
+        for (make, spec), slx, d in zip(blocks, self.slices, block_dims):
+            if d == 0:
+                continue
+            sets.append(make(x[slx]) if spec is None else make(x[slx], spec))
+            slices.append(slx)
+        product_set = CartesianProduct(x, sets, slices)
+
+        A_y, b_y = A[self.y_rows][:, self.p_columns], b[self.y_rows]
+        S = scipy.sparse.csr_matrix((-np.ones(m_s),
+            (np.flatnonzero(with_s[self.y_rows]), np.arange(m_s))),
+            shape=(m_y, m_s))
+        cm, bm = np.matrix(c[self.p_columns]).T, np.matrix(b_y).T
+        M = scipy.sparse.bmat([
+            [None, A_y.T, cm, None, None],
+            [-A_y, None, bm, S, None],
+            [-cm.T, -bm.T, None, None, -scipy.sparse.eye(1)]
+        ], format='csr')
+        # the shape of M is lost when every block of a column is None
+        M = scipy.sparse.csr_matrix((M.data, M.indices, M.indptr),
+            shape=(n_p + m_y + 1, dim))
+        affine_set = AffineSet(x=x, A=M, b=np.zeros(M.shape[0]))
+
+        self._A_free = A[self.free_rows]
+        self._b_free = b[self.free_rows]
+        super(PresolvedSCSProblem, self).__init__([product_set, affine_set],
+            self.reduce(problem.x_opt))
+        self.dimension = dim
+
+
+    def reduce(self, uv):
+        """Returns the presolved iterate x corresponding to uv
+
+        The coordinates of y at dropped rows are added to those at the rows
+        that they duplicate, which leaves A.T y and b.T y unchanged.
+        """
+        full = self.problem.product_set.slices
+        y, s = np.array(uv[full[1]], dtype=float), uv[full[4]]
+        np.add.at(y, self.duplicated_rows, y[self.dropped_rows])
+        return np.hstack((uv[full[0]][self.p_columns], y[self.y_rows],
+            uv[full[2]],
+            s[self.s_rows], uv[full[5]]))
+
+
+    def restore(self, x):
+        """Returns the iterate uv of the original problem corresponding to x
+
+        r is set to zero, the coordinates of p and y that were dropped are
+        set to zero, and those of s are recovered from their rows of Qu = v.
+        """
+        p_kept, y, tau, s, kappa = [x[slx] for slx in self.slices]
+        p = np.zeros(self.problem.n)
+        p[self.p_columns] = p_kept
+        y_full = np.zeros(self.problem.m)
+        y_full[self.y_rows] = y
+        s_full = np.zeros(self.problem.m)
+        s_full[self.s_rows] = s
+        s_full[self.free_rows] = self._b_free * tau - self._A_free.dot(p)
+        s_full[self.dropped_rows] = s_full[self.duplicated_rows]
+        return np.hstack((p, y_full, tau, np.zeros(self.problem.n), s_full,
+            kappa))
+
+
+    def duality_gap_constraint(self):
+        """See SCSProblem.duality_gap_constraint"""
+        x = self.sets[0]._x
+        py = x[slice(0, self.slices[1].stop)]
+        cb = np.hstack((self.problem.c[self.p_columns],
+            self.problem.b[self.y_rows]))
+        return Hyperplane(x=py, a=cb, b=0, pin=True)
+
+
+    def residual(self, x, projections=None):
+        """Returns the residuals of the original problem at restore(x)
+
+        The cone residual is that of x in the presolved problem (see
+        SCSProblem.residual).
+
+        Args:
+            x (array-like): the point for which to compute the residual
+            projections (tuple): the projections of x onto the product set
+                and the affine set, if already computed; only the former is
+                used
+        Returns:
+            tuple (float, float, float, float): (primal residual,
+                                                 dual residual,
+                                                 cone residual,
+                                                 duality gap)
+        """
+        x_star = (projections[0] if projections is not None else
+            self.sets[0].project(x))
+        cone_residual = np.linalg.norm(x - x_star, 2)
+        return self.problem.residual(self.restore(x),
+            cone_residual=cone_residual)
+
+
+    def __repr__(self):
+        string = type(self).__name__ + '\n'
+        string += 'dimension: %d (presolved from %d)\n' % (
+            self.dimension, self.problem.dimension)
+        string += str(self.sets[0]) + '\n'
+        string += str(self.sets[1])
+        return string
+
+
+def presolve(problem):
+    """Returns the PresolvedSCSProblem of an SCSProblem"""
+    return PresolvedSCSProblem(problem)
@@ -5,11 +5,13 @@ import scipy.sparse.linalg
 
 from projection_methods.oracles.affine_set import AffineSet
 from projection_methods.oracles.cartesian_product import CartesianProduct
+from projection_methods.oracles.cone_spec import ConeSpec
 from projection_methods.oracles.nonneg import NonNeg
 from projection_methods.oracles.soc import SOC
 from projection_methods.oracles.zeros import Reals, Zeros
 from projection_methods.problems.problems import FeasibilityProblem
 from projection_methods.problems.problems import SCSProblem
+from projection_methods.problems.scs_operator import SCSOperator
 
 # TODO(akshayka): Move this into a utils file
 def get_slices(dims):
@@ -22,7 +24,7 @@ def get_slices(dims):
     return slices
 
 
-def cone_program(x, cone_dims, cones, n, A):
+def cone_program(x, cone_dims, cones, n, A, matrix_free=False):
     """Generates a second-order cone program in SCS form with data matrix A
 
     Generates a feasibility problem in the style of the splitting
@@ -43,14 +45,57 @@ def cone_program(x, cone_dims, cones, n, A):
             is one of {NonNeg, Reals, Zeros, or SOC}
         n (int): the number of variables in p; at most m
         A (np.matrx or scipy.sparse matrix): data matrix A
+        matrix_free (bool): if True, the affine set is defined by an
+            SCSOperator, which applies [Q, -I] without materializing it (or
+            Q, or a KKT matrix), and the returned problem's Q is None
         
     Returns:
         SCSProblem: a feasible SCSProblem defined by cones and A; b is chosen
                     such that the problem is feasible
     """
-    # Construct the variable x = (u, v) and partition it into its components
     m = sum(cone_dims)
     assert m >= n
+    # The cones are described by a ConeSpec, so that no oracle is built per
+    # cone.
+    product_set = scs_product_set(x, ConeSpec.from_cones(cones, cone_dims), n)
+    K = product_set.sets[4]
+
+    # Construct members of the optimal set, problem data, and the optimal value;
+    # recall that (u, v) := (p, y, tau, r, s, kappa). First generate s, by
+    # projecting onto the cone, and y, by Moreau.
+    z = np.random.randn(m)
+    s = K.project(z)
+    y = s - z 
+
+    # Generate an optimal point p (called 'x' in the SCS paper), and data b, c.
+    p = np.random.randn(n)
+    b = A.dot(p) + s
+    c = -A.T.dot(y)
+
+    # Glue together our primal and dual optimal points to obtain an optimal
+    # point (u, v) = (p, y, tau, r, s, kappa)
+    uv_opt = np.hstack((p, y, 1, np.zeros(p.shape), s, 0))
+    assert uv_opt.shape == (x.size[0],)
+
+    affine_set, Q = scs_affine_set(x, A, b, c, matrix_free=matrix_free)
+    return SCSProblem(sets=[product_set, affine_set], x_opt=uv_opt,
+        Q=Q, A=A, b=b, c=c, p_opt=p)
+
+
+def scs_product_set(x, spec, n):
+    """Returns the product set C \times C^* of an SCSProblem
+
+    Args:
+        x (cvxpy.Variable): the variable (u, v); _must_ be of shape
+            (2 * (m + n + 1), 1)
+        spec (ConeSpec): the specification of the cone K of s, of dimension m
+        n (int): the number of variables in p
+    Returns:
+        CartesianProduct: R^n \times K^* \times R_+ \times {0}^n \times K
+            \times R_+
+    """
+    # Partition the variable x = (u, v) into its components
+    m = spec.dim
 
     #          0  1  2  3  4  5
     #          p  y tau r  s kappa
@@ -59,11 +104,8 @@ def cone_program(x, cone_dims, cones, n, A):
     uv_slices = get_slices(uv_dims)
     uv_vars = [x[slx] for slx in uv_slices]
 
-    # Construct the cones K, K*
-    # note that s := uv_vars[4]
-    cone_slices = get_slices(cone_dims)
-    cone_sets = [cls(uv_vars[4][slx]) for cls, slx in zip(cones, cone_slices)]
-    K = CartesianProduct(uv_vars[4], cone_sets, cone_slices)
+    # Construct the cones K, K*; note that s := uv_vars[4].
+    K = CartesianProduct.from_spec(uv_vars[4], spec)
     K_star = K.dual(uv_vars[1])
 
     # Constrain each variable in (u, v) to lie in its corresponding cone
@@ -76,24 +118,28 @@ def cone_program(x, cone_dims, cones, n, A):
     uv_sets[5] = NonNeg(uv_vars[5])
     
     # Finally, create the cartesian product for (u, v)
-    product_set = CartesianProduct(x, uv_sets, uv_slices)
+    return CartesianProduct(x, uv_sets, uv_slices)
 
-    # Construct members of the optimal set, problem data, and the optimal value;
-    # recall that (u, v) := (p, y, tau, r, s, kappa). First generate s, by
-    # projecting onto the cone, and y, by Moreau.
-    z = np.random.randn(m)
-    s = K.project(z)
-    y = s - z 
 
-    # Generate an optimal point p (called 'x' in the SCS paper), and data b, c.
-    p = np.random.randn(n)
-    b = A.dot(p) + s
-    c = -A.T.dot(y)
+def scs_affine_set(x, A, b, c, matrix_free=False):
+    """Returns the affine set [Q, -I] * [u, v].T = 0 of an SCSProblem
 
-    # Glue together our primal and dual optimal points to obtain an optimal
-    # point (u, v) = (p, y, tau, r, s, kappa)
-    uv_opt = np.hstack((p, y, 1, np.zeros(p.shape), s, 0))
-    assert uv_opt.shape == (sum(uv_dims),)
+    Args:
+        x (cvxpy.Variable): the variable (u, v)
+        A (np.matrix or scipy.sparse matrix): data matrix A
+        b (np.array): data vector b
+        c (np.array): data vector c
+        matrix_free (bool): see cone_program
+    Returns:
+        AffineSet: the affine set
+        scipy.sparse matrix: the augmented KKT matrix Q, or None if
+            matrix_free
+    """
+    m, n = A.shape
+    if matrix_free:
+        operator = SCSOperator(A, b, c)
+        return AffineSet(x=x, A=operator,
+            b=np.zeros(operator.shape[0])), None
 
     # Construct the augmented KKT matrix
     cm = np.matrix(c).T
@@ -109,19 +155,40 @@ def cone_program(x, cone_dims, cones, n, A):
     # Qu = v if and only if [Q, -I] * [u,v].T = 0
     Q_tilde = scipy.sparse.bmat([[Q, -1 * scipy.sparse.eye(Q.shape[0])]])
     assert Q_tilde.shape == (Q_dim, 2 * Q_dim)
-    affine_set = AffineSet(x=x, A=Q_tilde, b=np.zeros(Q_tilde.shape[0]))
-
-    return SCSProblem(sets=[product_set, affine_set], x_opt=uv_opt,
-        Q=Q, A=A, b=b, c=c, p_opt=p)
+    return AffineSet(x=x, A=Q_tilde, b=np.zeros(Q_tilde.shape[0])), Q
 
 
 def random_matrix(m, n, density):
-    A = scipy.sparse.rand(m=m, n=n, density=density, format='csc')
-    A.data = scipy.randn(A.nnz)
-    return A
-
+    """Generates a random sparse matrix
 
-def random_cone_program(x, cone_dims, cones, n, density=0.01):
+    Args:
+        m (int): the number of rows
+        n (int): the number of columns
+        density (float): the density of the matrix; a number in [0, 1]
+    Returns:
+        scipy.sparse.csc_matrix: an m x n matrix whose round(density * m * n)
+            nonzeros are standard normal, at distinct coordinates drawn
+            uniformly at random
+    """
+    size = m * n
+    nnz = int(round(density * size))
+    if 2 * nnz > size:
+        keys = np.random.permutation(size)[:nnz]
+    else:
+        # scipy.sparse.rand permutes all m * n coordinates, which takes
+        # minutes for large problems; instead, coordinates are drawn with
+        # replacement, deduplicated, and topped up until there are nnz of
+        # them (each draw fills at least half of those missing, on average)
+        keys = np.unique(np.random.randint(size, size=nnz))
+        while keys.shape[0] < nnz:
+            keys = np.union1d(keys, np.random.randint(size,
+                size=nnz - keys.shape[0]))
+    return scipy.sparse.csc_matrix((np.random.randn(nnz),
+        (keys // n, keys % n)), shape=(m, n))
+
+
+def random_cone_program(x, cone_dims, cones, n, density=0.01,
+        matrix_free=False):
     """Generates a random second-order cone program in SCS form
 
     Generates a random feasibility problem in the style of the splitting
@@ -135,12 +202,13 @@ def random_cone_program(x, cone_dims, cones, n, density=0.01):
             is one of {NonNeg, Reals, Zeros, or SOC}
         n (int): the number of variables in p; at most m
         density (float): the density of A; a number in (0, 1]
+        matrix_free (bool): see cone_program
 
     Returns:
         SCSProblem: a random, feasible SCSProblem
     """
     A = random_matrix(m=sum(cone_dims), n=n, density=density)
-    return cone_program(x, cone_dims, cones, n, A)
+    return cone_program(x, cone_dims, cones, n, A, matrix_free=matrix_free)
        
 
 def random_linear_program(m, n, density=0.01):
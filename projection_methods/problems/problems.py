@@ -1,7 +1,9 @@
 import numpy as np
+import scipy.sparse
 
 from projection_methods.oracles.affine_set import AffineSet
 from projection_methods.oracles.cartesian_product import CartesianProduct
+from projection_methods.oracles.cone_spec import ConeSpec
 from projection_methods.oracles.convex_set import ConvexSet
 from projection_methods.oracles.nonneg import NonNeg
 from projection_methods.oracles.cone import Cone
@@ -40,16 +42,21 @@ class FeasibilityProblem(object):
         self.dimension = x_opt.shape
 
 
-    def residual(self, x_0):
+    def residual(self, x_0, projections=None):
         """Return tuple (residual for first set, residual for second set)
 
         Args: 
             x_0 (array-like): the point for which to compute the residual
+            projections (tuple): the projections of x_0 onto the first and
+                the second set, if already computed
         Returns:
             tuple (float, float): (residual for first set,
                                    residual for second set)
         """
-        return (sets[0].residual(x_0), sets[1].residual(x_0))
+        if projections is not None:
+            return tuple(np.linalg.norm(x_0 - x_star, 2) for x_star in
+                projections)
+        return (self.sets[0].residual(x_0), self.sets[1].residual(x_0))
 
 
     def __repr__(self):
@@ -60,6 +67,73 @@ class FeasibilityProblem(object):
         return string
 
 
+class SCSResidual(object):
+    """An evaluator of the residuals of an SCSProblem (see SCSProblem.residual)
+
+    Precomputes the norms of b and c, and keeps CSR copies of A and of A.T,
+    so that both A p and A.T y are computed by row-oriented products, into
+    buffers that are reused across calls.
+
+    Attributes:
+        problem (SCSProblem): the problem whose residuals are evaluated
+        every (int): residuals are only evaluated on every every-th call;
+            the other calls return the residuals of the last evaluation
+    """
+    def __init__(self, problem, every=1):
+        if every < 1:
+            raise ValueError('every must be >= 1')
+        self.problem = problem
+        self.every = every
+        A = problem.A
+        self._A_csr = scipy.sparse.csr_matrix(A, dtype=float)
+        self._A_T = scipy.sparse.csc_matrix(A, dtype=float).T
+        self._b = np.asarray(problem.b, dtype=float)
+        self._c = np.asarray(problem.c, dtype=float)
+        self._b_scale = 1 + np.linalg.norm(self._b)
+        self._c_scale = 1 + np.linalg.norm(self._c)
+        self._primal = np.zeros(self._A_csr.shape[0])
+        self._dual = np.zeros(self._A_csr.shape[1])
+        slices = problem.product_set.slices
+        self._p, self._y, self._s = slices[0], slices[1], slices[4]
+        self._num_calls = 0
+        self._last = None
+
+
+    def __call__(self, uv, projections=None, cone_residual=None):
+        """Returns the residuals of uv, as SCSProblem.residual does
+
+        Args:
+            uv (array-like): as per SCSProblem.residual
+            projections (tuple): as per SCSProblem.residual
+            cone_residual (float): the cone residual, if already computed
+        """
+        self._num_calls += 1
+        if self._last is not None and (self._num_calls - 1) % self.every:
+            return self._last
+        p, y, s = uv[self._p], uv[self._y], uv[self._s]
+
+        # primal residual: A p + s - b
+        np.subtract(s, self._b, out=self._primal)
+        np.add(self._A_csr.dot(p), self._primal, out=self._primal)
+        pr = np.linalg.norm(self._primal) / self._b_scale
+
+        # dual residual: A.T y + c
+        np.add(self._A_T.dot(y), self._c, out=self._dual)
+        dr = np.linalg.norm(self._dual) / self._c_scale
+
+        if cone_residual is not None:
+            cr = cone_residual
+        else:
+            uv_star = (projections[0] if projections is not None else
+                self.problem.product_set.project(uv))
+            cr = np.linalg.norm(uv - uv_star, 2)
+        dg_unscaled = np.abs(self._c.dot(p) + self._b.dot(y))
+        dg = dg_unscaled / (1 + dg_unscaled)
+
+        self._last = (pr, dr, cr, dg)
+        return self._last
+
+
 class SCSProblem(FeasibilityProblem):
     """Description of a homogeneous self-dual embedding for cone programs
 
@@ -91,7 +165,8 @@ class SCSProblem(FeasibilityProblem):
             problem, sets[0] the affine set [Q, -I] * [u, v].T = 0, set[1]
             the cross product of the cones.
         x_opt (array-like): any point (u, v) that is optimal for (1)
-        Q (np.array): the augmented KKT matrix, as defined above
+        Q (np.array): the augmented KKT matrix, as defined above, or None if
+            the affine set is defined by an operator (see SCSOperator)
         A (np.array): as defined above
         b (np.array): as defined above
         c (np.array): as defined above
@@ -162,7 +237,39 @@ class SCSProblem(FeasibilityProblem):
         assert cb.shape[0] == np.prod(cb.shape)
         return Hyperplane(x=py, a=cb, b=0, pin=True)
 
-    def residual(self, uv):
+    def cone_spec(self):
+        """Returns the ConeSpec of K, the cone of s
+
+        Raises:
+            ValueError if K has a cone that a ConeSpec cannot describe
+        """
+        K = self.product_set.sets[4]
+        if isinstance(K, CartesianProduct):
+            types, _, dims = K._flatten()
+            return ConeSpec(types, dims)
+        return ConeSpec.from_cones([type(K)], [self.m])
+
+    def residual_evaluator(self, every=None):
+        """Returns the SCSResidual that computes residual
+
+        Args:
+            every (int): if not None, the evaluator is (re)built to evaluate
+                residuals on every every-th call only
+        """
+        evaluator = getattr(self, '_evaluator', None)
+        if evaluator is None or (every is not None and
+                every != evaluator.every):
+            evaluator = SCSResidual(self, every if every is not None else 1)
+            self._evaluator = evaluator
+        return evaluator
+
+    def __getstate__(self):
+        # the evaluator holds copies of A, which are cheap to rebuild
+        state = self.__dict__.copy()
+        state.pop('_evaluator', None)
+        return state
+
+    def residual(self, uv, projections=None, cone_residual=None):
         """Return tuple of scaled residuals (primal, dual, cone, duality gap)
 
         primal residual := norm(A.dot(p) + s - b) / (1 + norm(self.b))
@@ -172,32 +279,32 @@ class SCSProblem(FeasibilityProblem):
 
         Args:
             uv (array-like): the point for which to compute the residual
-                         
+            projections (tuple): the projections of uv onto the product set
+                and the affine set, if already computed; only the former is
+                used
+            cone_residual (float): the cone residual, if already computed
         Returns:
             tuple (float, float, float): (primal residual,
                                           dual residual,
                                           cone residual,
                                           duality gap)
         """
-        p = self.p(uv)
-        s = self.s(uv)
-        y = self.y(uv)
-
-        # TODO(akshayka): cache the denominators of pr and dr
-        pr = np.linalg.norm(self.A.dot(p) + s - self.b, 2) / (
-            1 + np.linalg.norm(self.b))
-        dr = np.linalg.norm(self.A.T.dot(y) + self.c) / (
-            1 + np.linalg.norm(self.c))
-        cr = np.linalg.norm(uv - self.product_set.project(uv), 2)
-        dg_unscaled = np.abs(self.c.dot(p) + self.b.dot(y))
-        dg = dg_unscaled  / (1 + dg_unscaled)
-
-        return (pr, dr, cr, dg)
+        assert uv.shape == (self.dimension,)
+        return self.residual_evaluator()(uv, projections, cone_residual)
 
     # utility functions for extracting the individual components of (u, v);
     # TODO(akshayka): utility functions to scale variables by tau / kappa
     #
     # recall that u := (p, y, tau), and p is called 'x' in the SCS paper.
+    # u and v are contiguous, so that u(uv) and v(uv) are views of uv
+    def u(self, uv):
+        assert uv.shape == (self.dimension,)
+        return uv[:self.n + self.m + 1]
+
+    def v(self, uv):
+        assert uv.shape == (self.dimension,)
+        return uv[self.n + self.m + 1:]
+
     def p(self, uv):
         assert uv.shape == (self.dimension,)
         return uv[self.product_set.slices[0]]
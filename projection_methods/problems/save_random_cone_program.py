@@ -33,6 +33,10 @@ def main():
     parser.add_argument(
         '-d', '--density', type=float, default=.01,
         help='density of data matrix A')
+    parser.add_argument(
+        '-mf', '--matrix_free', action='store_true',
+        help=('define the affine set by an operator, without materializing '
+        'the KKT matrix'))
     args = parser.parse_args()
 
     path = check_path(args.output)
@@ -43,7 +47,8 @@ def main():
         assert c in k_cones
     cones = [k_cones[c] for c in args.cones]
     cone_program = random_cone_program(x=x, cone_dims=args.cone_dims,
-        cones=cones, n=args.n, density=args.density)
+        cones=cones, n=args.n, density=args.density,
+        matrix_free=args.matrix_free)
     save_problem(path, cone_program)
         
 
@@ -0,0 +1,143 @@
+import cvxpy
+import numpy as np
+import scipy.sparse
+
+from projection_methods.oracles.cone_spec import ConeSpec
+from projection_methods.problems.problem_factory import scs_affine_set
+from projection_methods.problems.problem_factory import scs_product_set
+from projection_methods.problems.problems import SCSProblem
+
+
+def _inf_norms(A, axis):
+    """Returns the inf-norms of the rows (axis=1) or columns (axis=0) of A"""
+    norms = np.asarray(abs(A).max(axis=axis).todense()).ravel()
+    # empty rows and columns are left unscaled
+    norms[norms == 0] = 1
+    return norms
+
+
+def ruiz(A, spec, iters=25, bounds=(1e-4, 1e4)):
+    """Returns diagonal scalings D, E that equilibrate D A E
+
+    Ruiz equilibration repeatedly divides every row and every column of
+    D A E by the square root of its inf-norm, which drives these norms to
+    one. Scaling s by D must keep it in K, so that the rows of a second
+    order cone are scaled uniformly, by the mean of their inf-norms.
+
+    Args:
+        A (np.matrix or scipy.sparse matrix): an m x n matrix
+        spec (ConeSpec): the specification of the cone of the rows of A
+        iters (int): the number of iterations
+        bounds (tuple (float, float)): the entries of D and E are clipped
+            to [bounds[0], bounds[1]]
+    Returns:
+        numpy.ndarray: the diagonal of D, of length m
+        numpy.ndarray: the diagonal of E, of length n
+    """
+    A = scipy.sparse.csr_matrix(A, dtype=float)
+    m, n = A.shape
+    leaf = np.repeat(np.arange(len(spec)), spec.dims)
+    soc = spec.types[leaf] == ConeSpec.SOC
+    d, e = np.ones(m), np.ones(n)
+    for _ in xrange(iters):
+        scaled = scipy.sparse.diags(d).dot(A).dot(scipy.sparse.diags(e))
+        rows = _inf_norms(scaled, axis=1)
+        if np.any(soc):
+            means = (np.bincount(leaf, weights=rows, minlength=len(spec)) /
+                np.maximum(spec.dims, 1))
+            rows[soc] = means[leaf[soc]]
+        cols = _inf_norms(scaled, axis=0)
+        d = np.clip(d / np.sqrt(rows), bounds[0], bounds[1])
+        e = np.clip(e / np.sqrt(cols), bounds[0], bounds[1])
+    return d, e
+
+
+class ScaledSCSProblem(SCSProblem):
+    """An SCSProblem, equilibrated by diagonal scaling of its data
+
+    The scaled problem has data
+
+        A_hat = D A E, b_hat = sigma D b, c_hat = rho E c,
+
+    where D and E are diagonal (see ruiz), and sigma and rho scale D b and
+    E c to unit inf-norm. Its iterates are related to those of the original
+    problem by
+
+        (p_hat, y_hat, tau_hat, r_hat, s_hat, kappa_hat) =
+            (sigma E^{-1} p, rho D^{-1} y, tau, rho E r, sigma D s,
+             rho sigma kappa),
+
+    which maps solutions to solutions, since D preserves K and K^*.
+
+    Attributes:
+        problem (SCSProblem): the problem that was scaled
+        d (numpy.ndarray): the diagonal of D
+        e (numpy.ndarray): the diagonal of E
+        sigma (float): the scaling of b
+        rho (float): the scaling of c
+    """
+    def __init__(self, problem, iters=25, bounds=(1e-4, 1e4)):
+        """
+        Args:
+            problem (SCSProblem): the problem to scale
+            iters (int): the number of iterations of Ruiz equilibration
+            bounds (tuple (float, float)): the bounds on the entries of D
+                and E, and on sigma and rho
+        Raises:
+            ValueError if K has a cone that a ConeSpec cannot describe
+        """
+        self.problem = problem
+        spec = problem.cone_spec()
+        self.d, self.e = ruiz(problem.A, spec, iters, bounds)
+        A = scipy.sparse.diags(self.d).dot(scipy.sparse.csr_matrix(problem.A,
+            dtype=float)).dot(scipy.sparse.diags(self.e)).tocsr()
+        b = self.d * np.asarray(problem.b, dtype=float)
+        c = self.e * np.asarray(problem.c, dtype=float)
+        self.sigma = float(np.clip(1.0 / max(np.abs(b).max(), 1e-12),
+            bounds[0], bounds[1])) if b.shape[0] > 0 else 1.0
+        self.rho = float(np.clip(1.0 / max(np.abs(c).max(), 1e-12),
+            bounds[0], bounds[1])) if c.shape[0] > 0 else 1.0
+        b *= self.sigma
+        c *= self.rho
+        # the scaling of every coordinate of (u, v)
+        self._factors = np.hstack((self.sigma / self.e, self.rho / self.d, 1,
+            self.rho * self.e, self.sigma * self.d, self.rho * self.sigma))
+
+        x = cvxpy.Variable(problem.dimension)
+        product_set = scs_product_set(x, spec, problem.n)
+        affine_set, Q = scs_affine_set(x, A, b, c,
+            matrix_free=problem.Q is None)
+        p_opt = (self.sigma * problem.p_opt / self.e if problem.p_opt is not
+            None else None)
+        super(ScaledSCSProblem, self).__init__(
+            sets=[product_set, affine_set], x_opt=self.scale(problem.x_opt),
+            Q=Q, A=A, b=b, c=c, p_opt=p_opt)
+
+
+    def scale(self, uv):
+        """Returns the iterate of the scaled problem corresponding to uv"""
+        return self._factors * uv
+
+
+    def restore(self, uv):
+        """Returns the iterate of the original problem corresponding to uv"""
+        return uv / self._factors
+
+
+    def residual(self, uv, projections=None, cone_residual=None):
+        """Returns the residuals of the original problem at restore(uv)
+
+        The cone residual is that of uv in the scaled problem, unless one is
+        given (see SCSProblem.residual).
+        """
+        if cone_residual is None:
+            uv_star = (projections[0] if projections is not None else
+                self.product_set.project(uv))
+            cone_residual = np.linalg.norm(uv - uv_star, 2)
+        return self.problem.residual(self.restore(uv),
+            cone_residual=cone_residual)
+
+
+def equilibrate(problem, iters=25):
+    """Returns the ScaledSCSProblem of an SCSProblem"""
+    return ScaledSCSProblem(problem, iters=iters)
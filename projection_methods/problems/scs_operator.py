@@ -0,0 +1,96 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+
+class SCSOperator(scipy.sparse.linalg.LinearOperator):
+    """The operator [Q, -I] of an SCSProblem, applied without forming Q
+
+    Recall that the homogeneous self-dual embedding of a cone program with
+    data (A, b, c) requires Qu = v, where
+
+        Q = [[0,    A.T,  c],
+             [-A,   0,    b],
+             [-c.T, -b.T, 0]],
+
+    i.e., [Q, -I] * [u, v].T = 0. This operator applies [Q, -I] and its
+    transpose [-Q, -I].T (Q is skew-symmetric) with one copy of A, so that
+    neither Q, nor [Q, -I], nor the KKT matrix of an AffineSet defined by it
+    is ever materialized; AffineSets defined by an SCSOperator project with
+    the matrix-free methods.
+
+    Attributes:
+        A (scipy.sparse.csr_matrix): the m x n data matrix
+        b (numpy.ndarray): the m-vector b
+        c (numpy.ndarray): the n-vector c
+    """
+    def __init__(self, A, b, c):
+        """
+        Args:
+            A (np.matrix or scipy.sparse matrix): as per attribute
+            b (array-like): as per attribute
+            c (array-like): as per attribute
+        """
+        self.A = scipy.sparse.csr_matrix(A, dtype=float)
+        self.b = np.asarray(b, dtype=float).flatten()
+        self.c = np.asarray(c, dtype=float).flatten()
+        m, n = self.A.shape
+        self.m, self.n = m, n
+        dim = m + n + 1
+        super(SCSOperator, self).__init__(float, (dim, 2 * dim))
+
+
+    def _apply_q(self, U):
+        """Returns Q U, for U of shape (m + n + 1, k)"""
+        n, m = self.n, self.m
+        P, Y, tau = U[:n], U[n:n + m], U[n + m:]
+        return np.vstack((
+            self.A.T.dot(Y) + self.c[:, None] * tau,
+            -self.A.dot(P) + self.b[:, None] * tau,
+            -self.c.dot(P) - self.b.dot(Y)))
+
+
+    def _matmat(self, X):
+        dim = self.shape[0]
+        X = np.asarray(X, dtype=float).reshape(2 * dim, -1)
+        return self._apply_q(X[:dim]) - X[dim:]
+
+
+    def _matvec(self, x):
+        return self._matmat(x).ravel()
+
+
+    def _rmatvec(self, w):
+        w = np.asarray(w, dtype=float).reshape(-1, 1)
+        return -np.vstack((self._apply_q(w), w)).ravel()
+
+
+    def squared_row_norms(self):
+        """Returns the squared norms of the rows of [Q, -I]
+
+        Used to precondition the normal equations.
+        """
+        A = self.A
+        return np.hstack((
+            np.asarray(A.multiply(A).sum(axis=0)).ravel() + self.c ** 2,
+            np.asarray(A.multiply(A).sum(axis=1)).ravel() + self.b ** 2,
+            self.c.dot(self.c) + self.b.dot(self.b))) + 1
+
+
+    def getrow(self, i):
+        """Returns row i of [Q, -I], as a 1 x 2(m + n + 1) CSR matrix"""
+        e = np.zeros(self.shape[0])
+        e[i] = 1
+        return scipy.sparse.csr_matrix(self._rmatvec(e))
+
+
+    def tocsr(self):
+        """Returns [Q, -I], materialized as a CSR matrix"""
+        cm, bm = np.matrix(self.c).T, np.matrix(self.b).T
+        Q = scipy.sparse.bmat([
+            [None,   self.A.T, cm  ],
+            [-self.A, None,    bm  ],
+            [-cm.T,  -bm.T,    None]
+        ])
+        return scipy.sparse.bmat([[Q, -scipy.sparse.eye(self.shape[0])]],
+            format='csr')
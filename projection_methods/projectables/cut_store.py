@@ -0,0 +1,304 @@
+import numpy as np
+import scipy.sparse
+
+
+class Cut(object):
+    """A cut (a halfspace or a block of hyperplanes) held by a CutStore
+
+    Attributes:
+        start (int): the first row of the store that holds the cut
+        stop (int): one past the last row of the store that holds the cut
+        equality (bool): True for hyperplanes, False for halfspaces
+        pin (bool): whether the cut is pinned
+        age (int): the number of cuts that were added to the store (or to the
+            store from which the cut was taken) before this one
+        origin (object): the Halfspace or Hyperplane that the cut describes
+    """
+    __slots__ = ('start', 'stop', 'equality', 'pin', 'age', 'origin')
+
+    def __init__(self, start, stop, equality, pin, age, origin):
+        self.start = start
+        self.stop = stop
+        self.equality = equality
+        self.pin = pin
+        self.age = age
+        self.origin = origin
+
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+    def __getstate__(self):
+        return tuple(getattr(self, a) for a in Cut.__slots__)
+
+
+    def __setstate__(self, state):
+        for a, v in zip(Cut.__slots__, state):
+            setattr(self, a, v)
+
+
+class CutStore(object):
+    """Contiguous storage for the normals and offsets of a collection of cuts
+
+    The normals of the cuts are the rows of a matrix C, embedded in the
+    coordinates of a vector of dimension dim; the offsets are a vector d,
+    and a cut is either a block of hyperplanes C_i x == d_i or a halfspace
+    C_i x <= d_i. C is held either densely, in a 2-D array, or in CSR
+    form; the format follows the density of the normals, so that cone cuts,
+    which are supported on a single block of coordinates, cost memory in
+    proportion to their nonzeros. All arrays grow geometrically, so adding a
+    cut costs time in proportion to its size (amortized), and matrix()
+    returns views of them rather than copies.
+
+    Attributes:
+        dim (int): the number of columns of C
+        cuts (list of Cut): the cuts, in the order in which they were added
+    """
+    # the store converts to CSR when fewer than SPARSE_DENSITY of the
+    # entries of C are nonzero, and back to dense when more than
+    # DENSE_DENSITY are
+    SPARSE_DENSITY = 0.25
+    DENSE_DENSITY = 0.5
+
+    def __init__(self, dim, capacity=16):
+        self.dim = dim
+        self.cuts = []
+        self._num_rows = 0
+        self._nnz = 0
+        self._age = 0
+        capacity = max(capacity, 1)
+        self._offsets = np.zeros(capacity)
+        self._equality = np.zeros(capacity, dtype=bool)
+        # dense format
+        self._dense = None
+        # CSR format
+        self._indptr = None
+        self._indices = None
+        self._data = None
+
+
+    def __len__(self):
+        return len(self.cuts)
+
+
+    @property
+    def num_rows(self):
+        """The number of rows of C"""
+        return self._num_rows
+
+
+    @property
+    def is_sparse(self):
+        return self._indptr is not None
+
+
+    @property
+    def offsets(self):
+        """The offsets d (a view)"""
+        return self._offsets[:self._num_rows]
+
+
+    @property
+    def equality(self):
+        """A boolean array that is True at the rows of hyperplanes (a view)"""
+        return self._equality[:self._num_rows]
+
+
+    def matrix(self):
+        """Returns C, as a view of the store's arrays
+
+        Returns:
+            numpy.ndarray or scipy.sparse.csr_matrix: the num_rows x dim
+                matrix whose rows are the normals of the cuts
+        """
+        if self.is_sparse:
+            nnz = self._indptr[self._num_rows]
+            return scipy.sparse.csr_matrix((self._data[:nnz],
+                self._indices[:nnz], self._indptr[:self._num_rows + 1]),
+                shape=(self._num_rows, self.dim), copy=False)
+        if self._dense is None:
+            return np.zeros((0, self.dim))
+        return self._dense[:self._num_rows]
+
+
+    def normals(self, cut):
+        """Returns the rows of C that hold cut, as a view"""
+        if self.is_sparse:
+            lo, hi = self._indptr[cut.start], self._indptr[cut.stop]
+            return scipy.sparse.csr_matrix((self._data[lo:hi],
+                self._indices[lo:hi], self._indptr[cut.start:cut.stop + 1] -
+                lo), shape=(len(cut), self.dim), copy=False)
+        return self.matrix()[cut.start:cut.stop]
+
+
+    def add(self, A, b, equality, columns=None, pin=False, origin=None):
+        """Adds a cut
+
+        Args:
+            A (numpy.ndarray or scipy.sparse matrix): the k x n normals of the
+                cut, as rows
+            b (numpy.ndarray): the k offsets of the cut
+            equality (bool): True if the cut is a block of hyperplanes, False
+                if it is a halfspace
+            columns (slice): the n coordinates (of dim) on which A is defined;
+                defaults to all of them
+            pin (bool): as per Cut
+            origin (object): as per Cut
+        Returns:
+            Cut: the record of the cut
+        """
+        if columns is None:
+            columns = slice(0, self.dim, 1)
+        start, stop, step = columns.indices(self.dim)
+        assert len(xrange(start, stop, step)) == A.shape[1]
+        k = A.shape[0]
+        if scipy.sparse.issparse(A):
+            A = A.tocsr()
+            nnz = A.nnz
+        else:
+            A = np.atleast_2d(np.asarray(A, dtype=float))
+            nnz = np.count_nonzero(A)
+
+        if self._dense is None and not self.is_sparse:
+            # the first cut decides the format
+            if nnz < CutStore.SPARSE_DENSITY * k * self.dim:
+                self._to_sparse()
+            else:
+                self._to_dense()
+        self._reserve_rows(k)
+        r = self._num_rows
+        if self.is_sparse:
+            self._append_sparse(A, start, step)
+        else:
+            self._dense[r:r + k, start:stop:step] = (A.toarray() if
+                scipy.sparse.issparse(A) else A)
+        self._offsets[r:r + k] = b
+        self._equality[r:r + k] = equality
+        self._num_rows += k
+        self._nnz += nnz
+
+        cut = Cut(r, r + k, equality, pin, self._age, origin)
+        self._age += 1
+        self.cuts.append(cut)
+        self._maybe_convert()
+        return cut
+
+
+    def append(self, store, cut):
+        """Adds a copy of cut, a cut of store, with the metadata of cut
+
+        Returns:
+            Cut: the record of the copy
+        """
+        copy = self.add(store.normals(cut), store.offsets[cut.start:cut.stop],
+            cut.equality, pin=cut.pin, origin=cut.origin)
+        copy.age = cut.age
+        self._age = max(self._age, cut.age + 1)
+        return copy
+
+
+    def take(self, cuts):
+        """Returns a new CutStore that holds copies of cuts, in order
+
+        The returned store holds new Cut records, with the metadata of cuts.
+        """
+        store = CutStore(self.dim, capacity=sum(len(c) for c in cuts))
+        if len(cuts) == 0:
+            return store
+        rows = np.hstack([np.arange(c.start, c.stop) for c in cuts])
+        k = rows.shape[0]
+        C = self.matrix()[rows]
+        store._offsets[:k] = self._offsets[rows]
+        store._equality[:k] = self._equality[rows]
+        if self.is_sparse:
+            store._indptr = C.indptr.astype(np.int32)
+            store._indices = C.indices.astype(np.int32)
+            store._data = C.data
+            store._nnz = C.nnz
+        else:
+            store._dense = C
+            store._nnz = self._nnz if k == self._num_rows else (
+                np.count_nonzero(C))
+        store._num_rows = k
+        row = 0
+        for c in cuts:
+            store.cuts.append(Cut(row, row + len(c), c.equality, c.pin, c.age,
+                c.origin))
+            row += len(c)
+        store._age = max(c.age for c in cuts) + 1
+        store._maybe_convert()
+        return store
+
+
+    def _reserve_rows(self, k):
+        """Grows the per-row arrays so that they fit k more rows"""
+        needed = self._num_rows + k
+        capacity = self._offsets.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        self._offsets = _grow(self._offsets, capacity)
+        self._equality = _grow(self._equality, capacity)
+        if self.is_sparse:
+            self._indptr = _grow(self._indptr, capacity + 1)
+        else:
+            self._dense = _grow(self._dense, capacity)
+
+
+    def _append_sparse(self, A, start, step):
+        """Appends the rows of A, whose columns start:step map onto C's"""
+        k = A.shape[0]
+        if scipy.sparse.issparse(A):
+            counts = np.diff(A.indptr)
+            cols, data = A.indices, A.data
+        else:
+            rows, cols = np.nonzero(A)
+            data = A[rows, cols]
+            counts = np.bincount(rows, minlength=k)
+        nnz = self._indptr[self._num_rows]
+        needed = nnz + data.shape[0]
+        if needed > self._data.shape[0]:
+            capacity = max(needed, 2 * self._data.shape[0])
+            self._data = _grow(self._data, capacity)
+            self._indices = _grow(self._indices, capacity)
+        self._data[nnz:needed] = data
+        self._indices[nnz:needed] = start + step * cols
+        r = self._num_rows
+        self._indptr[r + 1:r + k + 1] = nnz + np.cumsum(counts)
+
+
+    def _maybe_convert(self):
+        entries = self._num_rows * self.dim
+        if not self.is_sparse and self._nnz < (
+                CutStore.SPARSE_DENSITY * entries):
+            self._to_sparse()
+        elif self.is_sparse and self._nnz > CutStore.DENSE_DENSITY * entries:
+            self._to_dense()
+
+
+    def _to_sparse(self):
+        capacity = self._offsets.shape[0]
+        C = scipy.sparse.csr_matrix(self.matrix())
+        self._indptr = np.zeros(capacity + 1, dtype=np.int32)
+        self._indptr[:self._num_rows + 1] = C.indptr
+        nnz_capacity = max(2 * C.nnz, capacity)
+        self._indices = _grow(C.indices.astype(np.int32), nnz_capacity)
+        self._data = _grow(C.data, nnz_capacity)
+        self._nnz = C.nnz
+        self._dense = None
+
+
+    def _to_dense(self):
+        dense = np.zeros((self._offsets.shape[0], self.dim))
+        if self.is_sparse:
+            dense[:self._num_rows] = self.matrix().toarray()
+        self._dense = dense
+        self._indptr = self._indices = self._data = None
+
+
+def _grow(a, length):
+    """Returns a copy of a, padded with zeros to length (along axis 0)"""
+    grown = np.zeros((length,) + a.shape[1:], dtype=a.dtype)
+    grown[:a.shape[0]] = a
+    return grown
@@ -0,0 +1,188 @@
+import collections
+
+import numpy as np
+import scipy.linalg
+
+import projection_methods.projectables.utils as utils
+
+
+def _cholesky_drop(S, norms, tol):
+    """Cholesky factorization of a PSD matrix that drops dependent rows
+
+    Args:
+        S (numpy.ndarray): a k x k positive semidefinite matrix
+        norms (numpy.ndarray): reference magnitudes for the diagonal of S; the
+            j-th row is deemed dependent if its pivot is at most
+            tol * norms[j]
+        tol (float): relative pivot tolerance
+    Returns:
+        numpy.ndarray: the factor L such that L L.T == S[kept][:, kept]
+        numpy.ndarray: the indices of the rows that were kept
+    """
+    k = S.shape[0]
+    L = np.zeros((k, k))
+    kept = []
+    for j in xrange(k):
+        c = len(kept)
+        pivot = S[j, j] - L[j, :c].dot(L[j, :c])
+        if pivot <= tol * max(1, norms[j]):
+            continue
+        L[j, c] = np.sqrt(pivot)
+        L[j+1:, c] = (S[j+1:, j] - L[j+1:, :c].dot(L[j, :c])) / L[j, c]
+        kept.append(j)
+    kept = np.array(kept, dtype=int)
+    return L[np.ix_(kept, np.arange(len(kept)))], kept
+
+
+def _cholesky_update(L, v):
+    """Updates L in place so that L L.T becomes L L.T + v v.T"""
+    v = v.copy()
+    for k in xrange(v.shape[0]):
+        r = np.hypot(L[k, k], v[k])
+        c = r / L[k, k]
+        s = v[k] / L[k, k]
+        L[k, k] = r
+        L[k+1:, k] = (L[k+1:, k] + s * v[k+1:]) / c
+        v[k+1:] = c * v[k+1:] - s * L[k+1:, k]
+
+
+class GramCholesky(object):
+    """An updatable factorization for projecting onto sets of hyperplanes
+
+    Maintains the normals C and offsets d of a collection of hyperplanes,
+    grouped in blocks that are added and removed as a unit, together with a
+    Cholesky factorization L L.T of C_S C_S.T, where C_S are the linearly
+    independent rows of C (dependent rows are assumed to be consistent, and
+    are dropped). The projection of x_0 onto \{ x | Cx = d \} is
+
+        x_0 - C_S.T (L L.T)^{-1} (C_S x_0 - d_S),
+
+    which costs O(nk + k^2) for k independent normals in R^n. Adding a block
+    of r rows costs O(k^2 r + nkr); removing one costs O(k^2 r).
+
+    Attributes:
+        dim (int): the dimension of the space in which the hyperplanes live
+        tol (float): relative tolerance below which rows are deemed dependent
+    """
+    def __init__(self, dim, tol=1e-10):
+        self.dim = dim
+        self.tol = tol
+        # key -> (normals of kept rows, offsets of kept rows, normals,
+        #         offsets)
+        self._blocks = collections.OrderedDict()
+        self._L = np.zeros((0, 0))
+        self._num_dropped = 0
+
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __contains__(self, key):
+        return key in self._blocks
+
+    def rank(self):
+        """Returns the number of independent rows in the factorization"""
+        return self._L.shape[0]
+
+
+    def add(self, key, A, b):
+        """Adds a block of hyperplanes Ax = b
+
+        Args:
+            key (hashable): a key with which to identify the block
+            A (numpy.ndarray or scipy.sparse matrix): r x dim normals
+            b (numpy.ndarray): r offsets
+        """
+        assert key not in self._blocks
+        assert A.shape[1] == self.dim
+        k = self._L.shape[0]
+        if k > 0:
+            cross = np.hstack([utils.cross_gram(A, B)
+                for B, _, _, _ in self._blocks.values()])
+            L21 = scipy.linalg.solve_triangular(self._L, cross.T,
+                lower=True).T
+        else:
+            L21 = np.zeros((A.shape[0], 0))
+        G22 = utils.gram(A)
+        L22, kept = _cholesky_drop(G22 - L21.dot(L21.T), np.diag(G22),
+            self.tol)
+
+        L = np.zeros((k + len(kept), k + len(kept)))
+        L[:k, :k] = self._L
+        L[k:, :k] = L21[kept]
+        L[k:, k:] = L22
+        self._L = L
+        if len(kept) < A.shape[0]:
+            self._num_dropped += A.shape[0] - len(kept)
+            self._blocks[key] = (A[kept], b[kept], A, b)
+        else:
+            self._blocks[key] = (A, b, A, b)
+
+
+    def remove(self, key):
+        """Removes the block identified by key"""
+        start = 0
+        for k, (A, _, _, _) in self._blocks.items():
+            if k == key:
+                break
+            start += A.shape[0]
+        A, _, A_all, _ = self._blocks.pop(key)
+        self._num_dropped -= A_all.shape[0] - A.shape[0]
+        stop = start + A.shape[0]
+        if self._num_dropped > 0 and stop > start:
+            # a previously dependent row may now be independent
+            self._rebuild()
+            return
+
+        # L = [[L11, 0, 0], [L21, L22, 0], [L31, L32, L33]]; removing the
+        # middle block leaves [[L11, 0], [L31, L33']], where
+        # L33' L33'.T = L33 L33.T + L32 L32.T
+        L33 = self._L[stop:, stop:].copy()
+        for v in self._L[stop:, start:stop].T:
+            _cholesky_update(L33, v)
+        k = self._L.shape[0] - (stop - start)
+        L = np.zeros((k, k))
+        L[:start, :start] = self._L[:start, :start]
+        L[start:, :start] = self._L[stop:, :start]
+        L[start:, start:] = L33
+        self._L = L
+
+
+    def _rebuild(self):
+        blocks = self._blocks
+        self._blocks = collections.OrderedDict()
+        self._L = np.zeros((0, 0))
+        self._num_dropped = 0
+        for key, (_, _, A, b) in blocks.items():
+            self.add(key, A, b)
+
+
+    def project(self, x_0):
+        """Projects x_0 onto the intersection of the hyperplanes"""
+        if self._L.shape[0] == 0:
+            return x_0
+        q = np.hstack([A.dot(x_0) - b for A, b, _, _ in self._blocks.values()])
+        nu = scipy.linalg.solve_triangular(self._L, q, lower=True)
+        nu = scipy.linalg.solve_triangular(self._L, nu, lower=True, trans='T')
+        x = x_0.copy()
+        row = 0
+        for A, _, _, _ in self._blocks.values():
+            x -= A.T.dot(nu[row:row + A.shape[0]])
+            row += A.shape[0]
+        return x
+
+
+    def project_many(self, X):
+        """Projects each row of X onto the intersection of the hyperplanes"""
+        if self._L.shape[0] == 0:
+            return X
+        Q = np.vstack([np.asarray(A.dot(X.T)) - b[:, None]
+            for A, b, _, _ in self._blocks.values()])
+        N = scipy.linalg.solve_triangular(self._L, Q, lower=True)
+        N = scipy.linalg.solve_triangular(self._L, N, lower=True, trans='T')
+        X_star = X.copy()
+        row = 0
+        for A, _, _, _ in self._blocks.values():
+            X_star -= np.asarray(A.T.dot(N[row:row + A.shape[0]])).T
+            row += A.shape[0]
+        return X_star
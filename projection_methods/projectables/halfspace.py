@@ -1,6 +1,8 @@
 import numpy as np
+import scipy.sparse
 
 from projection_methods.projectables.projectable import Projectable
+import projection_methods.projectables.utils as utils
 
 
 class Halfspace(Projectable):
@@ -20,19 +22,37 @@ class Halfspace(Projectable):
         self.a = a
         self.b = b
         self.pin = pin
-        constr = [a.T * x <= b]
-        super(Halfspace, self).__init__(x, constr)
+        super(Halfspace, self).__init__(x, None)
+        A = utils.normals(a)
+        assert A.shape[0] == 1, 'a Halfspace has exactly one normal vector'
+        self._normal = (A.toarray() if scipy.sparse.issparse(A) else A)[0]
+        self._offset = float(utils.offsets(b, 1)[0])
+        self._norm2 = self._normal.dot(self._normal)
+        self._A = self._normal.reshape(1, -1)
+        self._offsets = np.array([self._offset])
 
 
+    def _make_constr(self):
+        return [self.a.T * self._x <= self.b]
+
     def contains(self, x_0, atol=1e-4):
         """Return True if x_0 in halfspace, False otherwise"""
-        return np.less_equal(self.a.dot(x_0), self.b + atol).all()
+        return self._normal.dot(x_0) <= self._offset + atol
 
     def project(self, x_0):
+        """Project x_0 onto the halfspace in closed form
+
+        The projection of x_0 onto \{ x | <a, x> \leq b \} is
+            x_0 - max(0, <a, x_0> - b) / ||a||^2 * a.
+        """
         if self.contains(x_0):
             return x_0
-        else:
+        elif self._norm2 == 0:
+            # the halfspace is empty
             return super(Halfspace, self).project(x_0)
+        else:
+            r = self._normal.dot(x_0) - self._offset
+            return x_0 - (r / self._norm2) * self._normal
 
     def __repr__(self):
         string = type(self).__name__ + "\n"
@@ -1,6 +1,9 @@
 import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
 
 from projection_methods.projectables.projectable import Projectable
+import projection_methods.projectables.utils as utils
 
 
 class Hyperplane(Projectable):
@@ -20,19 +23,52 @@ class Hyperplane(Projectable):
         self.a = a
         self.b = b
         self.pin = pin
-        constr = [a.T * x == b]
-        super(Hyperplane, self).__init__(x, constr)
+        super(Hyperplane, self).__init__(x, None)
+        self._A = utils.normals(a)
+        self._offsets = utils.offsets(b, self._A.shape[0])
+        self._gram_solver = None
 
 
+    def _make_constr(self):
+        return [self.a.T * self._x == self.b]
+
     def contains(self, x_0, atol=1e-4):
         """Return True if x_0 in halfspace, False otherwise"""
-        return np.allclose(self.a.dot(x_0), self.b, atol=atol)
+        return np.allclose(self._A.dot(x_0), self._offsets, atol=atol)
+
+    def _make_gram_solver(self):
+        """Returns a function that solves systems in A * A.T"""
+        if scipy.sparse.issparse(self._A):
+            try:
+                return scipy.sparse.linalg.factorized(
+                    self._A.dot(self._A.T).tocsc())
+            except RuntimeError:
+                # A is rank-deficient; fall through to least squares
+                pass
+        G = utils.gram(self._A)
+        return lambda r: np.linalg.lstsq(G, r, rcond=None)[0]
 
     def project(self, x_0):
+        """Project x_0 onto the hyperplane(s) in closed form
+
+        The projection of x_0 onto \{ x | Ax = b \} is
+            x_0 - A.T (A A.T)^{-1} (A x_0 - b),
+        which for a single hyperplane reduces to
+            x_0 - (<a, x_0> - b) / ||a||^2 * a.
+        """
         if self.contains(x_0):
             return x_0
-        else:
-            return super(Hyperplane, self).project(x_0)
+        r = self._A.dot(x_0) - self._offsets
+        if self._A.shape[0] == 1:
+            a = (self._A.toarray() if scipy.sparse.issparse(self._A)
+                else self._A)[0]
+            norm2 = a.dot(a)
+            if norm2 == 0:
+                return super(Hyperplane, self).project(x_0)
+            return x_0 - (r[0] / norm2) * a
+        if self._gram_solver is None:
+            self._gram_solver = self._make_gram_solver()
+        return x_0 - self._A.T.dot(self._gram_solver(r))
 
     def __repr__(self):
         string = type(self).__name__ + "\n"
@@ -1,6 +1,11 @@
+import numpy as np
+
+from projection_methods.projectables.cut_store import CutStore
+from projection_methods.projectables.gram_cholesky import GramCholesky
 from projection_methods.projectables.halfspace import Halfspace
 from projection_methods.projectables.hyperplane import Hyperplane
 from projection_methods.projectables.projectable import Projectable
+import projection_methods.projectables.utils as utils
 
 
 class Polyhedron(Projectable):
@@ -12,24 +17,138 @@ class Polyhedron(Projectable):
     hyperplanes) and implements policies by which halfspaces and hyperplanes
     are evicted when maximum capacity is met.
 
+    The normals and offsets of the halfspaces and hyperplanes are kept in a
+    CutStore, in the coordinates of x, as they are added; projections are
+    computed natively from views of the store, by solving the dual of the
+    projection problem (see utils.solve_dual). The Gram matrix of the normals
+    is grown incrementally as halfspaces and hyperplanes are added, and the
+    multipliers of each projection warm-start the next one, so that a
+    projection only pays for the information that was added since the
+    previous projection.
+
+    While the polyhedron is defined by hyperplanes alone, the projection is a
+    linear solve with the Gram matrix; it is instead computed with a Cholesky
+    factorization of the Gram matrix (see GramCholesky) that is extended as
+    hyperplanes are added, at a cost of O(nk) per projection.
+
+    Pinned hyperplanes that fix coordinates (such as those of Zeros) are
+    presolved: the fixed values are substituted into the other constraints,
+    the projection is computed over the remaining coordinates, and the fixed
+    coordinates are set afterwards. The fixing hyperplanes thus never enter
+    the Gram matrix or its factorization.
+
     Attributes:
         max_hyperplanes: maximum number of hyperplanes (default infinite)
         max_halfspaces: maximum number of halfspaces (default infinite)
         eviction_policy: policy by which to evict halfspaces
     """
-    def __init__(self, x, information=[]):
+    def __init__(self, x, information=[], hyperplane_factor=None):
         """
         Args:
         x (cvxpy.Variable): a symbolic representation of
             members of the set
         information (list of Halfspace and/or Hyperplane): halfspaces and
             hyperplanes defining polyhedron
+        hyperplane_factor (GramCholesky): an optional factorization of the
+            hyperplanes in information, embedded in the coordinates of x;
+            used (but not modified) if information has no halfspaces, and
+            discarded as soon as information is added to the polyhedron
         """
+        # the constraints are only built if the generic projection (or
+        # __repr__) needs them
+        super(Polyhedron, self).__init__(x, None)
+        self._init_engine(CutStore(self._shape[0]))
+        self.add(information)
+        self._share_factor(hyperplane_factor)
+
+
+    @classmethod
+    def from_cuts(cls, x, store, cuts, hyperplane_factor=None):
+        """Returns the polyhedron defined by some of the cuts of a CutStore
+
+        The normals of the cuts are copied out of store in one gather, so
+        the polyhedron does not embed its information anew.
+
+        Args:
+            x (cvxpy.Variable): as per __init__; the variable of store
+            store (CutStore): a store whose columns are the coordinates of x
+            cuts (list of Cut): cuts of store, whose origins are the
+                halfspaces and hyperplanes of the polyhedron
+            hyperplane_factor (GramCholesky): as per __init__
+        Returns:
+            Polyhedron: the polyhedron
+        """
+        polyhedron = cls.__new__(cls)
+        super(Polyhedron, polyhedron).__init__(x, None)
+        polyhedron._init_engine(store.take(cuts))
+        for cut in polyhedron._store.cuts:
+            (polyhedron._hyperplanes if cut.equality else
+                polyhedron._halfspaces).append(cut.origin)
+        polyhedron._share_factor(hyperplane_factor)
+        return polyhedron
+
+
+    def extend_cuts(self, store, cuts, hyperplane_factor=None):
+        """Adds some of the cuts of a CutStore to the polyhedron
+
+        Unlike rebuilding the polyhedron with from_cuts, extending it keeps
+        the state of its projection engine (the Gram matrix and the
+        multipliers of the last projection), which is only extended.
+
+        Args:
+            store (CutStore): as per from_cuts
+            cuts (list of Cut): as per from_cuts
+            hyperplane_factor (GramCholesky): as per __init__, a
+                factorization of every hyperplane of the extended polyhedron
+        """
+        for cut in cuts:
+            self._store.append(store, cut)
+            (self._hyperplanes if cut.equality else
+                self._halfspaces).append(cut.origin)
+        if self._shared_factor or len(self._halfspaces) > 0:
+            self._factor = None
+            self._shared_factor = False
+        self._constr = None
+        self._invalidate()
+        self._share_factor(hyperplane_factor)
+
+
+    def _init_engine(self, store):
         self._hyperplanes = []
         self._halfspaces = []
-        self._constr = []
-        self.add(information)
-        super(Polyhedron, self).__init__(x, self._constr)
+        self._constr = None
+        # State for the projection engine: the normals and offsets of the
+        # information, embedded in the coordinates of x, in the order in
+        # which it was added; the Gram matrix of the normals; and the
+        # multipliers of the last projection.
+        self._x_slice = utils.var_slice(self._x)
+        self._store = store
+        # Presolve: the cuts that fix coordinates, a mask of the coordinates
+        # that are free (None if none are fixed) and the values of those that
+        # are not, the rows of the store that the engine projects onto, and
+        # the number of cuts presolved so far.
+        self._fixing = set()
+        self._free = None
+        self._fixed_values = None
+        self._engine_rows = np.zeros(0, dtype=int)
+        self._engine_cache = None
+        self._num_presolved = 0
+        self._gram = np.zeros((0, 0))
+        self._nu = np.zeros(0)
+        # The factorization of the Gram matrix of the hyperplanes, which is
+        # only maintained while there are no halfspaces, and the number of
+        # cuts that it covers.
+        self._factor = None
+        self._num_factored = 0
+        self._shared_factor = False
+
+
+    def _share_factor(self, hyperplane_factor):
+        if hyperplane_factor is not None and len(self._halfspaces) == 0:
+            assert hyperplane_factor.dim == self._shape[0]
+            self._factor = hyperplane_factor
+            self._num_factored = len(self._store)
+            self._shared_factor = True
 
 
     def halfspaces(self): return self._halfspaces
@@ -41,18 +160,208 @@ class Polyhedron(Projectable):
         Args:
             information (list of Hyperplane and/or Halfspace): halfspaces and
                 hyperplanes to add to polyhedron
+        Returns:
+            list of Cut: the records of the added information in the
+                polyhedron's CutStore
         Raises:
             ValueError if information contains an object that is not a
                 Hyperplane or a Halfspace
         """
         if type(information) is not list:
             information = [information]
+        cuts = []
         for info in information:
             if type(info) == Hyperplane:
                 self._hyperplanes.append(info)
-                self._constr += [c for c in info._constr]
             elif type(info) == Halfspace:
                 self._halfspaces.append(info)
-                self._constr += [c for c in info._constr]
             else:
                 raise ValueError, "Only Halfspaces or Hyperplanes can be added"
+            cuts.append(self._add_cut(info))
+        if self._shared_factor or len(self._halfspaces) > 0:
+            self._factor = None
+            self._shared_factor = False
+        self._constr = None
+        self._invalidate()
+        return cuts
+
+
+    def _add_cut(self, info):
+        """Embeds the normals of info in the coordinates of x, in the store"""
+        info_slice = utils.var_slice(info._x)
+        columns = slice(info_slice.start - self._x_slice.start,
+            info_slice.stop - self._x_slice.start, info_slice.step)
+        return self._store.add(info._A, info._offsets,
+            type(info) == Hyperplane, columns=columns, pin=info.pin,
+            origin=info)
+
+
+    def matrix(self):
+        """Returns the constraints C x (==, <=) d of the polyhedron
+
+        The returned arrays are views of the polyhedron's storage, and
+        are only valid until information is next added.
+
+        Returns:
+            numpy.ndarray or scipy.sparse.csr_matrix: C, whose rows are the
+                normals of the information, embedded in the coordinates of x
+            numpy.ndarray: the offsets d
+            numpy.ndarray: a boolean array that is True at the rows of
+                hyperplanes (equalities) and False at those of halfspaces
+        """
+        return self._store.matrix(), self._store.offsets, self._store.equality
+
+
+    def _make_constr(self):
+        return [c for cut in self._store.cuts for c in cut.origin._constr]
+
+
+    def _presolve(self):
+        """Removes the cuts that merely fix coordinates from the engine
+
+        Pinned hyperplanes that fix coordinates (see utils.fixed_coordinates)
+        are substituted into the remaining cuts instead of being projected
+        onto, so the engine only works over the free coordinates.
+        """
+        cuts = self._store.cuts
+        if self._num_presolved == len(cuts):
+            return
+        rows, fixed = [self._engine_rows], False
+        for cut in cuts[self._num_presolved:]:
+            fixing = None
+            if cut.pin and cut.equality:
+                fixing = utils.fixed_coordinates(self._store.normals(cut),
+                    self._store.offsets[cut.start:cut.stop])
+            if fixing is None:
+                rows.append(np.arange(cut.start, cut.stop))
+                continue
+            if self._free is None:
+                self._free = np.ones(self._shape[0], dtype=bool)
+                self._fixed_values = np.zeros(self._shape[0])
+            columns, values = fixing
+            self._free[columns] = False
+            self._fixed_values[columns] = values
+            self._fixing.add(cut)
+            fixed = True
+        self._engine_rows = np.hstack(rows).astype(int)
+        self._num_presolved = len(cuts)
+        if fixed:
+            # the engine's state does not account for the new substitutions
+            self._gram = np.zeros((0, 0))
+            self._nu = np.zeros(0)
+            if not self._shared_factor:
+                self._factor = None
+            self._engine_cache = None
+
+
+    def _engine(self):
+        """Returns the constraints C x (==, <=) d on the free coordinates
+
+        Without fixed coordinates, these are views of the store; otherwise,
+        they are the cuts that do not fix coordinates, with the fixed
+        coordinates substituted in, and are cached until cuts are added.
+        """
+        self._presolve()
+        if self._free is None:
+            return self.matrix()
+        if (self._engine_cache is None or
+                self._engine_cache[0] != self._store.num_rows):
+            C, d, equality = self.matrix()
+            rows = self._engine_rows
+            C, d = utils.eliminate(C[rows], d[rows], self._free,
+                self._fixed_values)
+            self._engine_cache = (self._store.num_rows, C, d, equality[rows])
+        return self._engine_cache[1:]
+
+
+    def _fix(self, x):
+        """Returns x, with its fixed coordinates (or columns) set"""
+        if self._free is None:
+            return x
+        x = x.copy()
+        x[..., ~self._free] = self._fixed_values[~self._free]
+        return x
+
+
+    def _sync_factor(self):
+        """Extends the factorization with the normals of new hyperplanes"""
+        self._presolve()
+        if self._factor is None:
+            self._factor = GramCholesky(self._shape[0])
+            self._num_factored = 0
+        cuts = self._store.cuts
+        for i in xrange(self._num_factored, len(cuts)):
+            if cuts[i] in self._fixing:
+                continue
+            # the factorization keeps its blocks, so it is given copies of
+            # the store's (growable) arrays
+            A = self._store.normals(cuts[i]).copy()
+            b = self._store.offsets[cuts[i].start:cuts[i].stop].copy()
+            if self._free is not None:
+                A, b = utils.eliminate(A, b, self._free, self._fixed_values)
+            self._factor.add(i, A, b)
+        self._num_factored = len(cuts)
+
+
+    def _sync_gram(self):
+        """Extends the Gram matrix with the normals of new information"""
+        C, _, _ = self._engine()
+        k = self._gram.shape[0]
+        k_total = C.shape[0]
+        if k == k_total:
+            return
+        k_new = k_total - k
+        gram = np.zeros((k_total, k_total))
+        gram[:k, :k] = self._gram
+        # the new rows of the Gram matrix, computed in one product
+        cross = utils.cross_gram(C[k:], C)
+        gram[k:, :] = cross
+        gram[:k, k:] = cross[:, :k].T
+
+        self._gram = gram
+        self._nu = np.hstack((self._nu, np.zeros(k_new)))
+
+
+    def contains(self, x_0, atol=1e-4):
+        """Return True if x_0 in polyhedron, False otherwise"""
+        C, d, equality = self.matrix()
+        return utils._violation(C.dot(x_0) - d, equality) <= atol
+
+
+    def project(self, x_0):
+        """Project x_0 onto the polyhedron
+
+        Args:
+            x_0 (array-like): point to project
+        Returns:
+            array-like: projection of x_0 onto the polyhedron
+        """
+        if len(self._halfspaces) == 0:
+            self._sync_factor()
+            return self._fix(self._factor.project(x_0))
+        self._sync_gram()
+        C, d, equality = self._engine()
+        q = C.dot(x_0) - d
+        tol = 1e-9 * max(1, np.max(np.abs(d), initial=0.))
+        if utils._violation(q, equality) <= tol:
+            return self._fix(x_0)
+        nu, converged = utils.solve_dual(self._gram, q, equality,
+            nu=self._nu, tol=tol)
+        if not converged:
+            # fall back to the generic (cvxpy-backed) projection
+            return super(Polyhedron, self).project(x_0)
+        self._nu = nu
+        return self._fix(x_0 - C.T.dot(nu))
+
+
+    def project_many(self, X):
+        """Project each row of X onto the polyhedron
+
+        Projections onto polyhedra of hyperplanes are computed for all rows
+        at once; otherwise, each row is projected in turn, warm-started by
+        the projection of the previous one.
+        """
+        if len(self._halfspaces) == 0:
+            self._sync_factor()
+            return self._fix(self._factor.project_many(X))
+        return super(Polyhedron, self).project_many(X)
@@ -10,8 +10,9 @@ class Projectable(object):
         """
         x (cvxpy.Variable or index into cvxpy.Variable): a symbolic
             representation of members of the set
-        constr (list of cvxpy.Expression): constraints to impose on members
-            of set
+        constr (list of cvxpy.Expression, or None): constraints to impose on
+            members of set; if None, the constraints are built by
+            _make_constr when they are first needed
         """
         assert type(x) == Variable or type(x) == index
         self._x = x
@@ -19,10 +20,18 @@ class Projectable(object):
         if len(self._shape) > 1 and self._shape[-1] == 1:
             self._shape = tuple(i for i in self._shape[:-1])
 
-        assert len(self._x.variables()) == 1
-        self._var = self._x.variables()[0]
+        variables = self._x.variables()
+        assert len(variables) == 1
+        self._var = variables[0]
 
+        if constr is not None:
+            self._check_constr(constr)
         self._constr = constr
+        # key under which the projection pool caches this set's constraints
+        self._pool_key = None
+
+
+    def _check_constr(self, constr):
         variables = set([v for c in constr for v in c.variables()])
         assert len(variables) <= 1, ("ConvexSet expects at most one variable "
             "to be constrained among its constraints, "
@@ -35,6 +44,34 @@ class Projectable(object):
                 (constrained._name, self._var._name))
 
 
+    def _make_constr(self):
+        """Returns the constraints defining the set
+
+        Called at most once, when the constraints are first needed, by sets
+        that were constructed without them; sets that may be constructed
+        without constraints must override it.
+
+        Raises:
+            ValueError if the set cannot build its constraints
+        """
+        raise ValueError('%s was constructed without constraints, but does '
+            'not define _make_constr' % type(self).__name__)
+
+
+    @property
+    def _constr(self):
+        if self._constr_list is None:
+            constr = self._make_constr()
+            self._check_constr(constr)
+            self._constr_list = constr
+        return self._constr_list
+
+
+    @_constr.setter
+    def _constr(self, constr):
+        self._constr_list = constr
+
+
     def contains(self, x_0, atol=1e-4):
         """Returns True if x_0 in set, False otherwise"""
         return np.isclose(self.project(x_0), x_0, atol=atol).all()
@@ -48,7 +85,43 @@ class Projectable(object):
         Returns:
             array-like: projection of x_0 onto set
         """
-        return utils.project(x_0, self._constr, self._x)
+        if self._pool_key is None:
+            self._pool_key = utils.default_pool().new_key()
+        return utils.project(x_0, self._constr, self._x, key=self._pool_key)
+
+
+    def project_many(self, X):
+        """Project each row of X onto set
+
+        Args:
+            X (numpy.ndarray): a 2-D array whose rows are points to project
+        Returns:
+            numpy.ndarray: a 2-D array whose i-th row is the projection of
+                the i-th row of X onto set
+        """
+        return np.array([self.project(x_0) for x_0 in X]).reshape(X.shape)
+
+
+    def _invalidate(self):
+        """Signals that the constraints defining the set have changed"""
+        key = getattr(self, '_pool_key', None)
+        if key is not None:
+            utils.default_pool().unregister(key)
+            self._pool_key = None
+
+
+    def __getstate__(self):
+        # registration keys are meaningless outside of this process
+        state = self.__dict__.copy()
+        state['_pool_key'] = None
+        return state
+
+
+    def __setstate__(self, state):
+        # sets pickled before their constraints could be deferred
+        if '_constr' in state:
+            state['_constr_list'] = state.pop('_constr')
+        self.__dict__.update(state)
 
 
     def __repr__(self):
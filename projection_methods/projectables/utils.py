@@ -0,0 +1,269 @@
+import numpy as np
+import scipy.sparse
+
+
+def normals(a):
+    """Returns the normal vectors of a (set of) hyperplane(s) as matrix rows
+
+    Halfspaces and hyperplanes are specified as a.T * x (<=, ==) b, where a is
+    either a single normal vector (a 1-D array, or an n x 1 matrix) or an
+    n x k matrix whose columns are normal vectors.
+
+    Args:
+        a (array-like or scipy.sparse matrix): normal vector(s)
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: a k x n matrix whose rows
+            are the normal vectors; dense if a is dense, CSR if a is sparse
+    """
+    if scipy.sparse.issparse(a):
+        return a.T.tocsr()
+    a = np.asarray(a, dtype=float)
+    if a.ndim <= 1:
+        return a.reshape(1, -1)
+    return a.T
+
+
+def offsets(b, k):
+    """Returns the offset(s) b of a.T * x (<=, ==) b as a 1-D array
+
+    Args:
+        b (float or array-like): offset(s)
+        k (int): the number of normal vectors
+    Returns:
+        numpy.ndarray: a 1-D array of length k
+    """
+    b = np.asarray(b, dtype=float).flatten()
+    if b.shape[0] == 1 and k > 1:
+        b = np.repeat(b, k)
+    assert b.shape[0] == k, 'received %d offsets for %d normals' % (
+        b.shape[0], k)
+    return b
+
+
+def gram(A):
+    """Returns the Gram matrix A * A.T as a dense array"""
+    G = A.dot(A.T)
+    return G.toarray() if scipy.sparse.issparse(G) else np.asarray(G)
+
+
+def cross_gram(A, B):
+    """Returns A * B.T as a dense array, for dense or sparse A and B"""
+    if scipy.sparse.issparse(A):
+        G = A.dot(B.T)
+    elif scipy.sparse.issparse(B):
+        G = B.dot(A.T).T
+    else:
+        G = A.dot(B.T)
+    return G.toarray() if scipy.sparse.issparse(G) else np.asarray(G)
+
+
+def stack(blocks):
+    """Stacks dense and/or sparse matrices vertically
+
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: a dense array if every
+            block is dense, a CSR matrix otherwise
+    """
+    if any(scipy.sparse.issparse(A) for A in blocks):
+        return scipy.sparse.vstack(blocks, format='csr')
+    return np.vstack(blocks)
+
+
+def var_slice(x):
+    """Returns the slice of its variable's coordinates that x represents
+
+    Args:
+        x (cvxpy.Variable or index into cvxpy.Variable): a (column)
+            vector expression
+    Returns:
+        slice: a slice s such that x is variable[s]
+    """
+    if len(x.args) == 0:
+        return slice(0, x.size[0], 1)
+    parent = var_slice(x.args[0])
+    length = len(xrange(parent.start, parent.stop, parent.step))
+    start, stop, step = x.key[0].indices(length)
+    count = len(xrange(start, stop, step))
+    start = parent.start + start * parent.step
+    step = parent.step * step
+    return slice(start, start + count * step, step)
+
+
+def embed(A, slx, dim):
+    """Embeds the columns of A into a wider matrix
+
+    Args:
+        A (numpy.ndarray or scipy.sparse matrix): a k x n matrix
+        slx (slice): a slice of [0, ..., dim - 1] of length n
+        dim (int): the number of columns in the returned matrix
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: a k x dim matrix B such
+            that B[:, slx] == A and B is zero elsewhere
+    """
+    if slx.start == 0 and slx.step == 1 and A.shape[1] == dim:
+        return A
+    columns = np.arange(dim)[slx]
+    if scipy.sparse.issparse(A):
+        A = A.tocoo()
+        return scipy.sparse.csr_matrix((A.data, (A.row, columns[A.col])),
+            shape=(A.shape[0], dim))
+    B = np.zeros((A.shape[0], dim))
+    B[:, columns] = A
+    return B
+
+
+def embedded_normals(info, x_slice, dim):
+    """Returns the normals of a halfspace or hyperplane in the coordinates of x
+
+    Args:
+        info (Halfspace or Hyperplane): the information
+        x_slice (slice): the slice of the variable that x covers, which must
+            contain the coordinates on which info is defined
+        dim (int): the dimension of x
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: the normals of info, as
+            rows, embedded in the coordinates of x
+    """
+    info_slice = var_slice(info._x)
+    slx = slice(info_slice.start - x_slice.start,
+        info_slice.stop - x_slice.start, info_slice.step)
+    return embed(info._A, slx, dim)
+
+
+def fixed_coordinates(A, b):
+    """Returns the coordinates fixed by Ax == b, if that is all it does
+
+    Ax == b fixes coordinates if every row of A has exactly one nonzero, and
+    no two rows have their nonzero in the same column; the identity
+    "hyperplanes" of Zeros are an example.
+
+    Args:
+        A (numpy.ndarray or scipy.sparse matrix): k x n normals
+        b (numpy.ndarray): k offsets
+    Returns:
+        tuple of numpy.ndarray: the columns that are fixed, and the values to
+            which they are fixed; None if Ax == b does not just fix
+            coordinates
+    """
+    if scipy.sparse.issparse(A):
+        A = scipy.sparse.csr_matrix(A, copy=True)
+        A.eliminate_zeros()
+        if np.any(np.diff(A.indptr) != 1):
+            return None
+        columns, coefficients = A.indices, A.data
+    else:
+        A = np.asarray(A)
+        if np.any(np.count_nonzero(A, axis=1) != 1):
+            return None
+        columns = np.argmax(A != 0, axis=1)
+        coefficients = A[np.arange(A.shape[0]), columns]
+    if np.unique(columns).shape[0] != columns.shape[0]:
+        return None
+    return columns.copy(), b / coefficients
+
+
+def eliminate(A, b, free, values):
+    """Substitutes fixed coordinates into A x (<=, ==) b
+
+    Args:
+        A (numpy.ndarray or scipy.sparse matrix): k x n normals
+        b (numpy.ndarray): k offsets
+        free (numpy.ndarray): a boolean mask of the coordinates that are not
+            fixed
+        values (numpy.ndarray): the values of the fixed coordinates, and zero
+            at the free ones
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: A, with the columns of the
+            fixed coordinates zeroed
+        numpy.ndarray: b - A values
+    """
+    b = b - A.dot(values)
+    if scipy.sparse.issparse(A):
+        A = A.dot(scipy.sparse.diags(free.astype(float))).tocsr()
+        A.eliminate_zeros()
+    else:
+        A = A * free
+    return A, b
+
+
+def _violation(r, equality):
+    """Returns the largest violation of r == 0 / r <= 0"""
+    if r.shape[0] == 0:
+        return 0.
+    return max(np.max(np.abs(r[equality]), initial=0.),
+        np.max(r[~equality], initial=0.))
+
+
+def solve_dual(G, q, equality, nu=None, tol=1e-9, max_iters=50,
+    max_sweeps=10000):
+    """Solves the dual of a projection onto a polyhedron
+
+    The projection of x_0 onto \{ x | C_i x == d_i, i in E; C_i x <= d_i,
+    i not in E \} is x_0 - C.T nu, where nu solves the bound-constrained QP
+
+        minimize 0.5 nu.T G nu - q.T nu
+        s.t.     nu_i >= 0, i not in E,
+
+    G = C C.T and q = C x_0 - d. The QP is solved with a primal-dual active
+    set method, warm-started from nu; should the active set method fail to
+    settle (e.g., because of degenerate cuts), the solution is finished with
+    Hildreth's method (dual coordinate ascent), which always converges.
+
+    Args:
+        G (numpy.ndarray): the k x k Gram matrix C C.T
+        q (numpy.ndarray): the k-vector C x_0 - d
+        equality (numpy.ndarray of bool): equality[i] is True if the i-th
+            constraint is an equality constraint
+        nu (numpy.ndarray): initial multipliers (defaults to zero)
+        tol (float): tolerance on the constraint violation, C x - d
+        max_iters (int): maximum number of active set iterations
+        max_sweeps (int): maximum number of coordinate ascent sweeps
+    Returns:
+        numpy.ndarray: the multipliers nu
+        bool: True if the solution satisfies the KKT conditions within tol
+    """
+    k = q.shape[0]
+    nu = np.zeros(k) if nu is None else np.array(nu, dtype=float)
+    nu[~equality] = np.maximum(nu[~equality], 0)
+
+    def converged(nu, r):
+        return (_violation(r, equality) <= tol and
+            np.all(nu[~equality] * np.abs(r[~equality]) <= tol *
+                np.maximum(1, np.abs(nu[~equality]))))
+
+    # primal-dual active set iterations
+    free = None
+    for _ in xrange(max_iters):
+        r = q - G.dot(nu)
+        next_free = equality | (nu + r > 0)
+        if free is not None and np.array_equal(free, next_free):
+            break
+        free = next_free
+        nu = np.zeros(k)
+        if free.any():
+            G_ff = G[np.ix_(free, free)]
+            try:
+                nu[free] = np.linalg.solve(G_ff, q[free])
+            except np.linalg.LinAlgError:
+                nu[free] = np.linalg.lstsq(G_ff, q[free], rcond=None)[0]
+    r = q - G.dot(nu)
+    if np.all(nu[~equality] >= 0) and converged(nu, r):
+        return nu, True
+
+    # Hildreth's method
+    nu[~equality] = np.maximum(nu[~equality], 0)
+    r = q - G.dot(nu)
+    diag = np.diag(G)
+    for _ in xrange(max_sweeps):
+        for i in xrange(k):
+            if diag[i] <= 0:
+                continue
+            delta = r[i] / diag[i]
+            if not equality[i]:
+                delta = max(delta, -nu[i])
+            if delta != 0:
+                nu[i] += delta
+                r -= delta * G[:, i]
+        if converged(nu, r):
+            return nu, True
+    return nu, False
@@ -1,8 +1,10 @@
 import cvxpy as cvxpy
 import numpy as np
+import scipy.sparse
 import unittest
 
 from projection_methods.oracles.affine_set import AffineSet
+from projection_methods.problems.scs_operator import SCSOperator
 import projection_methods.tests.utils as utils
 
 class TestAffineSet(unittest.TestCase):
@@ -42,3 +44,86 @@ class TestAffineSet(unittest.TestCase):
         self.assertTrue(np.isclose(np.array(x.value).flatten(), x_star,
             atol=1e-3).all())
         utils.query_helper(self, x_0, x_star, affine, idempotent=False)
+
+    def test_methods(self):
+        """Test that the KKT and normal equations methods agree."""
+        m = 20
+        n = 200
+        x = cvxpy.Variable(n)
+        A = scipy.sparse.random(m, n, density=0.1, format='csr')
+        b = A.dot(np.random.randn(n))
+        self.assertEqual(AffineSet(x, A, b).method, 'normal')
+        self.assertEqual(AffineSet(x, A.T.dot(A), A.T.dot(b)).method, 'kkt')
+
+        x_0 = np.random.randn(n)
+        kkt = AffineSet(x, A, b, method='kkt').project(x_0)
+        normal = AffineSet(x, A, b, method='normal').project(x_0)
+        self.assertTrue(np.allclose(kkt, normal))
+        self.assertTrue(np.allclose(A.dot(normal), b))
+
+    def test_rank_deficient(self):
+        """Test that singular factorizations fall back to lsqr."""
+        m = 20
+        n = 100
+        x = cvxpy.Variable(n)
+        A = scipy.sparse.random(m, n, density=0.2, format='lil')
+        A[m - 1] = A[0] + A[1]
+        A = A.tocsr()
+        b = A.dot(np.random.randn(n))
+        x_0 = np.random.randn(n)
+        expected = x_0 - np.linalg.pinv(A.toarray()).dot(A.dot(x_0) - b)
+        for method in ('kkt', 'normal'):
+            affine = AffineSet(x, A, b, method=method, rtol=1e-10)
+            x_star = affine.project(x_0)
+            self.assertEqual(affine.method, 'lsqr')
+            self.assertTrue(np.allclose(x_star, expected, atol=1e-6))
+            self.assertTrue(np.allclose(affine.project_many(
+                np.vstack((x_0, x_0))), expected, atol=1e-6))
+
+    def test_iterative(self):
+        """Test the matrix-free methods against the KKT method."""
+        m = 100
+        n = 300
+        x = cvxpy.Variable(n)
+        A = scipy.sparse.random(m, n, density=0.05, format='csr')
+        b = A.dot(np.random.randn(n))
+        kkt = AffineSet(x, A, b, method='kkt')
+        for method in ('cg', 'lsqr'):
+            affine = AffineSet(x, A, b, method=method, rtol=1e-10)
+            # project a sequence of nearby points, to exercise warm starts
+            x_0 = np.random.randn(n)
+            for _ in xrange(3):
+                x_0 = x_0 + 0.1 * np.random.randn(n)
+                self.assertTrue(np.allclose(affine.project(x_0),
+                    kkt.project(x_0), atol=1e-6))
+
+    def test_operator(self):
+        """Test affine sets defined by an SCSOperator."""
+        m, n = 40, 20
+        A = scipy.sparse.random(m, n, density=0.2, format='csr')
+        operator = SCSOperator(A, np.random.randn(m), np.random.randn(n))
+        Q_tilde = operator.tocsr()
+        dim = Q_tilde.shape[1]
+        self.assertEqual(operator.shape, Q_tilde.shape)
+        X = np.random.randn(dim, 3)
+        w = np.random.randn(dim / 2)
+        self.assertTrue(np.allclose(operator.dot(X), Q_tilde.dot(X)))
+        self.assertTrue(np.allclose(operator.H.dot(w), Q_tilde.T.dot(w)))
+        self.assertTrue(np.allclose(operator.squared_row_norms(),
+            np.asarray(Q_tilde.multiply(Q_tilde).sum(axis=1)).flatten()))
+        self.assertTrue(np.allclose(operator.getrow(3).toarray(),
+            Q_tilde.getrow(3).toarray()))
+
+        x = cvxpy.Variable(dim)
+        b = np.zeros(dim / 2)
+        kkt = AffineSet(x, Q_tilde, b, method='kkt')
+        with self.assertRaises(ValueError):
+            AffineSet(x, operator, b, method='normal')
+        for method in ('auto', 'lsqr'):
+            affine = AffineSet(x, operator, b, method=method, rtol=1e-10)
+            x_0 = np.random.randn(dim)
+            self.assertTrue(np.allclose(affine.project(x_0),
+                kkt.project(x_0), atol=1e-6))
+            _, info = affine.query(x_0, data_hyperplanes=2)
+            self.assertEqual(len(info), 3)
+        self.assertEqual(affine._constr[0].size, (dim / 2, 1))
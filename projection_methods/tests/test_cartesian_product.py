@@ -0,0 +1,101 @@
+import cvxpy as cvxpy
+import numpy as np
+import unittest
+
+from projection_methods.oracles.cartesian_product import CartesianProduct
+from projection_methods.oracles.cone_spec import ConeSpec
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Reals, Zeros
+from projection_methods.problems.problem_factory import get_slices
+
+
+class TestCartesianProduct(unittest.TestCase):
+    def test_projection(self):
+        """Test the vectorized projection against the cones' projections."""
+        classes = [NonNeg, Zeros, Reals, SOC]
+        dims = list(np.random.randint(1, 6, size=60))
+        cones = [classes[i % len(classes)] for i in xrange(len(dims))]
+        x = cvxpy.Variable(sum(dims) + 10)
+        slices = get_slices(dims + [10])
+        sets = [cls(x[slx]) for cls, slx in zip(cones, slices[:-1])]
+        # a nested product
+        z = x[slices[-1]]
+        sets.append(CartesianProduct(z, [SOC(z[0:4]), NonNeg(z[4:10])],
+            get_slices([4, 6])))
+        product = CartesianProduct(x, sets, slices)
+
+        X = np.random.randn(10, sum(dims) + 10)
+        def reference(x_0):
+            blocks = []
+            for s, slx in zip(sets, slices):
+                if isinstance(s, CartesianProduct):
+                    blocks.extend(c.project(x_0[slx][sub]) for c, sub in
+                        zip(s.sets, s.slices))
+                else:
+                    blocks.append(s.project(x_0[slx]))
+            return np.hstack(blocks)
+
+        # points in the cones
+        X[0] = reference(X[0])
+        X[1] = 0
+        X_star = product.project_many(X)
+        for x_0, x_star in zip(X, X_star):
+            self.assertTrue(np.array_equal(product.project(x_0), x_star))
+            self.assertTrue(np.allclose(x_star, reference(x_0)))
+        self.assertTrue(np.array_equal(X_star[0], X[0]))
+
+        # one cut per cone that moved the query point
+        x_star, info = product.query(X[2])
+        moved = [s for s, slx in zip(sets[:-1], slices[:-1]) if
+            type(s) != Reals and not np.array_equal(x_star[slx], X[2][slx])]
+        self.assertTrue(len(info) >= len(moved))
+
+
+    def test_spec(self):
+        """Test that a product backed by a ConeSpec builds no cones."""
+        classes = [NonNeg, Zeros, Reals, SOC]
+        dims = list(np.random.randint(1, 6, size=40))
+        cones = [classes[i % len(classes)] for i in xrange(len(dims))]
+        x = cvxpy.Variable(sum(dims))
+        y = cvxpy.Variable(sum(dims))
+        slices = get_slices(dims)
+        explicit = CartesianProduct(x,
+            [cls(x[slx]) for cls, slx in zip(cones, slices)], slices)
+        product = CartesianProduct.from_spec(x,
+            ConeSpec.from_cones(cones, dims))
+        dual = product.dual(y)
+
+        X = np.random.randn(5, sum(dims))
+        self.assertTrue(np.array_equal(product.project_many(X),
+            explicit.project_many(X)))
+        self.assertTrue(np.array_equal(dual.project_many(X),
+            explicit.dual(y).project_many(X)))
+        self.assertTrue(np.allclose(product.residual(X[0]),
+            explicit.residual(X[0])))
+        self.assertEqual(repr(product), repr(explicit))
+        for p in (product, dual):
+            self.assertTrue(p._sets is None)
+            self.assertTrue(p._constr_list is None)
+            self.assertEqual(len(p._cones), 0)
+
+        # only the cones that yield cuts are built
+        _, info = product.query(X[0])
+        self.assertTrue(0 < len(product._cones) < len(dims))
+        self.assertTrue(len(info) > 0)
+        self.assertEqual([type(s) for s in product.sets], cones)
+        self.assertEqual(product.slices, slices)
+        self.assertEqual(len(product._constr), len(explicit._constr))
+
+        # the spec of a product of 100k cones is built with no cvxpy objects
+        spec = ConeSpec(np.arange(100000) % 4, np.ones(100000, dtype=int) * 2)
+        z = cvxpy.Variable(spec.dim)
+        large = CartesianProduct.from_spec(z, spec).dual(z)
+        self.assertEqual(large.project_many(np.ones((1, spec.dim))).shape,
+            (1, spec.dim))
+        self.assertEqual(len(large._cones), 0)
+
+        with self.assertRaises(ValueError):
+            ConeSpec.from_cones([CartesianProduct], [1])
+        with self.assertRaises(ValueError):
+            ConeSpec([ConeSpec.SOC], [0])
@@ -0,0 +1,78 @@
+import cPickle
+import unittest
+
+import numpy as np
+import scipy.sparse
+
+from projection_methods.projectables.cut_store import CutStore
+
+
+class TestCutStore(unittest.TestCase):
+    def test_add(self):
+        """Test that cuts are laid out as the rows of a growing matrix."""
+        dim = 20
+        blocks, reference = [], np.zeros((0, dim))
+        for i in xrange(40):
+            # alternate dense full-width cuts and sparse cuts on a slice
+            if i % 4 == 0:
+                A, columns = np.random.randn(1, dim), None
+                embedded = A
+            else:
+                A = scipy.sparse.random(2, 5, density=0.5, format='csr')
+                columns = slice(5 * (i % 4), 5 * (i % 4) + 5)
+                embedded = np.zeros((2, dim))
+                embedded[:, columns] = A.toarray()
+            blocks.append((A, np.random.randn(A.shape[0]), columns))
+            reference = np.vstack((reference, embedded))
+
+        for store in (CutStore(dim, capacity=1), CutStore(dim)):
+            for i, (A, b, columns) in enumerate(blocks):
+                store.add(A, b, i % 2 == 0, columns=columns, pin=i == 3,
+                    origin=i)
+            C = store.matrix()
+            C = C.toarray() if scipy.sparse.issparse(C) else C
+            self.assertTrue(np.allclose(C, reference))
+            self.assertEqual(store.num_rows, reference.shape[0])
+            self.assertTrue(np.allclose(store.offsets,
+                np.hstack([b for _, b, _ in blocks])))
+            cut = store.cuts[5]
+            self.assertEqual((cut.age, cut.origin, cut.equality), (5, 5,
+                False))
+            self.assertTrue(store.cuts[3].pin)
+            normals = store.normals(cut)
+            normals = (normals.toarray() if scipy.sparse.issparse(normals)
+                else normals)
+            self.assertTrue(np.allclose(normals,
+                reference[cut.start:cut.stop]))
+
+            taken = store.take([store.cuts[7], store.cuts[2]])
+            C = taken.matrix()
+            C = C.toarray() if scipy.sparse.issparse(C) else C
+            self.assertTrue(np.allclose(C, np.vstack((
+                reference[store.cuts[7].start:store.cuts[7].stop],
+                reference[store.cuts[2].start:store.cuts[2].stop]))))
+            self.assertEqual([c.age for c in taken.cuts], [7, 2])
+            pickled = cPickle.loads(cPickle.dumps(taken.cuts[0], 2))
+            self.assertEqual(pickled.stop, taken.cuts[0].stop)
+
+    def test_format(self):
+        """Test that the storage format follows the density of the cuts."""
+        dim = 100
+        store = CutStore(dim)
+        store.add(np.random.randn(3, dim), np.zeros(3), False)
+        self.assertFalse(store.is_sparse)
+        C = store.matrix()
+        for i in xrange(30):
+            store.add(np.ones((1, 2)), np.zeros(1), False,
+                columns=slice(2 * i, 2 * i + 2))
+        self.assertTrue(store.is_sparse)
+        self.assertTrue(np.allclose(store.matrix().toarray()[:3], C))
+        for i in xrange(60):
+            store.add(np.ones((1, dim)), np.zeros(1), False)
+        self.assertFalse(store.is_sparse)
+        self.assertEqual(store.matrix().shape, (93, dim))
+        self.assertTrue(np.allclose(store.matrix()[:3], C))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import cvxpy
+import numpy as np
+import unittest
+
+from projection_methods.algorithms.dykstra import Dykstra
+from projection_methods.algorithms.history import History, HistoryPolicy
+from projection_methods.oracles.nonneg import NonNeg
+import projection_methods.problems.problem_factory as problem_factory
+
+
+class TestDykstra(unittest.TestCase):
+    def test_iterates(self):
+        """Test the in-place Dykstra against the textbook recurrence."""
+        x = cvxpy.Variable(30)
+        problem = problem_factory.convex_affine_problem(NonNeg(x), (10, 30),
+            density=0.3)
+        left, right = problem.sets
+        a, b = [np.ones(30)], [np.ones(30)]
+        p, q = [np.zeros(30)], [np.zeros(30)]
+        for n in xrange(1, 16):
+            a.append(left.project(b[n-1] + p[n-1]))
+            b.append(right.project(a[n] + q[n-1]))
+            p.append(b[n-1] + p[n-1] - a[n])
+            q.append(a[n] + q[n-1] - b[n])
+
+        iterates, residuals, _ = Dykstra(max_iters=15, atol=0,
+            do_all_iters=True).solve(problem)
+        self.assertEqual(len(iterates), 16)
+        self.assertEqual(residuals.shape, (15, 2))
+        for b_n, iterate in zip(b, iterates):
+            self.assertTrue(np.allclose(b_n, iterate))
+
+        solver = Dykstra(max_iters=15, atol=0, do_all_iters=True,
+            history=HistoryPolicy(History.LAST))
+        last, last_residuals, _ = solver.solve(problem)
+        self.assertTrue(np.allclose(last[-1], b[-1]))
+        self.assertTrue(np.allclose(last_residuals, residuals))
+        self.assertEqual(len(last.indices()), 2)
+
+
+    def test_projections(self):
+        """Test that residuals reuse the projections of the iteration."""
+        x = cvxpy.Variable(30)
+        problem = problem_factory.convex_affine_problem(NonNeg(x), (10, 30),
+            density=0.3)
+        calls = []
+        for s in problem.sets:
+            def project(x_0, project=s.project):
+                calls.append(1)
+                return project(x_0)
+            s.project = project
+        Dykstra(max_iters=10, atol=0, do_all_iters=True).solve(problem)
+        # two projections per iteration, plus one for the residual, plus
+        # one for the residual of the initial iterate
+        self.assertEqual(len(calls), 10 * 3 + 1)
+
+        x_0 = np.random.randn(30)
+        projections = tuple(s.project(x_0) for s in problem.sets)
+        self.assertTrue(np.allclose(problem.residual(x_0),
+            problem.residual(x_0, projections=projections)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import cPickle
+import shutil
+import tempfile
+
+import cvxpy as cvxpy
+import numpy as np
+import scipy.sparse
+import unittest
+
+from projection_methods.oracles.affine_set import AffineSet
+from projection_methods.oracles.factorization_cache import FactorizationCache
+from projection_methods.oracles.factorization_cache import SparseLU
+import projection_methods.oracles.factorization_cache as factorization_cache
+
+
+class TestFactorizationCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sparse_lu(self):
+        """Test that restored factorizations solve the original system."""
+        n = 100
+        M = scipy.sparse.random(n, n, density=0.05) + 3 * scipy.sparse.eye(n)
+        b = np.random.randn(n)
+        lu = SparseLU.factor(M)
+        x = lu(b)
+        self.assertTrue(np.allclose(M.dot(x), b))
+
+        restored = cPickle.loads(cPickle.dumps(lu))
+        self.assertTrue(np.allclose(restored(b), x))
+        path = self.directory + '/lu.npz'
+        lu.save(path)
+        self.assertTrue(np.allclose(SparseLU.load(path)(b), x))
+
+    def test_cache(self):
+        """Test LRU eviction and the on-disk store."""
+        A = np.random.randn(10, 10)
+        self.assertEqual(factorization_cache.fingerprint(A),
+            factorization_cache.fingerprint(scipy.sparse.csc_matrix(A)))
+        self.assertNotEqual(factorization_cache.fingerprint(A, 'kkt'),
+            factorization_cache.fingerprint(A, 'normal'))
+
+        cache = FactorizationCache(max_entries=2, directory=self.directory)
+        calls = []
+        def factor(i):
+            def f():
+                calls.append(i)
+                return SparseLU.factor(scipy.sparse.eye(3) * (i + 1))
+            return f
+        for i in xrange(3):
+            cache.get(str(i), factor(i))
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('0' not in cache)
+
+        # evicted entries, and entries of other processes, are restored
+        # from disk
+        cache.get('0', factor(0))
+        FactorizationCache(directory=self.directory).get('1', factor(1))
+        self.assertEqual(calls, [0, 1, 2])
+
+    def test_affine_set(self):
+        """Test that affine sets with the same data share a factorization."""
+        m, n = 30, 50
+        x = cvxpy.Variable(n)
+        A = scipy.sparse.random(m, n, density=0.2, format='csr')
+        b = A.dot(np.random.randn(n))
+        factorization_cache.default_cache().clear()
+        first, second = AffineSet(x, A, b), AffineSet(x, A.tocsc(), b)
+        x_0 = np.random.randn(n)
+        self.assertTrue(np.allclose(first.project(x_0), second.project(x_0)))
+        self.assertTrue(first._solver is second._solver)
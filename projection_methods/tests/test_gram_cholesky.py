@@ -0,0 +1,55 @@
+import numpy as np
+import scipy.sparse
+import unittest
+
+from projection_methods.projectables.gram_cholesky import GramCholesky
+
+
+class TestGramCholesky(unittest.TestCase):
+    def reference(self, blocks, x_0):
+        A = np.vstack([B.toarray() if scipy.sparse.issparse(B) else B
+            for B, _ in blocks])
+        b = np.hstack([b for _, b in blocks])
+        return x_0 - A.T.dot(np.linalg.lstsq(A.dot(A.T), A.dot(x_0) - b,
+            rcond=None)[0])
+
+    def test_add_remove(self):
+        """Test that updates and downdates track the projection."""
+        n = 50
+        x_feas = np.random.randn(n)
+        factor = GramCholesky(n)
+        blocks = {}
+        for key in xrange(10):
+            A = np.random.randn(np.random.randint(1, 4), n)
+            if key % 3 == 0:
+                A = scipy.sparse.csr_matrix(A)
+            blocks[key] = (A, A.dot(x_feas))
+            factor.add(key, *blocks[key])
+        for key in (3, 0, 9):
+            factor.remove(key)
+            del blocks[key]
+            self.assertEqual(len(factor), len(blocks))
+            self.assertTrue(key not in factor)
+            x_0 = np.random.randn(n)
+            self.assertTrue(np.allclose(factor.project(x_0),
+                self.reference(blocks.values(), x_0)))
+
+    def test_dependent_rows(self):
+        """Test that dependent rows are dropped, and restored if needed."""
+        n = 20
+        x_feas = np.random.randn(n)
+        a = np.random.randn(1, n)
+        c = np.random.randn(1, n)
+        factor = GramCholesky(n)
+        factor.add('a', a, a.dot(x_feas))
+        factor.add('c', c, c.dot(x_feas))
+        factor.add('a+c', a + c, (a + c).dot(x_feas))
+        self.assertEqual(factor.rank(), 2)
+
+        # a + c becomes independent once a is removed
+        factor.remove('a')
+        self.assertEqual(factor.rank(), 2)
+        x_0 = np.random.randn(n)
+        self.assertTrue(np.allclose(factor.project(x_0),
+            self.reference([(c, c.dot(x_feas)),
+                (a + c, (a + c).dot(x_feas))], x_0)))
@@ -0,0 +1,34 @@
+import cvxpy as cvxpy
+import numpy as np
+import unittest
+
+from projection_methods.projectables.halfspace import Halfspace
+
+
+class TestHalfspace(unittest.TestCase):
+    def test_projection(self):
+        """Test the closed-form projection onto a Halfspace."""
+        x = cvxpy.Variable(1000)
+        a = np.random.randn(1000)
+        b = np.random.randn()
+        halfspace = Halfspace(x, a, b)
+        constr = halfspace._constr
+
+        # Test idempotency
+        x_0 = np.random.randn(1000)
+        x_0 -= ((a.dot(x_0) - b + 1) / a.dot(a)) * a
+        x_star = halfspace.project(x_0)
+        self.assertTrue(halfspace.contains(x_star))
+        self.assertTrue(np.array_equal(x_0, x_star), "projection not "
+            "idemptotent")
+
+        # Test a point outside of the halfspace
+        x_0 = np.random.randn(1000)
+        x_0 += ((b - a.dot(x_0) + 1) / a.dot(a)) * a
+        x_star = halfspace.project(x_0)
+        self.assertTrue(halfspace.contains(x_star))
+        self.assertTrue(np.isclose(a.dot(x_star), b))
+        p = cvxpy.Problem(cvxpy.Minimize(cvxpy.pnorm(x - x_0, 2)), constr)
+        p.solve()
+        self.assertTrue(np.isclose(np.array(x.value).flatten(), x_star,
+            atol=1e-3).all())
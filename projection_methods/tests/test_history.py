@@ -0,0 +1,81 @@
+import cPickle
+import os
+import shutil
+import tempfile
+import unittest
+
+import cvxpy
+import numpy as np
+
+from projection_methods.algorithms.altp import AltP
+from projection_methods.algorithms.history import History, HistoryPolicy
+from projection_methods.oracles.nonneg import NonNeg
+import projection_methods.problems.problem_factory as problem_factory
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_policies(self):
+        """Test which iterates each policy retains."""
+        X = np.random.randn(25, 4)
+        path = os.path.join(self.directory, 'iterates.npy')
+        histories = [History(4), History(4, History.LAST, keep_last=3),
+            History(4, History.STRIDED, stride=10),
+            History(4, History.MEMMAP, path=path, capacity=4)]
+        for h in histories:
+            h.extend(X)
+            self.assertEqual(len(h), 25)
+            self.assertTrue(np.array_equal(h[-1], X[-1]))
+            self.assertTrue(np.array_equal(h[-2], X[-2]))
+            self.assertTrue(np.array_equal(h.snapshots(), X[h.indices()]))
+            with self.assertRaises(IndexError):
+                h[25]
+
+        self.assertEqual(histories[1].indices(), [22, 23, 24])
+        with self.assertRaises(IndexError):
+            histories[1][0]
+        self.assertEqual(histories[2].indices(), [0, 10, 20, 23, 24])
+        self.assertTrue(np.array_equal(histories[2][10], X[10]))
+        with self.assertRaises(IndexError):
+            histories[2][11]
+
+        # the memory-mapped iterates survive pickling, and are on disk
+        h = cPickle.loads(cPickle.dumps(histories[3], 2))
+        self.assertTrue(np.array_equal(h.snapshots(), X))
+        self.assertTrue(np.array_equal(np.load(path)[:25], X))
+
+    def test_residuals(self):
+        """Test that residuals are stored in a growing array."""
+        h = History(4, capacity=2)
+        for i in xrange(5):
+            h.push_residual((i, 2 * i))
+        self.assertEqual(h.residuals.shape, (5, 2))
+        self.assertTrue(np.array_equal(h.residuals[:, 1],
+            2 * np.arange(5)))
+
+    def test_optimizer(self):
+        """Test that optimizers record iterates per their history policy."""
+        x = cvxpy.Variable(30)
+        problem = problem_factory.convex_affine_problem(NonNeg(x), (10, 30),
+            density=0.3)
+        iterates, residuals, _ = AltP(max_iters=20, do_all_iters=True,
+            atol=0).solve(problem)
+        policy = HistoryPolicy(History.LAST)
+        solver = AltP(max_iters=20, do_all_iters=True, atol=0,
+            history=policy)
+        last, last_residuals, _ = solver.solve(problem)
+        self.assertEqual(len(last), len(iterates))
+        self.assertTrue(np.allclose(last[-1], iterates[-1]))
+        self.assertTrue(np.allclose(last_residuals, residuals))
+        self.assertEqual(residuals.shape, (20, 2))
+        self.assertEqual(len(last.indices()), 2)
+        self.assertEqual(len(solver.all_iterates.indices()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
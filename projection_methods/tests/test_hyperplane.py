@@ -0,0 +1,61 @@
+import cvxpy as cvxpy
+import numpy as np
+import scipy.sparse
+import unittest
+
+from projection_methods.projectables.hyperplane import Hyperplane
+
+
+class TestHyperplane(unittest.TestCase):
+    def test_projection(self):
+        """Test the closed-form projection onto a Hyperplane."""
+        x = cvxpy.Variable(1000)
+        a = np.random.randn(1000)
+        b = np.random.randn()
+        hyperplane = Hyperplane(x, a, b)
+        constr = hyperplane._constr
+
+        # Test idempotency
+        x_0 = np.random.randn(1000)
+        x_0 -= ((a.dot(x_0) - b) / a.dot(a)) * a
+        x_star = hyperplane.project(x_0)
+        self.assertTrue(np.array_equal(x_0, x_star), "projection not "
+            "idemptotent")
+
+        # Test random projection
+        x_0 = np.random.randn(1000)
+        x_star = hyperplane.project(x_0)
+        self.assertTrue(hyperplane.contains(x_star))
+        p = cvxpy.Problem(cvxpy.Minimize(cvxpy.pnorm(x - x_0, 2)), constr)
+        p.solve()
+        self.assertTrue(np.isclose(np.array(x.value).flatten(), x_star,
+            atol=1e-3).all())
+
+
+    def test_matrix_projection(self):
+        """Test the projection onto a set of hyperplanes Ax == b."""
+        x = cvxpy.Variable(100)
+
+        # a sparse column, as returned by AffineSet.query
+        A = scipy.sparse.rand(100, 1, density=0.5, format='csc')
+        hyperplane = Hyperplane(x, A, np.array(1.0))
+        x_star = hyperplane.project(np.random.randn(100))
+        self.assertTrue(np.isclose(A.T.dot(x_star), 1.0).all())
+
+        # the identity, as returned by Zeros.query
+        hyperplane = Hyperplane(x, scipy.sparse.eye(100), np.zeros(100))
+        x_star = hyperplane.project(np.random.randn(100))
+        self.assertTrue(np.array_equal(x_star, np.zeros(100)))
+
+        # a dense matrix of normals
+        A = np.random.randn(100, 10)
+        b = np.random.randn(10)
+        hyperplane = Hyperplane(x, A, b)
+        constr = hyperplane._constr
+        x_0 = np.random.randn(100)
+        x_star = hyperplane.project(x_0)
+        self.assertTrue(hyperplane.contains(x_star))
+        p = cvxpy.Problem(cvxpy.Minimize(cvxpy.pnorm(x - x_0, 2)), constr)
+        p.solve()
+        self.assertTrue(np.isclose(np.array(x.value).flatten(), x_star,
+            atol=1e-3).all())
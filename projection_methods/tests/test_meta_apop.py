@@ -0,0 +1,89 @@
+import cvxpy as cvxpy
+import numpy as np
+import unittest
+
+from projection_methods.algorithms.meta_apop import MetaAPOP
+from projection_methods.algorithms.utils import SharedCutPool
+from projection_methods.oracles.dynamic_polyhedron import PolyOuter
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Zeros
+import projection_methods.problems.problem_factory as problem_factory
+
+
+class TestMetaAPOP(unittest.TestCase):
+    def _cone_program(self):
+        n = 10
+        dims = [5, 10, 5]
+        m = sum(dims)
+        return problem_factory.random_cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), dims, [Zeros, NonNeg, SOC], n,
+            density=0.3)
+
+    def test_cut_pool(self):
+        """Test that the cut pool returns cuts in order, one round per half."""
+        pool = SharedCutPool(dim=3, capacity=4)
+        cuts = [(np.random.randn(3), float(i), i % 2, i == 0)
+            for i in xrange(6)]
+        for a, b, kind, pin in cuts[:3]:
+            pool.put(0, a, b, kind, pin)
+        self.assertEqual(pool.count(0), 3)
+        for (a, b, kind, pin), expected in zip(pool.get(0, 3), cuts[:3]):
+            self.assertTrue(np.array_equal(a, expected[0]))
+            self.assertEqual((b, kind, pin), expected[1:])
+
+        # the cuts of the next round leave those of this round intact
+        for a, b, kind, pin in cuts[3:]:
+            pool.put(1, a, b, kind, pin)
+        self.assertEqual(pool.count(1), 3)
+        self.assertEqual([c[1] for c in pool.get(0, 3)], [0., 1., 2.])
+        self.assertEqual([c[1] for c in pool.get(1, 3)], [3., 4., 5.])
+
+        # a round that holds more than capacity cuts overflows
+        pool.clear(2)
+        self.assertEqual(pool.count(2), 0)
+        for a, b, kind, pin in cuts[:4]:
+            pool.put(2, a, b, kind, pin)
+        with self.assertRaises(RuntimeError):
+            pool.put(2, *cuts[4])
+        self.assertEqual([c[1] for c in pool.get(1, 3)], [3., 4., 5.])
+
+    def test_cone_program(self):
+        """Test that MetaAPOP runs on an SCSProblem (of int dimension)."""
+        problem = self._cone_program()
+        solver = MetaAPOP(max_iters=3, num_approaches=3, do_all_iters=True)
+        iterates, residuals, _ = solver.solve(problem)
+        self.assertEqual(len(iterates), 4)
+        self.assertEqual(iterates[-1].shape, (problem.dimension,))
+        self.assertEqual(len(residuals), 3)
+
+    def test_parallel(self):
+        """Test that the parallel mode runs every approach."""
+        for policy, capacity in ((PolyOuter.EXACT, None),
+                (PolyOuter.ELRA, 10)):
+            x = cvxpy.Variable(50)
+            problem = problem_factory.convex_affine_problem(NonNeg(x),
+                (20, 50), density=0.2)
+            solver = MetaAPOP(max_iters=4, outer_policy=policy,
+                max_hyperplanes=capacity, max_halfspaces=capacity,
+                num_approaches=5, num_workers=2, do_all_iters=True)
+            iterates, residuals, _ = solver.solve(problem)
+            self.assertEqual(len(iterates), 5)
+            self.assertEqual(len(residuals), 4)
+            self.assertTrue(sum(residuals[-1]) <= sum(residuals[0]))
+
+    def test_parallel_cone_program(self):
+        """Test that the parallel mode runs on an SCSProblem."""
+        problem = self._cone_program()
+        solver = MetaAPOP(max_iters=3, num_approaches=3, num_workers=2,
+            do_all_iters=True)
+        iterates, residuals, _ = solver.solve(problem)
+        self.assertEqual(len(iterates), 4)
+        self.assertEqual(iterates[-1].shape, (problem.dimension,))
+        self.assertEqual(len(residuals), 3)
+
+        # an iteration whose cuts overflow the pool fails loudly
+        solver = MetaAPOP(max_iters=3, num_approaches=3, num_workers=2,
+            cut_pool_capacity=1)
+        with self.assertRaises(RuntimeError):
+            solver.solve(problem)
@@ -0,0 +1,187 @@
+import cvxpy as cvxpy
+import numpy as np
+import scipy.sparse
+import unittest
+
+from projection_methods.oracles.dynamic_polyhedron import DynamicPolyhedron
+from projection_methods.oracles.dynamic_polyhedron import PolyOuter
+from projection_methods.projectables.halfspace import Halfspace
+from projection_methods.projectables.hyperplane import Hyperplane
+from projection_methods.projectables.polyhedron import Polyhedron
+
+
+class TestPolyhedron(unittest.TestCase):
+    def test_projection(self):
+        """Test the native projection onto a Polyhedron."""
+        n = 100
+        x = cvxpy.Variable(n)
+        x_feas = np.random.randn(n)
+        polyhedron = Polyhedron(x)
+
+        # the empty polyhedron is R^n
+        x_0 = np.random.randn(n)
+        self.assertTrue(np.array_equal(polyhedron.project(x_0), x_0))
+
+        information = []
+        for _ in xrange(30):
+            a = np.random.randn(n)
+            information.append(Halfspace(x, a, a.dot(x_feas)))
+        for _ in xrange(5):
+            a = np.random.randn(n)
+            information.append(Hyperplane(x, a, a.dot(x_feas)))
+        # information defined over a slice of x
+        a = np.random.randn(10)
+        information.append(Halfspace(x[20:30], a, a.dot(x_feas[20:30])))
+
+        # add the information in two batches, projecting in between, to
+        # exercise the warm start
+        for batch in (information[:20], information[20:]):
+            polyhedron.add(batch)
+            x_0 = np.random.randn(n) * 10
+            x_star = polyhedron.project(x_0)
+            self.assertTrue(polyhedron.contains(x_star))
+            constr = polyhedron._constr
+            p = cvxpy.Problem(cvxpy.Minimize(cvxpy.pnorm(x - x_0, 2)), constr)
+            p.solve(solver=cvxpy.ECOS, abstol=1e-9, reltol=1e-9,
+                feastol=1e-9)
+            self.assertTrue(np.isclose(np.array(x.value).flatten(), x_star,
+                atol=1e-3).all())
+
+        # idempotency
+        x_star_star = polyhedron.project(x_star)
+        self.assertTrue(np.isclose(x_star, x_star_star, atol=1e-6).all())
+
+    def test_presolve(self):
+        """Test that pinned hyperplanes that fix coordinates are presolved."""
+        n = 30
+        x = cvxpy.Variable(n)
+        information = [Halfspace(x, a, 1.) for a in np.random.randn(10, n)]
+        information += [Hyperplane(x, a, 0.5) for a in np.random.randn(3, n)]
+        fixing = scipy.sparse.eye(10) * 2.
+        x_0 = 10 * np.random.randn(n)
+        for info in (information, information[10:]):
+            # an unpinned copy of the fixing hyperplanes is projected onto
+            # as is
+            pinned = Polyhedron(x, info + [Hyperplane(x[5:15], fixing,
+                np.ones(10), pin=True)])
+            reference = Polyhedron(x, info + [Hyperplane(x[5:15], fixing,
+                np.ones(10))])
+            x_star = pinned.project(x_0)
+            self.assertTrue(np.allclose(x_star[5:15], 0.5))
+            self.assertTrue(np.allclose(x_star, reference.project(x_0),
+                atol=1e-6))
+            self.assertTrue(pinned.contains(x_star))
+            # the fixing rows never reach the projection engine
+            self.assertEqual(pinned._engine()[0].shape[0], len(info))
+
+    def test_lazy_constraints(self):
+        """Test that cvxpy constraints are only built when needed."""
+        x = cvxpy.Variable(10)
+        halfspace = Halfspace(x[0:5], np.ones(5), 1)
+        hyperplane = Hyperplane(x, np.ones(10), 0)
+        polyhedron = Polyhedron(x, [halfspace, hyperplane])
+        polyhedron.project(np.random.randn(10))
+        for p in (halfspace, hyperplane, polyhedron):
+            self.assertTrue(p._constr_list is None)
+
+        self.assertTrue('<=' in repr(polyhedron))
+        self.assertEqual(len(polyhedron._constr), 2)
+        self.assertTrue(halfspace._constr_list is not None)
+        # adding information discards the constraints built so far
+        polyhedron.add(Halfspace(x, -np.ones(10), 1))
+        self.assertTrue(polyhedron._constr_list is None)
+        self.assertEqual(len(polyhedron._constr), 3)
+
+
+    def test_hyperplanes(self):
+        """Test projections onto outer approximations of hyperplanes."""
+        n = 100
+        x = cvxpy.Variable(n)
+        x_feas = np.random.randn(n)
+        information = []
+        for _ in xrange(30):
+            a = np.random.randn(n)
+            information.append(Hyperplane(x, a, a.dot(x_feas)))
+
+        def reference(hyperplanes, x_0):
+            A = np.vstack([h._A for h in hyperplanes])
+            b = np.hstack([h._offsets for h in hyperplanes])
+            return x_0 - A.T.dot(np.linalg.solve(A.dot(A.T), A.dot(x_0) - b))
+
+        for policy in (PolyOuter.ELRA, PolyOuter.ERANDOM, PolyOuter.ERESET):
+            manager = DynamicPolyhedron(Polyhedron(x), max_hyperplanes=10,
+                policy=policy)
+            for i, h in enumerate(information):
+                manager.add(h)
+                outer = manager.outer()
+                x_0 = np.random.randn(n)
+                x_star = outer.project(x_0)
+                self.assertTrue(np.allclose(x_star,
+                    reference(outer.hyperplanes(), x_0)))
+                self.assertTrue(outer.contains(x_star))
+
+                # adding information invalidates the shared factorization
+                if i == len(information) - 1:
+                    a = np.random.randn(n)
+                    outer.add(Hyperplane(x, a, a.dot(x_feas)))
+                    x_star = outer.project(x_0)
+                    self.assertTrue(np.allclose(x_star,
+                        reference(outer.hyperplanes(), x_0)))
+
+    def test_activity_evictions(self):
+        """Test that activity-based policies evict cuts that do no work."""
+        x = cvxpy.Variable(2)
+        for policy in (PolyOuter.EINACTIVE, PolyOuter.ELEASTVIOLATED):
+            manager = DynamicPolyhedron(Polyhedron(x), max_halfspaces=2,
+                policy=policy)
+            tight = Halfspace(x, np.array([1., 0.]), 0.)
+            slack = Halfspace(x, np.array([0., 1.]), 10.)
+            manager.add([tight, slack])
+            # tight is active (and violated), slack is neither
+            x_star = manager.project(np.array([1., 0.]))
+            self.assertTrue(np.allclose(x_star, [0., 0.]))
+            new = Halfspace(x, np.array([1., 1.]), 5.)
+            manager.add(new)
+            self.assertEqual(manager.outer().halfspaces(), [tight, new])
+            # a least-recently-added policy would have evicted tight
+            manager = DynamicPolyhedron(Polyhedron(x), max_halfspaces=2,
+                policy=PolyOuter.ELRA)
+            manager.add([tight, slack])
+            manager.project(np.array([1., 0.]))
+            manager.add(new)
+            self.assertEqual(manager.outer().halfspaces(), [slack, new])
+
+    def test_cached_outer(self):
+        """Test that outer approximations are cached between changes."""
+        n = 20
+        x = cvxpy.Variable(n)
+        information = [Halfspace(x, a, 1.) for a in np.random.randn(6, n)]
+        manager = DynamicPolyhedron(Polyhedron(x), max_halfspaces=4,
+            policy=PolyOuter.ELRA)
+        manager.add(information[:3])
+        x_0 = 10 * np.random.randn(n)
+        outer = manager.outer()
+        outer.project(x_0)
+        gram = outer._gram
+        version = manager.version
+        self.assertTrue(manager.outer() is outer)
+
+        # adding information extends the cached outer approximation
+        manager.add(information[3])
+        self.assertTrue(manager.version > version)
+        self.assertTrue(manager.outer() is outer)
+        x_star = outer.project(x_0)
+        self.assertTrue(np.array_equal(outer._gram[:3, :3], gram))
+        self.assertTrue(np.allclose(x_star,
+            Polyhedron(x, information[:4]).project(x_0)))
+
+        # evicting information rebuilds it
+        manager.add(information[4])
+        outer = manager.outer()
+        self.assertEqual(outer.halfspaces(), information[1:5])
+        self.assertTrue(manager.outer() is outer)
+
+        manager = DynamicPolyhedron(Polyhedron(x), max_halfspaces=4,
+            policy=PolyOuter.SUBSAMPLE)
+        manager.add(information)
+        self.assertEqual(len(manager.outer().halfspaces()), 4)
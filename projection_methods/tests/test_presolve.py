@@ -0,0 +1,97 @@
+import unittest
+
+import cvxpy
+import numpy as np
+import scipy.sparse
+
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Zeros, Reals
+import projection_methods.problems.problem_factory as problem_factory
+from projection_methods.problems.presolve import presolve
+
+
+class TestPresolve(unittest.TestCase):
+    def setUp(self):
+        n = 20
+        # every row has a nonzero outside of column 3
+        columns = np.delete(np.arange(n), 3)[np.arange(60) % (n - 1)]
+        A = (problem_factory.random_matrix(60, n, 0.3) +
+            scipy.sparse.csr_matrix((np.ones(60), (np.arange(60), columns)),
+            shape=(60, n))).tocsr()
+        # row 7 (in Zeros) and column 3 are empty
+        A = scipy.sparse.diags((np.arange(60) != 7) * 1.0).dot(A).dot(
+            scipy.sparse.diags((np.arange(n) != 3) * 1.0)).tocsr()
+        # rows 20 to 24 duplicate rows 0 to 4 (s is zero on both)
+        A = scipy.sparse.vstack([A[:20], A[:5], A[20:]]).tocsr()
+        dims = [25, 20, 10, 10]
+        cones = [Zeros, NonNeg, SOC, Reals]
+        m = sum(dims)
+        self.problem = problem_factory.cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), dims, cones, n, A)
+
+    def test_dimension(self):
+        """Test that presolve drops r, s in Zeros, free and duplicate rows."""
+        presolved = presolve(self.problem)
+        n = self.problem.n
+        self.assertEqual(presolved.free_rows.tolist(), range(55, 65))
+        self.assertEqual(sorted(zip(presolved.dropped_rows,
+            presolved.duplicated_rows)), [(20, 0), (21, 1), (22, 2),
+            (23, 3), (24, 4)])
+        self.assertEqual(presolved.empty_rows.tolist(), [7])
+        self.assertEqual(presolved.p_columns.tolist(),
+            range(3) + range(4, n))
+        # y keeps 65 - 10 - 5 - 1 rows; s keeps those, less 19 in Zeros
+        self.assertEqual(presolved.dimension, n - 1 + 49 + 1 + 30 + 1)
+        self.assertEqual(presolved.x_opt.shape, (presolved.dimension,))
+
+    def test_restore(self):
+        """Test that presolved solutions restore to solutions."""
+        presolved = presolve(self.problem)
+        x_opt = presolved.x_opt
+        self.assertTrue(np.isclose(presolved.sets[1].residual(x_opt), 0))
+        self.assertTrue(np.isclose(np.linalg.norm(x_opt -
+            presolved.sets[0].project(x_opt)), 0))
+        uv = presolved.restore(x_opt)
+        self.assertTrue(np.allclose(self.problem.residual(uv), 0))
+        self.assertTrue(np.allclose(presolved.residual(x_opt), 0))
+        self.assertTrue(np.isclose(self.problem.tau(uv),
+            self.problem.tau(self.problem.x_opt)))
+
+        # away from solutions, the residuals are those of the restored point,
+        # save for the cone residual
+        x = np.random.randn(presolved.dimension)
+        projections = (presolved.sets[0].project(x), None)
+        r = presolved.residual(x, projections=projections)
+        full_r = self.problem.residual(presolved.restore(x))
+        self.assertTrue(np.allclose(np.take(r, [0, 1, 3]),
+            np.take(full_r, [0, 1, 3])))
+        self.assertTrue(np.isclose(r[2], np.linalg.norm(x - projections[0])))
+
+    def test_dependent_rows(self):
+        """Test that dependent rows that are not duplicates still project."""
+        n = 10
+        dims = [10, 20]
+        m = sum(dims)
+        A = (problem_factory.random_matrix(m, n, 0.3) +
+            scipy.sparse.eye(m, n)).tolil()
+        # row 2 (in Zeros) is the sum of rows 0 and 1
+        A[2] = A[0] + A[1]
+        problem = problem_factory.cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), dims, [Zeros, NonNeg], n,
+            A.tocsr())
+        presolved = presolve(problem)
+        self.assertEqual(presolved.dropped_rows.tolist(), [])
+
+        affine = presolved.sets[1]
+        affine.rtol = 1e-10
+        x_0 = np.random.randn(presolved.dimension)
+        x_star = affine.project(x_0)
+        self.assertEqual(affine.method, 'lsqr')
+        M = affine.A.toarray()
+        self.assertTrue(np.allclose(x_star,
+            x_0 - np.linalg.pinv(M).dot(M.dot(x_0)), atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import cvxpy as cvxpy
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+import unittest
+
+from projection_methods.oracles.affine_set import AffineSet
+from projection_methods.oracles.cartesian_product import CartesianProduct
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Reals, Zeros
+from projection_methods.projectables.halfspace import Halfspace
+from projection_methods.projectables.hyperplane import Hyperplane
+from projection_methods.projectables.polyhedron import Polyhedron
+
+
+class TestProjectMany(unittest.TestCase):
+    def assert_matches_project(self, convex_set, X):
+        X_star = convex_set.project_many(X)
+        self.assertEqual(X_star.shape, X.shape)
+        for x_0, x_star in zip(X, X_star):
+            self.assertTrue(np.allclose(convex_set.project(x_0), x_star))
+
+    def test_cones(self):
+        """Test batched projections onto cones and their products."""
+        n = 30
+        x = cvxpy.Variable(n)
+        X = np.random.randn(20, n)
+        # include points that lie in the cones
+        X[0] = np.abs(X[0])
+        X[1] = 0
+        for cone in (NonNeg(x), SOC(x), Zeros(x), Reals(x)):
+            self.assert_matches_project(cone, X)
+
+        slices = [slice(0, 10), slice(10, 20), slice(20, 25), slice(25, 30)]
+        product = CartesianProduct(x, [NonNeg(x[slices[0]]),
+            SOC(x[slices[1]]), Zeros(x[slices[2]]), Reals(x[slices[3]])],
+            slices)
+        self.assert_matches_project(product, X)
+        X_star, info = product.query_many(X)
+        self.assertTrue(np.allclose(X_star, product.project_many(X)))
+        self.assertTrue(len(info) > 0)
+
+    def test_affine_set(self):
+        """Test multiple right-hand side projections onto affine sets."""
+        m, n = 20, 100
+        x = cvxpy.Variable(n)
+        A = scipy.sparse.random(m, n, density=0.2, format='csr')
+        b = A.dot(np.random.randn(n))
+        X = np.random.randn(10, n)
+        X[0] = X[0] - A.T.dot(scipy.sparse.linalg.spsolve(A.dot(A.T).tocsc(),
+            A.dot(X[0]) - b))
+        for method in ('kkt', 'normal', 'cg'):
+            affine = AffineSet(x, A, b, method=method, rtol=1e-10)
+            self.assert_matches_project(affine, X)
+            X_star, info = affine.query_many(X)
+            self.assertEqual(len(info), X.shape[0] - 1)
+
+    def test_polyhedron(self):
+        """Test batched projections onto polyhedra."""
+        n = 40
+        x = cvxpy.Variable(n)
+        x_feas = np.random.randn(n)
+        hyperplanes = []
+        for _ in xrange(5):
+            a = np.random.randn(n)
+            hyperplanes.append(Hyperplane(x, a, a.dot(x_feas)))
+        X = np.random.randn(10, n)
+        polyhedron = Polyhedron(x, hyperplanes)
+        self.assert_matches_project(polyhedron, X)
+
+        a = np.random.randn(n)
+        polyhedron.add(Halfspace(x, a, a.dot(x_feas)))
+        self.assert_matches_project(polyhedron, X)
@@ -0,0 +1,76 @@
+import os
+import signal
+
+import cvxpy as cvxpy
+import numpy as np
+import unittest
+
+import projection_methods.algorithms.utils as utils
+from projection_methods.algorithms.utils import ProjectionPool
+
+
+class _FlakyProjectionProblem(utils.ProjectionProblem):
+    """A ProjectionProblem whose first construction fails"""
+    failed = False
+
+    def __init__(self, cvxpy_set, cvxpy_var):
+        if not _FlakyProjectionProblem.failed:
+            _FlakyProjectionProblem.failed = True
+            raise ValueError('registration failed')
+        super(_FlakyProjectionProblem, self).__init__(cvxpy_set, cvxpy_var)
+
+
+class TestProjectionPool(unittest.TestCase):
+    def test_projection(self):
+        """Test projections through, and crash recovery of, the pool."""
+        x = cvxpy.Variable(10)
+        constr = [x >= 1]
+        pool = ProjectionPool(solvers=[cvxpy.ECOS, cvxpy.SCS])
+        key = pool.new_key()
+
+        x_0 = np.random.randn(10)
+        x_star, dist = pool.project(x_0, constr, x, key=key)
+        self.assertTrue(np.isclose(x_star, np.maximum(x_0, 1),
+            atol=5e-2).all())
+        self.assertTrue(np.isclose(dist, np.linalg.norm(x_0 - x_star)))
+
+        # kill the worker; the next projection should restart it
+        worker = pool._workers[0]
+        os.kill(worker._process.pid, signal.SIGKILL)
+        worker._process.join()
+        x_star, _ = pool.project(x_0, constr, x, key=key)
+        self.assertTrue(np.isclose(x_star, np.maximum(x_0, 1),
+            atol=5e-2).all())
+        pool.close()
+
+    def test_failed_registration(self):
+        """Test that a failed registration is retried with the next solver."""
+        x = cvxpy.Variable(10)
+        constr = [x >= 1]
+        pool = ProjectionPool(solvers=[cvxpy.ECOS, cvxpy.ECOS])
+        key = pool.new_key()
+        original = utils.ProjectionProblem
+        # the worker, which is forked on start, inherits the flaky class
+        utils.ProjectionProblem = _FlakyProjectionProblem
+        try:
+            worker = pool._workers[0]
+            worker._start()
+        finally:
+            utils.ProjectionProblem = original
+        pid = worker._process.pid
+
+        x_0 = np.random.randn(10)
+        x_star, _ = pool.project(x_0, constr, x, key=key)
+        self.assertTrue(np.isclose(x_star, np.maximum(x_0, 1),
+            atol=5e-2).all())
+        # the worker survived the failed registration
+        self.assertEqual(worker._process.pid, pid)
+        self.assertTrue(key in worker._keys)
+        pool.close()
+
+    def test_reset_default_pool(self):
+        """Test that resetting the default pool starts a new one."""
+        pool = utils.default_pool()
+        self.assertTrue(utils.default_pool() is pool)
+        utils.reset_default_pool()
+        self.assertFalse(utils.default_pool() is pool)
@@ -0,0 +1,92 @@
+import unittest
+
+import cvxpy
+import numpy as np
+import scipy.sparse
+
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Zeros
+import projection_methods.problems.problem_factory as problem_factory
+from projection_methods.problems.presolve import presolve
+from projection_methods.problems.scaling import equilibrate
+
+
+class TestScaling(unittest.TestCase):
+    def setUp(self):
+        n = 20
+        self.dims = [10, 20, 10, 5]
+        m = sum(self.dims)
+        # rows and columns of A span several orders of magnitude
+        A = problem_factory.random_matrix(m, n, 0.3) + scipy.sparse.eye(m, n)
+        A = scipy.sparse.diags(10.0 ** np.random.uniform(-3, 3, m)).dot(
+            A).dot(scipy.sparse.diags(10.0 ** np.random.uniform(-3, 3, n)))
+        self.problem = problem_factory.cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), self.dims,
+            [Zeros, NonNeg, SOC, SOC], n, A.tocsr())
+
+    def test_data(self):
+        """Test that the scaled data is that of D A E, and equilibrated."""
+        scaled = equilibrate(self.problem)
+        A = self.problem.A.toarray()
+        D, E = np.diag(scaled.d), np.diag(scaled.e)
+        self.assertTrue(np.allclose(scaled.A.toarray(), D.dot(A).dot(E)))
+        self.assertTrue(np.allclose(scaled.b,
+            scaled.sigma * D.dot(self.problem.b)))
+        self.assertTrue(np.allclose(scaled.c,
+            scaled.rho * E.dot(self.problem.c)))
+        self.assertTrue(np.allclose(scaled.Q.toarray().T, -scaled.Q.toarray()))
+        row_norms = np.abs(scaled.A.toarray()).max(axis=1)
+        self.assertLess(row_norms.max() / row_norms.min(),
+            np.abs(A).max(axis=1).max() / np.abs(A).max(axis=1).min())
+
+        # rows of a second order cone are scaled uniformly
+        for start, stop in [(30, 40), (40, 45)]:
+            self.assertTrue(np.allclose(scaled.d[start:stop],
+                scaled.d[start]))
+
+    def test_restore(self):
+        """Test that scaled solutions restore to solutions."""
+        scaled = equilibrate(self.problem)
+        x_opt = scaled.x_opt
+        self.assertTrue(np.isclose(scaled.sets[1].residual(x_opt), 0))
+        self.assertTrue(np.isclose(np.linalg.norm(x_opt -
+            scaled.sets[0].project(x_opt)), 0))
+        self.assertTrue(np.allclose(scaled.restore(x_opt),
+            self.problem.x_opt))
+        self.assertTrue(np.allclose(scaled.residual(x_opt), 0))
+        self.assertTrue(np.isclose(scaled.optimal_value(),
+            scaled.rho * scaled.sigma * self.problem.optimal_value()))
+
+        # away from solutions, the residuals are those of the restored point,
+        # save for the cone residual
+        uv = np.random.randn(scaled.dimension)
+        r = scaled.residual(uv)
+        full_r = self.problem.residual(scaled.restore(uv))
+        self.assertTrue(np.allclose(np.take(r, [0, 1, 3]),
+            np.take(full_r, [0, 1, 3])))
+
+    def test_matrix_free(self):
+        """Test that matrix-free problems scale to matrix-free problems."""
+        n = 10
+        dims = [5, 10, 5]
+        m = sum(dims)
+        problem = problem_factory.random_cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), dims, [Zeros, NonNeg, SOC], n,
+            density=0.3, matrix_free=True)
+        scaled = equilibrate(problem)
+        self.assertIsNone(scaled.Q)
+        self.assertTrue(np.isclose(scaled.sets[1].residual(scaled.x_opt), 0))
+
+    def test_presolve(self):
+        """Test that scaled problems can be presolved."""
+        presolved = presolve(equilibrate(self.problem))
+        x_opt = presolved.x_opt
+        self.assertTrue(np.isclose(presolved.sets[1].residual(x_opt), 0))
+        self.assertTrue(np.allclose(presolved.residual(x_opt), 0))
+        uv = presolved.problem.restore(presolved.restore(x_opt))
+        self.assertTrue(np.allclose(self.problem.residual(uv), 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
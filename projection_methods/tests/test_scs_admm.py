@@ -0,0 +1,58 @@
+import unittest
+
+import cvxpy
+import numpy as np
+
+from projection_methods.algorithms.scs_admm import SCSADMM, SCSLinearSystem
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Zeros
+import projection_methods.problems.problem_factory as problem_factory
+
+
+class TestSCSADMM(unittest.TestCase):
+    def setUp(self):
+        n = 20
+        dims = [10, 20, 10]
+        m = sum(dims)
+        self.problem = problem_factory.random_cone_program(
+            cvxpy.Variable(2 * (m + n + 1)), dims, [Zeros, NonNeg, SOC], n,
+            density=0.2)
+
+    def test_linear_system(self):
+        """Test the solves of SCSLinearSystem against Q."""
+        problem = self.problem
+        system = SCSLinearSystem(problem.A, problem.b, problem.c)
+        I_plus_Q = problem.Q.toarray() + np.eye(problem.Q.shape[0])
+        w = np.random.randn(I_plus_Q.shape[0])
+        self.assertTrue(np.allclose(I_plus_Q.dot(system.solve(w)), w))
+        self.assertTrue(np.allclose(
+            I_plus_Q.T.dot(system.solve_transpose(w)), w))
+        self.assertTrue(np.allclose(system.apply_q(w), problem.Q.dot(w)))
+
+        uv = np.random.randn(problem.dimension)
+        self.assertTrue(np.allclose(
+            system.project(problem.u(uv), problem.v(uv)),
+            problem.sets[1].project(uv)))
+
+    def test_views(self):
+        """Test that u and v are views of the iterate."""
+        uv = np.random.randn(self.problem.dimension)
+        u, v = self.problem.u(uv), self.problem.v(uv)
+        self.assertTrue(np.shares_memory(u, uv))
+        self.assertTrue(np.shares_memory(v, uv))
+        self.assertTrue(np.array_equal(np.hstack((u, v)), uv))
+        self.assertEqual(self.problem.tau(uv), u[-1])
+        self.assertEqual(self.problem.kappa(uv), v[-1])
+
+    def test_solve(self):
+        """Test that SCSADMM iterates stay in the product set."""
+        it, res, _ = SCSADMM(max_iters=50).solve(self.problem)
+        self.assertEqual(res.shape[1], 2)
+        self.assertTrue(np.allclose(self.problem.sets[0].project(it[-1]),
+            it[-1]))
+        self.assertLess(res[-1][1], res[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import cPickle
+import unittest
+
+import cvxpy
+import numpy as np
+
+from projection_methods.oracles.nonneg import NonNeg
+from projection_methods.oracles.soc import SOC
+from projection_methods.oracles.zeros import Zeros
+import projection_methods.problems.problem_factory as problem_factory
+
+
+class TestSCSResidual(unittest.TestCase):
+    def test_residual(self):
+        """Test the SCS residual evaluator against its definition."""
+        dims = [3, 2, 4, 1]
+        m, n = sum(dims), 4
+        x = cvxpy.Variable(2 * (m + n + 1))
+        problem = problem_factory.random_cone_program(x, dims,
+            [SOC, NonNeg, SOC, Zeros], n, density=0.5)
+        A, b, c = problem.A, problem.b, problem.c
+
+        for _ in xrange(3):
+            uv = np.random.randn(2 * (m + n + 1))
+            p, y, s = problem.p(uv), problem.y(uv), problem.s(uv)
+            gap = abs(c.dot(p) + b.dot(y))
+            expected = (
+                np.linalg.norm(A.dot(p) + s - b) / (1 + np.linalg.norm(b)),
+                np.linalg.norm(A.T.dot(y) + c) / (1 + np.linalg.norm(c)),
+                np.linalg.norm(uv - problem.product_set.project(uv)),
+                gap / (1 + gap))
+            self.assertTrue(np.allclose(problem.residual(uv), expected))
+        self.assertTrue(np.allclose(problem.residual(problem.x_opt), 0,
+            atol=1e-6))
+
+        # the evaluator is not pickled with the problem
+        loaded = cPickle.loads(cPickle.dumps(problem, 2))
+        self.assertFalse(hasattr(loaded, '_evaluator'))
+        self.assertTrue(np.allclose(loaded.residual(uv), expected))
+
+        # residuals are only evaluated every third call
+        evaluator = problem.residual_evaluator(every=3)
+        residuals = [problem.residual(uv * (i + 1)) for i in xrange(4)]
+        self.assertTrue(residuals[0] is residuals[1] is residuals[2])
+        self.assertTrue(residuals[3] is not residuals[0])
+        self.assertTrue(problem.residual_evaluator() is evaluator)
+
+    def test_layouts(self):
+        """Test the evaluator on non-float64 and non-contiguous iterates."""
+        dims = [3, 2, 4, 1]
+        m, n = sum(dims), 4
+        x = cvxpy.Variable(2 * (m + n + 1))
+        problem = problem_factory.random_cone_program(x, dims,
+            [SOC, NonNeg, SOC, Zeros], n, density=0.5)
+        uv = np.random.randn(2 * (m + n + 1))
+        strided = np.zeros(2 * uv.shape[0])
+        strided[::2] = uv
+        self.assertTrue(np.allclose(problem.residual(strided[::2]),
+            problem.residual(uv.copy())))
+
+        uv32 = uv.astype(np.float32)
+        self.assertTrue(np.allclose(problem.residual(uv32),
+            problem.residual(uv32.astype(float)), rtol=1e-4))
+        uv_int = np.round(uv * 10).astype(int)
+        self.assertTrue(np.allclose(problem.residual(uv_int),
+            problem.residual(uv_int.astype(float))))
+
+
+if __name__ == '__main__':
+    unittest.main()